@@ -0,0 +1,96 @@
+import asyncio
+import functools
+import os
+import threading
+from sqlalchemy.engine.url import make_url
+import pooling
+
+
+#----------------------------------------------------------------------------#
+# Async database access.
+#----------------------------------------------------------------------------#
+
+# async driver used for each database in DB_URI
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+def async_url(uri):
+    url = make_url(uri)
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+
+class AsyncDatabase:
+    '''
+    An async SQLAlchemy engine on DB_URI (asyncpg or aiosqlite), used by
+    the async variants of the read views when ASYNC_DB is set.
+
+    The engine and its pool live on one event loop running in a background
+    thread of each worker process. Async views hand their statements to
+    that loop, so their round trips overlap and pooled connections are
+    never shared between event loops. The views themselves run on an event
+    loop kept per request thread (Flask's default starts a thread per call).
+    '''
+
+    def __init__(self, app=None):
+        self.url = None
+        self.options = None
+        self.engine = None
+        self.loop = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config['ASYNC_DB']:
+            return
+        self.url = async_url(app.config['SQLALCHEMY_DATABASE_URI'])
+        self.options = pooling.engine_options(dict(app.config, SQLALCHEMY_DATABASE_URI=str(self.url)))
+        # async engines bring their own asyncio-aware queue pool
+        self.options.pop('poolclass', None)
+        app.async_to_sync = self.async_to_sync
+
+    @property
+    def enabled(self):
+        return self.url is not None
+
+    def start(self):
+        '''Starts the loop and engine of this process (after a fork, of the new one).'''
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            from sqlalchemy.ext.asyncio import create_async_engine
+            self.loop = asyncio.new_event_loop()
+            threading.Thread(target=self.loop.run_forever, name='async-db', daemon=True).start()
+            self.engine = create_async_engine(self.url, **self.options)
+            self._pid = os.getpid()
+
+    def async_to_sync(self, func):
+        '''Runs an async view on the event loop of the current request thread.'''
+        @functools.wraps(func)
+        def view(*args, **kwargs):
+            loop = getattr(self._local, 'loop', None)
+            if loop is None:
+                loop = self._local.loop = asyncio.new_event_loop()
+            return loop.run_until_complete(func(*args, **kwargs))
+        return view
+
+    async def fetch(self, statement):
+        async with self.engine.connect() as connection:
+            result = await connection.execute(statement)
+            return result.all()
+
+    async def _gather(self, statements):
+        return await asyncio.gather(*[self.fetch(statement) for statement in statements])
+
+    async def all(self, *statements):
+        '''Runs the statements concurrently, each on its own connection, and returns their rows.'''
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(self._gather(statements), self.loop)
+        return await asyncio.wrap_future(future)
+
+
+async_db = AsyncDatabase()
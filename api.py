@@ -0,0 +1,255 @@
+import json
+from datetime import datetime, timedelta
+from flask import Blueprint, Response, current_app, request, stream_with_context
+from models import db, Venue, Artist, Show
+from queries import request_now, show_counts, show_counts_query
+import counters
+import bookings
+from aio import async_db
+from querycheck import query_budget
+from search import search, search_async
+
+
+#----------------------------------------------------------------------------#
+# JSON API.
+#----------------------------------------------------------------------------#
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+def _columns(model, *names):
+    return {name: getattr(model, name) for name in names}
+
+VENUE_FIELDS = _columns(Venue, 'id', 'name', 'city', 'state', 'address', 'phone', 'genres',
+                        'image_link', 'facebook_link', 'website', 'seeking_talent',
+                        'seeking_description', 'created_at', 'updated_at')
+ARTIST_FIELDS = _columns(Artist, 'id', 'name', 'city', 'state', 'phone', 'genres',
+                         'image_link', 'facebook_link', 'website', 'seeking_venue',
+                         'seeking_description', 'created_at', 'updated_at')
+SHOW_FIELDS = {
+    "id": Show.id,
+    "start_time": Show.start_time,
+    "end_time": Show.end_time,
+    "venue_id": Show.venue_id,
+    "venue_name": Venue.name,
+    "venue_image_link": Venue.image_link,
+    "artist_id": Show.artist_id,
+    "artist_name": Artist.name,
+    "artist_image_link": Artist.image_link
+}
+COUNT_FIELDS = ('past_shows_count', 'upcoming_shows_count')
+
+# rows fetched per round trip from the server-side cursor, and serialized
+# objects written per chunk of the response
+STREAM_BATCH_SIZE = 1000
+
+
+class FieldError(ValueError):
+    pass
+
+@api.errorhandler(FieldError)
+def field_error(error):
+    return dump({"error": str(error)}, 400)
+
+def selected_fields(available, extra=()):
+    '''The fields named in ?fields=a,b,c (all of them when absent), in order.'''
+    names = request.args.get('fields')
+    if not names:
+        return list(available) + list(extra)
+    names = [name.strip() for name in names.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available and name not in extra]
+    if unknown:
+        raise FieldError('Unknown fields: {}'.format(', '.join(unknown)))
+    return names
+
+def to_json(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(repr(value))
+
+def dump(data, status=200):
+    return Response(json.dumps(data, default=to_json), status=status, mimetype='application/json')
+
+def serialize(fields, values):
+    return dict(zip(fields, values))
+
+def stream(fields, rows):
+    '''Streams rows as {"data": [...]} in chunks, without building the list.'''
+    def generate():
+        yield '{"data":['
+        batch = []
+        first = True
+        for row in rows:
+            batch.append(json.dumps(serialize(fields, row), default=to_json))
+            if len(batch) == STREAM_BATCH_SIZE:
+                yield ('' if first else ',') + ','.join(batch)
+                batch, first = [], False
+        if batch:
+            yield ('' if first else ',') + ','.join(batch)
+        yield ']}'
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+def collection(model, available):
+    fields = selected_fields(available)
+    query = db.session.query(*[available[name] for name in fields]).order_by(model.id)
+    return stream(fields, query.yield_per(STREAM_BATCH_SIZE))
+
+def detail_query(model, available, columns, entity_id, counted):
+    selected = [available[name] for name in columns] or [model.id]
+    if counted:
+        # the show counters, read with the row (see counters.py)
+        selected += [model.past_shows_count, model.upcoming_shows_count, model.next_show_time]
+    return db.session.query(*selected).filter(model.id == entity_id)
+
+def stored_counts(row, counted):
+    '''Splits the counters off a detail_query row: (row, counts), counts None when stale.'''
+    if row is None or not counted:
+        return row, None
+    counts = counters.counts(row, request_now())
+    return row[:-3], counts
+
+def detail_response(fields, columns, row, counts):
+    if row is None:
+        return dump({"error": "Not found."}, 404)
+    item = serialize(columns, row)
+    if counts is not None:
+        item['past_shows_count'], item['upcoming_shows_count'] = counts
+    return dump({"data": {name: item[name] for name in fields}})
+
+def detail(model, available, criterion, entity_id):
+    fields = selected_fields(available, COUNT_FIELDS)
+    columns = [name for name in fields if name in available]
+    counted = any(name in COUNT_FIELDS for name in fields)
+    row, counts = stored_counts(detail_query(model, available, columns, entity_id, counted).first(), counted)
+    if row is not None and counted and counts is None:
+        counts = show_counts(criterion, request_now())
+    return detail_response(fields, columns, row, counts)
+
+async def detail_async(model, available, criterion, entity_id):
+    '''detail on the async engine (ASYNC_DB); stale counters are recounted with a second statement.'''
+    fields = selected_fields(available, COUNT_FIELDS)
+    columns = [name for name in fields if name in available]
+    counted = any(name in COUNT_FIELDS for name in fields)
+    rows, = await async_db.all(detail_query(model, available, columns, entity_id, counted).limit(1).statement)
+    row, counts = stored_counts(rows[0] if rows else None, counted)
+    if row is not None and counted and counts is None:
+        (counts,), = await async_db.all(show_counts_query(criterion, request_now()).statement)
+    return detail_response(fields, columns, row, counts)
+
+def time_arg(name):
+    '''An ISO 8601 time from the query string; without an offset it is taken as UTC-3, like the stored times.'''
+    value = request.args.get(name)
+    if not value:
+        raise FieldError('Missing {}.'.format(name))
+    try:
+        time = datetime.fromisoformat(value)
+    except ValueError:
+        raise FieldError('{} is not an ISO 8601 time.'.format(name))
+    return bookings.aware(time).astimezone(bookings.LOCAL)
+
+def time_range():
+    start, end = time_arg('start'), time_arg('end')
+    if end <= start:
+        raise FieldError('end must be after start.')
+    return start, end
+
+def search_results(model, available):
+    page = search(model, request.args.get('q'), cursor=request.args.get('cursor'))
+    return search_response(selected_fields(available), page)
+
+async def search_results_async(model, available):
+    page = await search_async(model, request.args.get('q'), cursor=request.args.get('cursor'))
+    return search_response(selected_fields(available), page)
+
+def search_response(fields, page):
+    return dump({
+        "data": [serialize(fields, [getattr(obj, name) for name in fields]) for obj in page.items],
+        "next_cursor": page.next_cursor,
+        "prev_cursor": page.prev_cursor
+    })
+
+
+@api.route('/shows')
+def shows():
+    fields = selected_fields(SHOW_FIELDS)
+    query = db.session.query(*[SHOW_FIELDS[name] for name in fields]).select_from(Show)
+    # join only the tables the selected fields come from
+    if any(name.startswith('venue_') and name != 'venue_id' for name in fields):
+        query = query.join(Venue, Venue.id == Show.venue_id)
+    if any(name.startswith('artist_') and name != 'artist_id' for name in fields):
+        query = query.join(Artist, Artist.id == Show.artist_id)
+    query = query.order_by(Show.start_time, Show.id)
+    return stream(fields, query.yield_per(STREAM_BATCH_SIZE))
+
+@api.route('/venues')
+def venues():
+    return collection(Venue, VENUE_FIELDS)
+
+@api.route('/venues/<int:venue_id>')
+@query_budget(2)
+def venue(venue_id):
+    return detail(Venue, VENUE_FIELDS, Show.venue_id == venue_id, venue_id)
+
+@query_budget(2)
+async def venue_async(venue_id):
+    return await detail_async(Venue, VENUE_FIELDS, Show.venue_id == venue_id, venue_id)
+
+@api.route('/venues/<int:venue_id>/availability')
+def venue_availability(venue_id):
+    '''Whether the venue, and the artist of ?artist_id= when given, are free from ?start= to ?end=.'''
+    start, end = time_range()
+    if db.session.query(Venue.id).filter(Venue.id == venue_id).scalar() is None:
+        return dump({"error": "Not found."}, 404)
+    found = bookings.conflicts(venue_id, request.args.get('artist_id', type=int), start, end)
+    return dump({"data": {
+        "free": not found,
+        "conflicts": {name: {
+            "id": show.id,
+            "venue_id": show.venue_id,
+            "artist_id": show.artist_id,
+            "start_time": bookings.aware(show.start_time),
+            "end_time": bookings.aware(show.end_time)
+        } for name, show in found.items()}
+    }})
+
+@api.route('/venues/<int:venue_id>/free-slots')
+def venue_free_slots(venue_id):
+    '''The venue's free slots from ?start= to ?end=, at least ?min_minutes= long.'''
+    start, end = time_range()
+    max_days = current_app.config['FREE_SLOTS_MAX_DAYS']
+    if end - start > timedelta(days=max_days):
+        raise FieldError('At most {} days per request.'.format(max_days))
+    if db.session.query(Venue.id).filter(Venue.id == venue_id).scalar() is None:
+        return dump({"error": "Not found."}, 404)
+    slots = bookings.free_slots(venue_id, start, end, timedelta(minutes=request.args.get('min_minutes', 0, type=int)))
+    return dump({"data": [{"start": slot_start, "end": slot_end} for slot_start, slot_end in slots]})
+
+@api.route('/venues/search')
+@query_budget(2)
+def search_venues():
+    return search_results(Venue, VENUE_FIELDS)
+
+@query_budget(2)
+async def search_venues_async():
+    return await search_results_async(Venue, VENUE_FIELDS)
+
+@api.route('/artists')
+def artists():
+    return collection(Artist, ARTIST_FIELDS)
+
+@api.route('/artists/<int:artist_id>')
+@query_budget(2)
+def artist(artist_id):
+    return detail(Artist, ARTIST_FIELDS, Show.artist_id == artist_id, artist_id)
+
+@query_budget(2)
+async def artist_async(artist_id):
+    return await detail_async(Artist, ARTIST_FIELDS, Show.artist_id == artist_id, artist_id)
+
+@api.route('/artists/search')
+@query_budget(2)
+def search_artists():
+    return search_results(Artist, ARTIST_FIELDS)
+
+@query_budget(2)
+async def search_artists_async():
+    return await search_results_async(Artist, ARTIST_FIELDS)
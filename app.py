@@ -3,20 +3,48 @@
 #----------------------------------------------------------------------------#
 
 import json
+import os
 from time import timezone
 from typing import final
-import dateutil.parser
 from datetime import datetime, timezone, timedelta
 import sys
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import click
+from itertools import groupby
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify, g, abort
+from markupsafe import Markup
 from flask_moment import Moment
+from jinja2 import FileSystemBytecodeCache
 from flask_migrate import Migrate
 from flask_wtf.csrf import CSRFProtect
 import logging
 from logging import Formatter, FileHandler
 from wtforms import Form
+from werkzeug.datastructures import MultiDict
 from models import Venue, Artist, Show, db
+from queries import request_now, show_counts, show_counts_query, show_rows, show_rows_query, show_rows_result, \
+  similar_artists_query, similar_artists_result, has_genre, genre_facets, genre_facets_query, facet_counts, venue_version, artist_version, venues_version, artists_version, shows_version
+from search import search, search_async
+from pagination import keyset_query, page_of, paginate_query
+from cache import page_cache
+from metrics import metrics
+import querycheck
+import assets
+import pooling
+import replicas
+import counters
+import bookings
+import calendars
+import partitions
+import recommendations
+from autocomplete import suggestions
+from replicas import use_primary
+from querycheck import query_budget
+from conditional import conditional, request_version
+import importer
+from api import api, venue_async, artist_async, search_venues_async as api_search_venues_async, \
+  search_artists_async as api_search_artists_async
+from aio import async_db
+import formatting
 from forms import *
 #----------------------------------------------------------------------------#
 # App Config.
@@ -27,33 +55,44 @@ moment = Moment(app)
 app.config.from_object('config')
 csrf = CSRFProtect(app)
 csrf.init_app(app)
+pooling.init_app(app)
 db.init_app(app)
+replicas.init_app(app)
+counters.init_app(app)
+partitions.init_app(app)
+suggestions.init_app(app)
 migrate = Migrate(app, db)
+page_cache.init_app(app)
+assets.init_app(app)
+async_db.init_app(app)
+querycheck.init_app(app)
+metrics.init_app(app)
+app.register_blueprint(api)
+
+# compiled templates are kept on disk so recycled workers skip recompiling
+# them; auto-reload (re-checking every template source) is for development.
+if app.config['TEMPLATE_CACHE_DIR']:
+  os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+  app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+app.jinja_env.auto_reload = app.config['TEMPLATES_AUTO_RELOAD']
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  if isinstance(value, str):
-    date = dateutil.parser.parse(value)
-  else:
-    date = value
-
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+formatting.init_app(app)
 
-app.jinja_env.filters['datetime'] = format_datetime
+def fragment_stamp(version):
+  # the page cache serves a fragment while the page's version row is the
+  # same; dates in it are formatted for the request's locale and timezone
+  return '{!r} {} {}'.format(tuple(version or ()), g.locale, g.timezone)
 
-def fix_json_array(obj, attr):
-    arr = getattr(obj, attr)
-    if isinstance(arr, list) and len(arr) > 1 and arr[0] == '{':
-        arr = arr[1:-1]
-        arr = ''.join(arr).split(",")
-        setattr(obj,attr, arr)
+def page_urls(page, **args):
+  # next/prev links of a keyset-paginated listing, for the current endpoint
+  return {
+    "next_url": url_for(request.endpoint, cursor=page.next_cursor, **args) if page.next_cursor else None,
+    "prev_url": url_for(request.endpoint, cursor=page.prev_cursor, **args) if page.prev_cursor else None
+  }
 
 #----------------------------------------------------------------------------#
 # Controllers.
@@ -68,61 +107,133 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@query_budget(3)
+@conditional(venues_version)
 def venues():
   # DONE: replace with real venues data.
   #       num_shows should be aggregated based on number of upcoming shows per venue.
+  genre = request.args.get('genre')
+  return venues_page(venues_query(genre).all(), genre, genre_facets(Venue))
+
+@query_budget(3)
+@conditional(venues_version)
+async def venues_async():
+  # venues for the async mode (ASYNC_DB, see aio.py), with the venues and the
+  # genre facets fetched concurrently
+  genre = request.args.get('genre')
+  rows, counts = await async_db.all(venues_query(genre).statement, genre_facets_query(Venue).statement)
+  return venues_page(rows, genre, facet_counts(counts[0]))
+
+def venues_query(genre):
+  # one query for every area: venues ordered by area, each with its
+  # upcoming show count read from its counters (see counters.py), or
+  # counted when its next show has started since roll-show-counters ran.
+  upcoming = counters.upcoming_count(Venue, Show.venue_id, request_now())
+  rows = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, upcoming)
+  if genre:
+    rows = rows.filter(has_genre(Venue, genre))
+  return rows.order_by(Venue.state, Venue.city, Venue.name, Venue.id)
+
+def venues_page(rows, genre, facets):
   data = []
-  for city, state in db.session.query(Venue.city, Venue.state).distinct():
+  for (city, state), venues in groupby(rows, key=lambda row: (row[2], row[3])):
     data.append({
       "city": city,
       "state": state,
-      "venues": Venue.query.filter_by(city=city)
+      "venues": [{
+        "id": id,
+        "name": name,
+        "num_upcoming_shows": num_upcoming_shows
+      } for id, name, _, _, num_upcoming_shows in venues]
     })
-  return render_template('pages/venues.html', areas=data);
+  return render_template('pages/venues.html', areas=data, genre=genre, facets=facets)
 
-@app.route('/venues/search', methods=['POST'])
+@app.route('/venues/search', methods=['GET', 'POST'])
+@query_budget(2)
 def search_venues():
   # DONE: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
 
-  search_term = request.form.get('search_term')
-  venues = Venue.query
-  if search_term != None or search_term != ''.strip():
-    search_term = "%{}%".format(request.form.get('search_term'))
-    venues = Venue.query.filter(Venue.name.ilike(search_term))
-  
-  venues = venues.order_by(Venue.name).all()
+  search_term = request.values.get('search_term', '')
+  page = search(Venue, search_term, cursor=request.args.get('cursor'))
+  return search_venues_page(page, search_term)
+
+@query_budget(2)
+async def search_venues_async():
+  # search_venues for the async mode (ASYNC_DB, see aio.py)
+  search_term = request.values.get('search_term', '')
+  page = await search_async(Venue, search_term, cursor=request.args.get('cursor'))
+  return search_venues_page(page, search_term)
+
+def search_venues_page(page, search_term):
+  venues = page.items
 
   response={
     "count": len(venues),
     "data": venues
   }
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+  return render_template('pages/search_venues.html', results=response, search_term=search_term,
+    **page_urls(page, search_term=search_term))
 
 @app.route('/venues/<int:venue_id>')
+@query_budget(5)
+@conditional(venue_version)
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
   # DONE: replace with real venue data from the venues table, using venue_id
 
-  venue = Venue.query.filter_by(id=venue_id).first()
-  fix_json_array(venue, "genres")
+  venue = Venue.query.get(venue_id)
   if not venue: 
     return render_template('errors/404.html')
+  stamp = fragment_stamp(request_version(venue_version, venue_id=venue_id))
+  content = page_cache.get('venue', venue_id, stamp)
+  if content is None:
+    content = render_template('fragments/venue.html', venue=venue_details(venue))
+    page_cache.set('venue', venue_id, stamp, content)
+  return render_template('pages/show_venue.html', venue=venue, content=Markup(content))
 
-  past_shows = []
-  upcoming_shows = []
-  for show in venue.shows:
-    show = {
-      "artist_id": show.artist_id,
-      "artist_name": show.artist.name,
-      "artist_image_link": show.artist.image_link,
-      "start_time": show.start_time
-    }
-    if show["start_time"] <= datetime.now(timezone(timedelta(hours=-3))):
-      past_shows.append(show)
-    else:
-      upcoming_shows.append(show)
+@query_budget(5)
+@conditional(venue_version)
+async def show_venue_async(venue_id):
+  # show_venue for the async mode (ASYNC_DB, see aio.py)
+  rows, = await async_db.all(Venue.__table__.select().where(Venue.id == venue_id))
+  if not rows:
+    return render_template('errors/404.html')
+  venue = rows[0]
+  stamp = fragment_stamp(request_version(venue_version, venue_id=venue_id))
+  content = page_cache.get('venue', venue_id, stamp)
+  if content is None:
+    content = render_template('fragments/venue.html', venue=await venue_details_async(venue))
+    page_cache.set('venue', venue_id, stamp, content)
+  return render_template('pages/show_venue.html', venue=venue, content=Markup(content))
+
+def venue_details(venue):
+  # the data behind a venue page, as rendered into fragments/venue.html
+  now = request_now()
+  criterion = Show.venue_id == venue.id
+  return venue_data(venue, counters.counts(venue, now) or show_counts(criterion, now),
+    show_rows(criterion, now, True, app.config['UPCOMING_SHOWS_LIMIT']),
+    show_rows(criterion, now, False, app.config['PAST_SHOWS_LIMIT']))
+
+async def venue_details_async(venue):
+  # venue_details on the async engine, with both show lists (and the counts,
+  # when the counters are stale) fetched concurrently
+  now = request_now()
+  criterion = Show.venue_id == venue.id
+  upcoming_limit, past_limit = app.config['UPCOMING_SHOWS_LIMIT'], app.config['PAST_SHOWS_LIMIT']
+  counts = counters.counts(venue, now)
+  upcoming, past, *counted = await async_db.all(
+    show_rows_query(criterion, now, True, upcoming_limit).statement,
+    show_rows_query(criterion, now, False, past_limit).statement,
+    *([] if counts else [show_counts_query(criterion, now).statement]))
+  return venue_data(venue, counts or counted[0][0], show_rows_result(upcoming, upcoming_limit),
+    show_rows_result(past, past_limit))
+
+def venue_data(venue, counts, upcoming, past):
+  past_shows_count, upcoming_shows_count = counts
+  upcoming_shows, more_upcoming = upcoming
+  past_shows, more_past = past
 
   data = {
     "id": venue.id,
@@ -138,11 +249,37 @@ def show_venue(venue_id):
     "seeking_description": venue.seeking_description,
     "image_link": venue.image_link,
     "past_shows": past_shows,
-    "past_shows_count": len(past_shows),
+    "past_shows_count": past_shows_count,
+    "more_past_shows": more_past,
     "upcoming_shows": upcoming_shows,
-    "upcoming_shows_count": len(upcoming_shows)
+    "upcoming_shows_count": upcoming_shows_count,
+    "more_upcoming_shows": more_upcoming
   }
-  return render_template('pages/show_venue.html', venue=data)
+  return data
+
+@app.route('/venues/<int:venue_id>/shows/<any(past, upcoming):when>')
+@query_budget(3)
+@conditional(venue_version)
+def venue_shows(venue_id, when):
+  # the "load more" path for the shows left out of the venue page
+  upcoming = when == 'upcoming'
+  limit = app.config['UPCOMING_SHOWS_LIMIT' if upcoming else 'PAST_SHOWS_LIMIT']
+  shows, more = show_rows(Show.venue_id == venue_id, request_now(), upcoming, limit,
+    after=request.args.get('after', type=int))
+  next_url = None
+  if more:
+    next_url = url_for('venue_shows', venue_id=venue_id, when=when, after=shows[-1]['id'])
+  return render_template('pages/shows.html', shows=shows, next_url=next_url)
+
+@app.route('/venues/<int:venue_id>/calendar.ics')
+@query_budget(3)
+@conditional(calendars.venue_version)
+def venue_calendar(venue_id):
+  # the venue's shows as an iCalendar feed, from ?since= on (see calendars.py)
+  name = db.session.query(Venue.name).filter(Venue.id == venue_id).scalar()
+  if name is None:
+    abort(404)
+  return calendars.feed(name, Show.venue_id == venue_id, calendars.since())
 
 #  Create Venue
 #  ----------------------------------------------------------------
@@ -202,6 +339,7 @@ def create_venue_submission():
   return render_template('pages/home.html')
 
 @app.route('/venues/<int:venue_id>/remove', methods=['GET'])
+@use_primary
 def delete_venue(venue_id):
   # DONE: Complete this endpoint for taking a venue_id, and using
   # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
@@ -211,6 +349,7 @@ def delete_venue(venue_id):
     if venue:
       db.session.delete(venue)
       db.session.commit()
+      page_cache.invalidate_venue(venue_id)
     else:
       error = True
   except:
@@ -230,53 +369,125 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@query_budget(3)
+@conditional(artists_version)
 def artists():
   # DONE: replace with real data returned from querying the database
-  data = Artist.query.order_by(Artist.id).all()
-  return render_template('pages/artists.html', artists=data)
+  genre = request.args.get('genre')
+  page = paginate_query(artists_query(genre), [Artist.name, Artist.id],
+    request.args.get('cursor'), app.config['PAGE_SIZE'], lambda row: (row.name, row.id))
+  return artists_page(page, genre, genre_facets(Artist))
 
-@app.route('/artists/search', methods=['POST'])
+@query_budget(3)
+@conditional(artists_version)
+async def artists_async():
+  # artists for the async mode (ASYNC_DB, see aio.py), with the page of
+  # artists and the genre facets fetched concurrently
+  genre = request.args.get('genre')
+  query, key, direction = keyset_query(artists_query(genre), [Artist.name, Artist.id],
+    request.args.get('cursor'), app.config['PAGE_SIZE'])
+  rows, counts = await async_db.all(query.statement, genre_facets_query(Artist).statement)
+  page = page_of(rows, app.config['PAGE_SIZE'], key, lambda row: (row.name, row.id), direction)
+  return artists_page(page, genre, facet_counts(counts[0]))
+
+def artists_query(genre):
+  query = db.session.query(Artist.id, Artist.name)
+  if genre:
+    query = query.filter(has_genre(Artist, genre))
+  return query
+
+def artists_page(page, genre, facets):
+  return render_template('pages/artists.html', artists=page.items, genre=genre,
+    facets=facets, **page_urls(page, genre=genre))
+
+@app.route('/artists/search', methods=['GET', 'POST'])
+@query_budget(2)
 def search_artists():
   # DONE: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
 
-  search_term = request.form.get('search_term')
-  artists = Artist.query
-  if search_term != None or search_term != ''.strip():
-    search_term = "%{}%".format(request.form.get('search_term'))
-    artists = Artist.query.filter(Artist.name.ilike(search_term))
-  
-  artists = artists.order_by(Artist.name).all()
+  search_term = request.values.get('search_term', '')
+  page = search(Artist, search_term, cursor=request.args.get('cursor'))
+  return search_artists_page(page, search_term)
+
+@query_budget(2)
+async def search_artists_async():
+  # search_artists for the async mode (ASYNC_DB, see aio.py)
+  search_term = request.values.get('search_term', '')
+  page = await search_async(Artist, search_term, cursor=request.args.get('cursor'))
+  return search_artists_page(page, search_term)
+
+def search_artists_page(page, search_term):
+  artists = page.items
   response={
     "count": len(artists),
     "data": artists
   }
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+  return render_template('pages/search_artists.html', results=response, search_term=search_term,
+    **page_urls(page, search_term=search_term))
 
 @app.route('/artists/<int:artist_id>')
+@query_budget(6)
+@conditional(artist_version)
 def show_artist(artist_id):
   # shows the artist page with the given artist_id
   # DONE: replace with real artist data from the artist table, using artist_id
-  artist = Artist.query.filter_by(id=artist_id).first()
-  fix_json_array(artist, "genres")
-
+  artist = Artist.query.get(artist_id)
   if not artist: 
     return render_template('errors/404.html')
+  stamp = fragment_stamp(request_version(artist_version, artist_id=artist_id))
+  content = page_cache.get('artist', artist_id, stamp)
+  if content is None:
+    content = render_template('fragments/artist.html', artist=artist_details(artist))
+    page_cache.set('artist', artist_id, stamp, content)
+  # the similar artists are recomputed apart from the artist: not part of the cached fragment
+  similar = similar_artists_result(similar_artists_query(artist_id).limit(app.config['SIMILAR_ARTISTS_LIMIT']))
+  return render_template('pages/show_artist.html', artist=artist, content=Markup(content), similar=similar)
 
-  past_shows = []
-  upcoming_shows = []
-  for show in artist.shows:
-    show = {
-      "venue_id": show.venue_id,
-      "venue_name": show.venue.name,
-      "venue_image_link": show.venue.image_link,
-      "start_time": show.start_time
-    }
-    if show["start_time"] <= datetime.now(timezone(timedelta(hours=-3))):
-      past_shows.append(show)
-    else:
-      upcoming_shows.append(show)
+@query_budget(6)
+@conditional(artist_version)
+async def show_artist_async(artist_id):
+  # show_artist for the async mode (ASYNC_DB, see aio.py)
+  rows, similar = await async_db.all(Artist.__table__.select().where(Artist.id == artist_id),
+    similar_artists_query(artist_id).limit(app.config['SIMILAR_ARTISTS_LIMIT']).statement)
+  if not rows:
+    return render_template('errors/404.html')
+  artist = rows[0]
+  stamp = fragment_stamp(request_version(artist_version, artist_id=artist_id))
+  content = page_cache.get('artist', artist_id, stamp)
+  if content is None:
+    content = render_template('fragments/artist.html', artist=await artist_details_async(artist))
+    page_cache.set('artist', artist_id, stamp, content)
+  return render_template('pages/show_artist.html', artist=artist, content=Markup(content),
+    similar=similar_artists_result(similar))
+
+def artist_details(artist):
+  # the data behind a artist page, as rendered into fragments/artist.html
+  now = request_now()
+  criterion = Show.artist_id == artist.id
+  return artist_data(artist, counters.counts(artist, now) or show_counts(criterion, now),
+    show_rows(criterion, now, True, app.config['UPCOMING_SHOWS_LIMIT']),
+    show_rows(criterion, now, False, app.config['PAST_SHOWS_LIMIT']))
+
+async def artist_details_async(artist):
+  # artist_details on the async engine, with both show lists (and the counts,
+  # when the counters are stale) fetched concurrently
+  now = request_now()
+  criterion = Show.artist_id == artist.id
+  upcoming_limit, past_limit = app.config['UPCOMING_SHOWS_LIMIT'], app.config['PAST_SHOWS_LIMIT']
+  counts = counters.counts(artist, now)
+  upcoming, past, *counted = await async_db.all(
+    show_rows_query(criterion, now, True, upcoming_limit).statement,
+    show_rows_query(criterion, now, False, past_limit).statement,
+    *([] if counts else [show_counts_query(criterion, now).statement]))
+  return artist_data(artist, counts or counted[0][0], show_rows_result(upcoming, upcoming_limit),
+    show_rows_result(past, past_limit))
+
+def artist_data(artist, counts, upcoming, past):
+  past_shows_count, upcoming_shows_count = counts
+  upcoming_shows, more_upcoming = upcoming
+  past_shows, more_past = past
 
   data = {
     "id": artist.id,
@@ -291,14 +502,40 @@ def show_artist(artist_id):
     "website": artist.website,
     "image_link": artist.image_link,
     "past_shows": past_shows,
-    "past_shows_count": len(past_shows),
+    "past_shows_count": past_shows_count,
+    "more_past_shows": more_past,
     "upcoming_shows": upcoming_shows,
-    "upcoming_shows_count": len(upcoming_shows)
+    "upcoming_shows_count": upcoming_shows_count,
+    "more_upcoming_shows": more_upcoming
   }
+  return data
+
+@app.route('/artists/<int:artist_id>/shows/<any(past, upcoming):when>')
+@query_budget(3)
+@conditional(artist_version)
+def artist_shows(artist_id, when):
+  # the "load more" path for the shows left out of the artist page
+  upcoming = when == 'upcoming'
+  limit = app.config['UPCOMING_SHOWS_LIMIT' if upcoming else 'PAST_SHOWS_LIMIT']
+  shows, more = show_rows(Show.artist_id == artist_id, request_now(), upcoming, limit,
+    after=request.args.get('after', type=int))
+  next_url = None
+  if more:
+    next_url = url_for('artist_shows', artist_id=artist_id, when=when, after=shows[-1]['id'])
+  return render_template('pages/shows.html', shows=shows, next_url=next_url)
 
-  return render_template('pages/show_artist.html', artist=data)
+@app.route('/artists/<int:artist_id>/calendar.ics')
+@query_budget(3)
+@conditional(calendars.artist_version)
+def artist_calendar(artist_id):
+  # the artist's shows as an iCalendar feed, from ?since= on (see calendars.py)
+  name = db.session.query(Artist.name).filter(Artist.id == artist_id).scalar()
+  if name is None:
+    abort(404)
+  return calendars.feed(name, Show.artist_id == artist_id, calendars.since())
 
 @app.route('/artists/<artist_id>/remove', methods=['GET'])
+@use_primary
 def delete_artist(artist_id):
   # DONE: Complete this endpoint for taking a artist_id, and using
   # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
@@ -308,6 +545,7 @@ def delete_artist(artist_id):
     if artist:
       db.session.delete(artist)
       db.session.commit()
+      page_cache.invalidate_artist(artist_id)
     else:
       error = True
   except:
@@ -330,7 +568,6 @@ def edit_artist(artist_id):
   form = ArtistForm()
   artist = Artist.query.get(artist_id)
   if artist:
-    fix_json_array(artist, "genres")
     form.name.data = artist.name
     form.city.data = artist.city
     form.state.data = artist.state
@@ -367,6 +604,7 @@ def edit_artist_submission(artist_id):
       artist.seeking_description = request.form['seeking_description']
       artist.updated_at = datetime.now(timezone(timedelta(hours=-3)))
       db.session.commit()
+      page_cache.invalidate_artist(artist_id)
     else:
       for e in form.errors:
         flash('An error has occurred. {}'.format(form.errors[e]))
@@ -386,7 +624,6 @@ def edit_venue(venue_id):
   form = VenueForm()
   venue = Venue.query.get(venue_id)
   if venue:
-    fix_json_array(venue, "genres")
     form.name.data = venue.name
     form.city.data = venue.city
     form.state.data = venue.state
@@ -425,6 +662,7 @@ def edit_venue_submission(venue_id):
       venue.seeking_description = request.form['seeking_description']
       venue.updated_at = datetime.now(timezone(timedelta(hours=-3)))
       db.session.commit()
+      page_cache.invalidate_venue(venue_id)
     else:
       for e in form.errors:
           flash('An error has occurred. {}'.format(form.errors[e]))
@@ -495,27 +733,61 @@ def create_artist_submission():
   return render_template('pages/home.html')
 
 
+#  Autocomplete
+#  ----------------------------------------------------------------
+
+@app.route('/autocomplete')
+@query_budget(0)
+def autocomplete():
+  # type-ahead suggestions for the search boxes, answered from the worker's
+  # in-memory prefix index without touching the database (see autocomplete.py)
+  kind = request.args.get('kind')
+  if kind and kind not in suggestions.KINDS:
+    abort(400)
+  return jsonify({"data": suggestions.suggest(request.args.get('q', ''), kind)})
+
+
 #  Shows
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@query_budget(2)
+@conditional(shows_version)
 def shows():
   # displays list of shows at /shows
   # DONE: replace with real venues data.
   #       num_shows should be aggregated based on number of upcoming shows per venue.
-  data = []
-  shows = Show.query.all()
-  for show in shows:
-    data.append({
-      "venue_id": show.venue.id,
-      "venue_name": show.venue.name,
-      "artist_id": show.artist.id,
-      "artist_name": show.artist.name,
-      "artist_image_link": show.artist.image_link,
-      "start_time": show.start_time
-    })
+  page = paginate_query(shows_query(), [Show.start_time, Show.id], request.args.get('cursor'),
+    app.config['PAGE_SIZE'], lambda row: (row.start_time, row.id))
+  return shows_page(page)
+
+@query_budget(2)
+@conditional(shows_version)
+async def shows_async():
+  # shows for the async mode (ASYNC_DB, see aio.py)
+  query, key, direction = keyset_query(shows_query(), [Show.start_time, Show.id], request.args.get('cursor'),
+    app.config['PAGE_SIZE'])
+  rows, = await async_db.all(query.statement)
+  return shows_page(page_of(rows, app.config['PAGE_SIZE'], key, lambda row: (row.start_time, row.id), direction))
+
+def shows_query():
+  return db.session.query(
+    Show.id, Show.start_time,
+    Venue.id.label('venue_id'), Venue.name.label('venue_name'),
+    Artist.id.label('artist_id'), Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link')
+  ).join(Venue, Venue.id == Show.venue_id).join(Artist, Artist.id == Show.artist_id)
 
-  return render_template('pages/shows.html', shows=data)
+def shows_page(page):
+  data = [{
+    "venue_id": show.venue_id,
+    "venue_name": show.venue_name,
+    "artist_id": show.artist_id,
+    "artist_name": show.artist_name,
+    "artist_image_link": show.artist_image_link,
+    "start_time": show.start_time
+  } for show in page.items]
+
+  return render_template('pages/shows.html', shows=data, **page_urls(page))
 
 @app.route('/shows/create')
 def create_shows():
@@ -529,29 +801,43 @@ def create_show_submission():
   # DONE: insert form data as a new Show record in the db, instead
   error = False
   form = ShowForm()
-  show_id = db.session.query(db.func.max(Show.id)).scalar()
   try:
     if form.validate_on_submit():
-      id = show_id + 1
-      venue_id = request.form['venue_id']
-      artist_id = request.form['artist_id']
-      start_time = request.form['start_time']
+      venue_id = int(request.form['venue_id'])
+      artist_id = int(request.form['artist_id'])
+      # naive form times are UTC-3: made aware once, so the check and the
+      # INSERT see the same instant
+      start_time = bookings.aware(form.start_time.data)
+      end_time = bookings.aware(bookings.end_time(start_time, form.end_time.data))
+      # the venue and the artist must both be free for the whole show
+      bookings.lock([venue_id], [artist_id])
+      booked = bookings.conflicts(venue_id, artist_id, start_time, end_time)
+      if booked:
+        for name, show in booked.items():
+          flash('Show could not be listed. {}'.format(bookings.describe(name, show)))
+        return render_template('pages/shows.html'), 409
 
-      show = Show(id=id, venue_id=venue_id, artist_id=artist_id, start_time=start_time, 
+      show = Show(venue_id=venue_id, artist_id=artist_id, start_time=start_time, end_time=end_time,
       created_at=datetime.now(timezone(timedelta(hours=-3))), 
       updated_at=datetime.now(timezone(timedelta(hours=-3))))
       
       db.session.add(show)
       db.session.commit()
+      page_cache.invalidate('venue', venue_id)
+      page_cache.invalidate('artist', artist_id)
     else:
       for e in form.errors:
           flash('An error has occurred. {}'.format(form.errors[e]))
       db.session.rollback()
       return render_template('pages/shows.html')
-  except:
-    error = True
+  except Exception as e:
     db.session.rollback()
     print(sys.exc_info())
+    if bookings.is_conflict(e):
+      # a concurrent booking of the slot won the race past the check
+      flash('Show could not be listed. The venue or the artist was booked for that time meanwhile.')
+      return render_template('pages/shows.html'), 409
+    error = True
   finally:
     db.session.close()
   
@@ -564,6 +850,65 @@ def create_show_submission():
   # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
   return render_template('pages/home.html')
 
+@app.route('/shows/batch', methods=['POST'])
+def create_shows_batch():
+  # creates every show in a JSON list of {venue_id, artist_id, start_time,
+  # end_time (optional)} in one transaction with a single multi-row INSERT; all or nothing.
+  items = request.get_json(silent=True)
+  if not isinstance(items, list) or not items:
+    return jsonify({"error": "Expected a non-empty JSON list of shows."}), 400
+  if len(items) > app.config['SHOW_BATCH_LIMIT']:
+    return jsonify({"error": "At most {} shows per batch.".format(app.config['SHOW_BATCH_LIMIT'])}), 400
+
+  rows = []
+  errors = {}
+  now = datetime.now(timezone(timedelta(hours=-3)))
+  for i, item in enumerate(items):
+    form = ShowForm(MultiDict(item if isinstance(item, dict) else {}), meta={'csrf': False})
+    if not form.validate():
+      errors[i] = form.errors
+      continue
+    try:
+      venue_id, artist_id = int(form.venue_id.data), int(form.artist_id.data)
+    except ValueError:
+      errors[i] = {"id": ["Venue and artist ids must be integers."]}
+      continue
+    rows.append({
+      "venue_id": venue_id,
+      "artist_id": artist_id,
+      # naive times are UTC-3: made aware once, for the check and the INSERT
+      "start_time": bookings.aware(form.start_time.data),
+      "end_time": bookings.aware(bookings.end_time(form.start_time.data, form.end_time.data)),
+      "created_at": now,
+      "updated_at": now
+    })
+  if errors:
+    return jsonify({"errors": errors}), 400
+  # shows overlapping a stored show, or each other, at the same venue or artist
+  bookings.lock({row["venue_id"] for row in rows}, {row["artist_id"] for row in rows})
+  errors = {i: {"booking": messages} for i, messages in bookings.check_rows(rows).items()}
+  if errors:
+    db.session.rollback()
+    return jsonify({"errors": errors}), 409
+
+  try:
+    db.session.execute(Show.__table__.insert().values(rows))
+    counters.refresh({row["venue_id"] for row in rows}, {row["artist_id"] for row in rows}, now)
+    db.session.commit()
+  except Exception as e:
+    db.session.rollback()
+    print(sys.exc_info())
+    if bookings.is_conflict(e):
+      # a concurrent booking of one of the slots won the race past the check
+      return jsonify({"error": "A venue or artist of these shows was booked for the same time meanwhile."}), 409
+    return jsonify({"error": "Shows could not be listed."}), 400
+  finally:
+    db.session.close()
+
+  page_cache.invalidate('venue', *{row["venue_id"] for row in rows})
+  page_cache.invalidate('artist', *{row["artist_id"] for row in rows})
+  return jsonify({"count": len(rows)}), 201
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -583,6 +928,105 @@ if not app.debug:
     app.logger.addHandler(file_handler)
     app.logger.info('errors')
 
+#----------------------------------------------------------------------------#
+# Async mode.
+#----------------------------------------------------------------------------#
+
+# with ASYNC_DB the listing, search and detail pages and the API entries are
+# served by their async variants, which overlap the database round trips of
+# one request. Each request still holds its worker thread while it waits
+# (Flask runs an async view to completion on the request thread, also under
+# asgi.py), so this shortens requests, it does not serve more at once.
+ASYNC_VIEWS = {
+  'venues': venues_async,
+  'search_venues': search_venues_async,
+  'show_venue': show_venue_async,
+  'artists': artists_async,
+  'search_artists': search_artists_async,
+  'show_artist': show_artist_async,
+  'shows': shows_async,
+  'api.venue': venue_async,
+  'api.artist': artist_async,
+  'api.search_venues': api_search_venues_async,
+  'api.search_artists': api_search_artists_async,
+}
+if async_db.enabled:
+  app.view_functions.update(ASYNC_VIEWS)
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(sorted(importer.KINDS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension.')
+@click.option('--chunk-size', default=5000, show_default=True, help='Records per transaction.')
+def import_command(kind, path, format, chunk_size):
+  """Bulk-load venues, artists or shows from a CSV or NDJSON file."""
+  importer.import_file(kind, path, format=format, chunk_size=chunk_size)
+
+@app.cli.command('compile-templates')
+def compile_templates_command():
+  """Compile every template into the bytecode cache ahead of the first request."""
+  if app.jinja_env.bytecode_cache is None:
+    raise click.ClickException('TEMPLATE_CACHE_DIR is not set.')
+  names = [name for name in app.jinja_env.list_templates() if name.endswith('.html')]
+  for name in names:
+    app.jinja_env.get_template(name)
+  click.echo('{} templates compiled into {}'.format(len(names), app.config['TEMPLATE_CACHE_DIR']))
+
+@app.cli.command('build-assets')
+def build_assets_command():
+  """Bundle, minify, fingerprint and precompress the static files into static/dist."""
+  manifest = assets.build(app)
+  click.echo('{} files built into {}'.format(len(manifest['files']), os.path.join(app.static_folder, assets.BUILD_DIR)))
+  for name in assets.BUNDLES:
+    click.echo('  {} -> {}'.format(name, manifest['files'][name]))
+
+@app.cli.command('roll-show-counters')
+@click.option('--all', 'everything', is_flag=True, help='Recount every venue and artist.')
+def roll_show_counters_command(everything):
+  """Move started shows from upcoming to past in the show counters; run it every minute or so."""
+  rolled = counters.roll(everything=everything)
+  db.session.commit()
+  click.echo('{} venues and artists recounted'.format(rolled))
+
+@app.cli.command('create-show-partitions')
+@click.option('--ahead', type=int, help='Months to prepare after this one (SHOW_PARTITIONS_AHEAD by default).')
+def create_show_partitions_command(ahead):
+  """Create the monthly Show partitions coming up (PostgreSQL); run it daily or so."""
+  created = partitions.ensure(db.session.connection(), app.config['SHOW_PARTITIONS_AHEAD'] if ahead is None else ahead)
+  db.session.commit()
+  click.echo('{} partitions created{}'.format(len(created), ''.join('\n  ' + name for name in created)))
+
+@app.cli.command('archive-shows')
+@click.option('--months', type=int, help='Archive the months older than this many (ARCHIVE_AFTER_MONTHS by default).')
+@click.option('--tablespace', help='Move partitions to this tablespace instead of exporting them (ARCHIVE_TABLESPACE).')
+@click.option('--export-dir', type=click.Path(file_okay=False), help='Where exported months go (ARCHIVE_DIR).')
+def archive_shows_command(months, tablespace, export_dir):
+  """Move past shows to a cold tablespace, or export them as CSV and delete them."""
+  months = app.config['ARCHIVE_AFTER_MONTHS'] if months is None else months
+  before = partitions.add_months(partitions.month_start(datetime.now(timezone(timedelta(hours=-3)))), -months)
+  try:
+    archived = partitions.archive(db.session, before, directory=export_dir or app.config['ARCHIVE_DIR'],
+      tablespace=tablespace or app.config['ARCHIVE_TABLESPACE'], echo=click.echo)
+  except ValueError as e:
+    raise click.ClickException(str(e))
+  click.echo('{} months archived (before {:%Y-%m})'.format(len(archived), before))
+
+@app.cli.command('recommend-artists')
+@click.option('--limit', type=int, help='Similar artists kept per artist (SIMILAR_ARTISTS_LIMIT by default).')
+@click.option('--genre-weight', type=click.FloatRange(0, 1), help='Share of the score from genres (SIMILAR_ARTISTS_GENRE_WEIGHT).')
+@click.option('--chunk-pairs', type=int, help='Candidate pairs scored at a time (RECOMMEND_CHUNK_PAIRS).')
+def recommend_artists_command(limit, genre_weight, chunk_pairs):
+  """Recompute every artist's similar artists from shared venues and genres (needs NumPy and SciPy)."""
+  written = recommendations.refresh(
+    app.config['SIMILAR_ARTISTS_LIMIT'] if limit is None else limit,
+    app.config['SIMILAR_ARTISTS_GENRE_WEIGHT'] if genre_weight is None else genre_weight,
+    chunk_pairs or app.config['RECOMMEND_CHUNK_PAIRS'], app.config['RECOMMEND_MAX_VENUE_ARTISTS'], echo=click.echo)
+  click.echo('{} similar artists written'.format(written))
+
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
@@ -0,0 +1,18 @@
+'''
+ASGI entry point, for serving Fyyur from an ASGI server:
+
+    uvicorn asgi:application --workers 4
+
+Fyyur is a WSGI (Flask) app; a2wsgi runs each request on its thread pool,
+so a request holds one pool thread to the end, async views included. With
+ASYNC_DB=1 the async variants of the listing, search and detail views (see
+app.py and aio.py) overlap the database round trips within each request;
+they make requests shorter, not the server able to hold more at once.
+'''
+from a2wsgi import WSGIMiddleware
+from app import app
+from autocomplete import suggestions
+
+application = WSGIMiddleware(app)
+# built as the server loads the app, not by the first request
+suggestions.start()
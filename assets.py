@@ -0,0 +1,201 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+from flask import current_app, request, send_from_directory, url_for
+
+
+#----------------------------------------------------------------------------#
+# Static assets.
+#----------------------------------------------------------------------------#
+
+# Stylesheets and scripts of layouts/main.html, each list served as one file
+# once built. Sources are paths under static/, in the order they load.
+BUNDLES = {
+    'bundles/main.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    # loaded in <head>, before the page renders
+    'bundles/head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    # deferred, after jQuery
+    'bundles/main.js': [
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+
+# Built files go to static/dist/, named after a hash of their content.
+BUILD_DIR = 'dist'
+MANIFEST = 'manifest.json'
+
+# precompressed variants, in order of preference
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+COMPRESSIBLE = {'.css', '.js', '.map', '.svg', '.json', '.txt', '.eot', '.ttf', '.otf'}
+
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def fingerprint(path, data):
+    root, ext = posixpath.splitext(path)
+    return '{}/{}.{}{}'.format(BUILD_DIR, root, hashlib.sha256(data).hexdigest()[:12], ext)
+
+def minify(path, text):
+    '''Minifies a bundle source (needs rcssmin and rjsmin); *.min.* sources are kept as they are.'''
+    if '.min.' in posixpath.basename(path):
+        return text
+    if path.endswith('.css'):
+        import rcssmin
+        return rcssmin.cssmin(text)
+    import rjsmin
+    return rjsmin.jsmin(text)
+
+def rewrite_css_urls(path, text, files, static_url_path):
+    '''
+    Points the relative url()s of a bundled stylesheet at their built (or
+    original) files, since the bundle is served from another directory.
+    '''
+    def replace(match):
+        url = match.group(2)
+        if url.startswith(('data:', '/', '#')) or '://' in url:
+            return match.group(0)
+        target, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(path), target))
+        return 'url("{}/{}{}")'.format(static_url_path, files.get(target, target), suffix)
+    return CSS_URL.sub(replace, text)
+
+def precompress(full_path, data):
+    '''Writes the .br and .gz variants that come out smaller; returns their encodings.'''
+    import brotli
+    variants = {
+        'br': brotli.compress(data, quality=11),
+        'gzip': gzip.compress(data, compresslevel=9, mtime=0),
+    }
+    written = []
+    for encoding, suffix in ENCODINGS:
+        if len(variants[encoding]) < len(data):
+            with open(full_path + suffix, 'wb') as f:
+                f.write(variants[encoding])
+            written.append(encoding)
+    return written
+
+
+def build(app):
+    '''
+    Rebuilds static/dist/: every static file copied under a content-hashed
+    name, the BUNDLES concatenated and minified, gzip and brotli variants of
+    the text files, and the manifest mapping original names to built ones.
+    Returns the manifest.
+    '''
+    static = app.static_folder
+    out = os.path.join(static, BUILD_DIR)
+    shutil.rmtree(out, ignore_errors=True)
+    files, encodings = {}, {}
+
+    def write(path, data):
+        built = fingerprint(path, data)
+        full_path = os.path.join(static, built)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb') as f:
+            f.write(data)
+        if posixpath.splitext(path)[1] in COMPRESSIBLE:
+            encodings[built] = precompress(full_path, data)
+        files[path] = built
+
+    # plain files first, so the bundles' url()s can point at their hashed names
+    bundled = {source for sources in BUNDLES.values() for source in sources}
+    for directory, dirnames, filenames in os.walk(static):
+        if directory == static and BUILD_DIR in dirnames:
+            dirnames.remove(BUILD_DIR)
+        for filename in sorted(filenames):
+            path = os.path.relpath(os.path.join(directory, filename), static).replace(os.sep, '/')
+            if path not in bundled and path not in BUNDLES:
+                with open(os.path.join(static, path), 'rb') as f:
+                    write(path, f.read())
+
+    for name, sources in BUNDLES.items():
+        parts = []
+        for source in sources:
+            with open(os.path.join(static, source), encoding='utf-8') as f:
+                text = minify(source, f.read())
+            if source.endswith('.css'):
+                text = rewrite_css_urls(source, text, files, app.static_url_path)
+            parts.append(text.strip())
+        # a script without a trailing semicolon must not run into the next one
+        write(name, ('\n' if name.endswith('.css') else '\n;\n').join(parts).encode('utf-8'))
+
+    manifest = {'files': files, 'encodings': encodings}
+    with open(os.path.join(out, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    load(app)
+    return manifest
+
+def load(app):
+    '''Reads the manifest of the last build; without one, static files are served as they are.'''
+    try:
+        with open(os.path.join(app.static_folder, BUILD_DIR, MANIFEST)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        manifest = {'files': {}, 'encodings': {}}
+    manifest['built'] = set(manifest['files'].values())
+    app.extensions['assets'] = manifest
+
+
+#----------------------------------------------------------------------------#
+# Serving.
+#----------------------------------------------------------------------------#
+
+def manifest():
+    return current_app.extensions['assets']
+
+def hashed_static_url(endpoint, values):
+    '''url_for('static', filename=...) gives the built file when there is one.'''
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = manifest()['files'].get(values['filename'], values['filename'])
+
+def bundle_urls(name):
+    '''URLs to include for a bundle: the built file, or its sources before a build.'''
+    if name in manifest()['files']:
+        return [url_for('static', filename=name)]
+    return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+def send_static(filename):
+    '''
+    Static route: built files are cached for good (their name changes with
+    their content) and sent precompressed when the client accepts it.
+    '''
+    assets = manifest()
+    if filename not in assets['built']:
+        return current_app.send_static_file(filename)
+    path, encoding = filename, None
+    for candidate, suffix in ENCODINGS:
+        if candidate in assets['encodings'].get(filename, ()) and request.accept_encodings[candidate]:
+            path, encoding = filename + suffix, candidate
+            break
+    response = send_from_directory(current_app.static_folder, path,
+                                   mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                                   max_age=current_app.config['ASSETS_MAX_AGE'])
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    load(app)
+    app.url_defaults(hashed_static_url)
+    app.jinja_env.globals['bundle_urls'] = bundle_urls
+    app.view_functions['static'] = send_static
@@ -0,0 +1,468 @@
+import heapq
+import os
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, insort
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import event
+from sqlalchemy.orm import attributes
+from models import db, Venue, Artist, RoutingSession
+from cache import LRUCache
+
+
+#----------------------------------------------------------------------------#
+# Autocomplete.
+#----------------------------------------------------------------------------#
+
+# Type-ahead suggestions for the search boxes (GET /autocomplete?q=), served
+# from a prefix index each worker keeps in memory rather than an ILIKE per
+# keystroke. A name is found by the start of any of its first MAX_WORDS
+# words ("hop" finds "The Musical Hop"), and the names with the most
+# upcoming shows come first.
+#
+# The index is a flattened trie: the names' keys, cut or padded to
+# KEY_BYTES, sorted and packed back to back in one bytes object, so a prefix
+# is a range found by bisection and a million names take ~150MB instead of
+# the GBs of a trie of dicts. The best entries of each prefix are cached; a
+# prefix with many entries merges the best of its one-byte-longer prefixes.
+# An edit updates the cached lists of its keys' prefixes in place, and only
+# the lists an entry drops out of (removed, or its weight lowered) are
+# ranked again.
+
+KINDS = {'venue': Venue, 'artist': Artist}
+
+# bytes of a name's keys that are indexed; longer queries filter the matches
+# of their first KEY_BYTES
+KEY_BYTES = 24
+# words of a name its keys can start at
+MAX_WORDS = 4
+# a prefix matching at most this many keys is ranked by scanning them
+SCAN_LIMIT = 256
+# keys added since the packed ones were sorted, before they are merged in
+DELTA_LIMIT = 20000
+# keys sorted at a time while building (bounds the memory a build takes)
+BUILD_CHUNK = 200000
+
+WORD = re.compile(r'\w+')
+LOCAL = timezone(timedelta(hours=-3))
+
+
+def normalize(text):
+    '''The lowercased words of text without their accents, joined by single spaces.'''
+    text = text or ''
+    if not text.isascii():
+        text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    return ' '.join(WORD.findall(text.casefold()))
+
+def keys(words, width=KEY_BYTES):
+    '''The keys a name (normalized) is indexed under: its text from each of its first MAX_WORDS words on.'''
+    if not words:
+        return set()
+    split = words.split(' ')
+    return {' '.join(split[i:]).encode('utf-8')[:width].ljust(width, b'\0')
+            for i in range(min(len(split), MAX_WORDS))}
+
+def kind_of(obj):
+    for kind, model in KINDS.items():
+        if isinstance(obj, model):
+            return kind
+    return None
+
+def starts_with(name, words):
+    split = normalize(name).split(' ')
+    return any(' '.join(split[i:]).startswith(words) for i in range(min(len(split), MAX_WORDS)))
+
+
+class Records:
+    '''Fixed-width records packed in one bytes object, as a sequence bisect can search.'''
+
+    def __init__(self, data=b'', width=KEY_BYTES):
+        self.data = data
+        self.width = width
+
+    def __len__(self):
+        return len(self.data) // self.width
+
+    def __getitem__(self, i):
+        start = i * self.width
+        return self.data[start:start + self.width]
+
+    def __iter__(self):
+        width = self.width
+        return (self.data[start:start + width] for start in range(0, len(self.data), width))
+
+
+class PrefixIndex:
+    '''
+    (id, name, weight) entries found by the prefixes of their names' words,
+    the heaviest first. Each entry has a slot, which its keys point to; an
+    edited entry gets a new slot and its old one is left dead, to be dropped
+    by the next build.
+    '''
+
+    def __init__(self, limit=10, cache_size=100000, width=KEY_BYTES):
+        self.limit = limit
+        self.width = width
+        self.dead = 0
+        self._records = Records(b'', width)     # sorted keys
+        self._slots = array('i')                # slot of each key
+        self._delta = []                        # sorted (key, slot) added since
+        self._ids = array('i')                  # id of each slot, -1 once dead
+        self._weights = array('i')
+        self._text = bytearray()                # names of the slots, UTF-8, back to back
+        self._offsets = array('q', [0])
+        self._slot_of = array('i')              # slot of each id, -1 for none
+        self._tops = LRUCache(cache_size)       # best slots of each prefix
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, rows, **kwargs):
+        '''An index of the (id, name, weight) rows, sorted BUILD_CHUNK keys at a time and merged.'''
+        index = cls(**kwargs)
+        chunks, pending = [], []
+
+        def flush():
+            pending.sort()
+            chunks.append((b''.join(key for key, _ in pending), array('i', [slot for _, slot in pending])))
+            pending.clear()
+
+        for id, name, weight in rows:
+            slot = index._append(id, name, weight)
+            pending.extend((key, slot) for key in keys(normalize(name), index.width))
+            if len(pending) >= BUILD_CHUNK:
+                flush()
+        if pending or not chunks:
+            flush()
+        if len(chunks) == 1:
+            data, slots = chunks[0]
+        else:
+            data, slots = bytearray(), array('i')
+            for key, slot in heapq.merge(*[zip(Records(chunk, index.width), chunk_slots) for chunk, chunk_slots in chunks]):
+                data += key
+                slots.append(slot)
+        index._records, index._slots = Records(data, index.width), slots
+        return index
+
+    def __len__(self):
+        return len(self._ids) - self.dead
+
+    @property
+    def nbytes(self):
+        '''Bytes held by the keys, slots and names (the cached tops aside).'''
+        arrays = (self._slots, self._ids, self._weights, self._offsets, self._slot_of)
+        return (len(self._records.data) + len(self._text) + sum(len(a) * a.itemsize for a in arrays)
+                + sum(len(key) for key, _ in self._delta))
+
+    def ids(self):
+        return {id for id in self._ids if id >= 0}
+
+    def put(self, id, name, weight=None):
+        '''Adds or updates the entry of id; a weight of None keeps the current one.'''
+        with self._lock:
+            slot = self._slot(id)
+            if weight is None:
+                weight = self._weights[slot] if slot >= 0 else 0
+            if slot >= 0 and self._name(slot) == (name or ''):
+                if self._weights[slot] != weight:
+                    lowered = weight < self._weights[slot]
+                    self._weights[slot] = weight
+                    self._reconcile(slot, keys(normalize(name), self.width), lowered)
+                return
+            if slot >= 0:
+                self._remove(slot)
+            slot = self._append(id, name, weight)
+            added = keys(normalize(name), self.width)
+            for key in added:
+                insort(self._delta, (key, slot))
+            self._reconcile(slot, added)
+            if len(self._delta) > DELTA_LIMIT:
+                self._merge()
+
+    def remove(self, id):
+        with self._lock:
+            slot = self._slot(id)
+            if slot >= 0:
+                self._remove(slot)
+
+    def warm(self):
+        '''Ranks the prefixes whose best entries are not cached, ahead of the requests for them.'''
+        with self._lock:
+            self._top(b'')
+
+    def suggest(self, text):
+        '''[(weight, name, id)] of the heaviest entries whose name has a word starting with text.'''
+        words = normalize(text)
+        if not words:
+            return []
+        key = words.encode('utf-8')
+        with self._lock:
+            if len(key) <= self.width:
+                slots = self._top(key)
+            else:
+                slots = self._best(slot for slot in self._scan(*self._bounds(key[:self.width]))
+                                   if starts_with(self._name(slot), words))
+            return [(self._weights[slot], self._name(slot), self._ids[slot]) for slot in slots]
+
+    def _slot(self, id):
+        return self._slot_of[id] if 0 <= id < len(self._slot_of) else -1
+
+    def _name(self, slot):
+        return self._text[self._offsets[slot]:self._offsets[slot + 1]].decode('utf-8')
+
+    def _append(self, id, name, weight):
+        slot = len(self._ids)
+        self._ids.append(id)
+        self._weights.append(weight or 0)
+        self._text += (name or '').encode('utf-8')
+        self._offsets.append(len(self._text))
+        if id >= len(self._slot_of):
+            self._slot_of.extend([-1] * (id + 1 - len(self._slot_of)))
+        self._slot_of[id] = slot
+        return slot
+
+    def _remove(self, slot):
+        # its keys stay until the next build, pointing at a dead slot
+        self._slot_of[self._ids[slot]] = -1
+        self._ids[slot] = -1
+        self.dead += 1
+        self._reconcile(slot, keys(normalize(self._name(slot)), self.width))
+
+    def _reconcile(self, slot, changed, lowered=False):
+        '''Updates the cached best slots of the prefixes of changed, slot's keys, after slot was added, reweighted or removed.'''
+        alive = self._ids[slot] >= 0
+        for prefix in {key[:length] for key in changed for length in range(self.width + 1)}:
+            best = self._tops.get(prefix)
+            if best is None:
+                continue
+            if slot in best:
+                if not alive or lowered:
+                    # what takes its place is only known by ranking again
+                    self._tops.delete(prefix)
+                    continue
+            elif not alive or (len(best) == self.limit and self._rank(slot) < self._rank(best[-1])):
+                continue
+            else:
+                best.append(slot)
+            best.sort(key=self._rank, reverse=True)
+            del best[self.limit:]
+
+    def _merge(self):
+        '''Moves the delta into the packed keys; slots keep their numbers, so the cached tops stay valid.'''
+        records, width = self._records, self.width
+        parts, slots, start = [], array('i'), 0
+        for key, slot in self._delta:
+            if self._ids[slot] < 0:
+                continue
+            i = bisect_left(records, key, start)
+            parts += [records.data[start * width:i * width], key]
+            slots.extend(self._slots[start:i])
+            slots.append(slot)
+            start = i
+        parts.append(records.data[start * width:])
+        slots.extend(self._slots[start:])
+        self._records, self._slots, self._delta = Records(b''.join(parts), width), slots, []
+
+    def _bounds(self, prefix):
+        # 0xff never occurs in UTF-8, so every key with the prefix sorts below this
+        upper = prefix + b'\xff'
+        lo = bisect_left(self._records, prefix)
+        delta_lo = bisect_left(self._delta, (prefix,))
+        return (prefix, lo, bisect_left(self._records, upper, lo),
+                delta_lo, bisect_left(self._delta, (upper,), delta_lo))
+
+    def _scan(self, prefix, lo, hi, delta_lo, delta_hi):
+        found = set(self._slots[lo:hi])
+        found.update(slot for _, slot in self._delta[delta_lo:delta_hi])
+        return found
+
+    def _children(self, prefix, lo, hi, delta_lo, delta_hi):
+        '''The bytes that follow prefix in its keys.'''
+        n, found = len(prefix), set()
+        while lo < hi:
+            byte = self._records[lo][n]
+            found.add(byte)
+            lo = bisect_left(self._records, prefix + bytes((byte + 1,)), lo + 1, hi)
+        while delta_lo < delta_hi:
+            byte = self._delta[delta_lo][0][n]
+            found.add(byte)
+            delta_lo = bisect_left(self._delta, (prefix + bytes((byte + 1,)),), delta_lo + 1, delta_hi)
+        return found
+
+    def _rank(self, slot):
+        return self._weights[slot], -slot
+
+    def _best(self, slots):
+        return heapq.nlargest(self.limit, (slot for slot in slots if self._ids[slot] >= 0), key=self._rank)
+
+    def _top(self, prefix):
+        '''The best slots under prefix (cached).'''
+        best = self._tops.get(prefix)
+        if best is not None:
+            return best
+        bounds = self._bounds(prefix)
+        _, lo, hi, delta_lo, delta_hi = bounds
+        if hi - lo + delta_hi - delta_lo <= SCAN_LIMIT or len(prefix) >= self.width:
+            best = self._best(self._scan(*bounds))
+        else:
+            candidates = set()
+            for byte in self._children(*bounds):
+                candidates.update(self._top(prefix + bytes((byte,))))
+            best = self._best(candidates)
+        self._tops.set(prefix, best)
+        return best
+
+
+class Suggestions:
+    '''
+    The PrefixIndex of each kind in KINDS. A thread of each serving process
+    builds them, then catches up every AUTOCOMPLETE_REFRESH_INTERVAL seconds
+    with the names and show counters written since (by other workers too);
+    this worker's own commits are applied as they happen.
+
+    The thread starts with the first request, or earlier when a server
+    calls start() as it loads the app (asgi.py does), never merely because
+    the app was imported: CLI commands and scripts do not load the names.
+    A worker forked after start() (e.g. gunicorn --preload) inherits the
+    indexes built so far and starts its own thread to keep them current.
+    '''
+
+    KINDS = KINDS
+
+    def __init__(self, app=None):
+        self.indexes = {}
+        self.limit = 10
+        self.cache_size = 100000
+        self.interval = 60
+        self.watermark = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # held while the thread builds or refreshes, and across a fork
+        self._refreshing = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.limit = app.config.get('AUTOCOMPLETE_LIMIT', 10)
+        self.cache_size = app.config.get('AUTOCOMPLETE_CACHE_SIZE', 100000)
+        self.interval = app.config.get('AUTOCOMPLETE_REFRESH_INTERVAL', 60)
+        event.listen(RoutingSession, 'after_flush', self.flushed)
+        event.listen(RoutingSession, 'after_commit', self.committed)
+        event.listen(RoutingSession, 'after_rollback', self.rolled_back)
+        # a fork waits for a build or refresh in progress, so the child
+        # inherits whole indexes and no lock held by the thread
+        os.register_at_fork(before=self._refreshing.acquire, after_in_parent=self._refreshing.release,
+                            after_in_child=self.forked)
+        app.before_request(self.start)
+
+    def start(self):
+        '''Starts the thread of this process, unless it runs.'''
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(target=self.run, name='autocomplete', daemon=True).start()
+            self._pid = os.getpid()
+
+    def forked(self):
+        self._refreshing.release()
+        if self._pid is None:
+            return
+        # the parent's pooled connections are not this process's to use
+        with self.app.app_context():
+            db.engine.dispose(close=False)
+        self.start()
+
+    def run(self):
+        with self.app.app_context():
+            while True:
+                with self._refreshing:
+                    try:
+                        if self.watermark is None:
+                            self.rebuild()
+                        else:
+                            self.refresh()
+                    except Exception:
+                        self.app.logger.exception('Autocomplete index refresh failed')
+                    finally:
+                        db.session.remove()
+                time.sleep(self.interval)
+
+    def build(self, model):
+        rows = db.session.query(model.id, model.name, model.upcoming_shows_count).yield_per(10000)
+        return PrefixIndex.build(rows, limit=self.limit, cache_size=self.cache_size)
+
+    def rebuild(self, kinds=KINDS):
+        started = datetime.now(LOCAL)
+        for kind in kinds:
+            index = self.build(KINDS[kind])
+            index.warm()
+            self.indexes[kind] = index
+        if self.watermark is None:
+            self.watermark = started
+
+    def refresh(self):
+        '''Applies the names and counters written since the last refresh, and the deletions.'''
+        # rows written by transactions that committed late are read again
+        since = self.watermark - timedelta(seconds=self.interval)
+        started = datetime.now(LOCAL)
+        for kind, model in KINDS.items():
+            index = self.indexes[kind]
+            rows = db.session.query(model.id, model.name, model.upcoming_shows_count) \
+                .filter(db.or_(model.updated_at > since, model.counted_at > since)).all()
+            if len(rows) > DELTA_LIMIT or index.dead > len(index):
+                self.rebuild([kind])
+                continue
+            for id, name, weight in rows:
+                index.put(id, name, weight)
+            if db.session.query(db.func.count(model.id)).scalar() != len(index):
+                for id in index.ids() - {id for id, in db.session.query(model.id)}:
+                    index.remove(id)
+            # the prefixes the changes invalidated are ranked here, not by the next requests
+            index.warm()
+        self.watermark = started
+
+    def suggest(self, text, kind=None):
+        '''The best suggestions for text, of one kind or both.'''
+        found = []
+        for name in ([kind] if kind else KINDS):
+            index = self.indexes.get(name)
+            if index is not None:
+                found += [(weight, name, label, id) for weight, label, id in index.suggest(text)]
+        found.sort(key=lambda item: (-item[0], item[2]))
+        return [{"kind": name, "id": id, "name": label, "upcoming_shows_count": weight}
+                for weight, name, label, id in found[:self.limit]]
+
+    def flushed(self, session, flush_context):
+        '''Notes the venues and artists a flush wrote, to apply once committed.'''
+        pending = session.info.setdefault('autocomplete', {})
+        for obj in list(session.new) + list(session.dirty):
+            kind = kind_of(obj)
+            state = attributes.instance_dict(obj)
+            # read from the loaded state: a flush may not load anything
+            if kind and 'name' in state:
+                pending[kind, obj.id] = (state['name'], state.get('upcoming_shows_count'))
+        for obj in session.deleted:
+            kind = kind_of(obj)
+            if kind:
+                pending[kind, obj.id] = None
+
+    def committed(self, session):
+        for (kind, id), entry in session.info.pop('autocomplete', {}).items():
+            index = self.indexes.get(kind)
+            if index is None:
+                continue
+            if entry is None:
+                index.remove(id)
+            else:
+                index.put(id, *entry)
+
+    def rolled_back(self, session):
+        session.info.pop('autocomplete', None)
+
+
+suggestions = Suggestions()
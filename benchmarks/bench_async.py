@@ -0,0 +1,130 @@
+'''
+Requests per second of the sync and async (ASYNC_DB=1) serving modes.
+
+Run from the project root against a seeded database (see
+benchmarks/dataset.py); needs uvicorn, a2wsgi and the async driver
+(asyncpg or aiosqlite):
+
+    python -m benchmarks.bench_async --workers 4 --concurrency 32 --seconds 20
+
+Both modes are served by `uvicorn asgi:application` with the same number
+of workers and loaded with the same mix of venue, artist and API detail
+requests. The page cache is disabled so every request reaches the database.
+'''
+import argparse
+import http.client
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from app import app
+from models import db, Venue, Artist
+
+
+def sample_ids(model, count):
+    with app.app_context():
+        return [id for id, in db.session.query(model.id).order_by(db.func.random()).limit(count)]
+
+def paths(count, rng):
+    venues, artists = sample_ids(Venue, 200), sample_ids(Artist, 200)
+    choices = [
+        lambda: '/venues/{}'.format(rng.choice(venues)),
+        lambda: '/artists/{}'.format(rng.choice(artists)),
+        lambda: '/api/v1/venues/{}'.format(rng.choice(venues)),
+        lambda: '/api/v1/artists/{}'.format(rng.choice(artists)),
+    ]
+    return [rng.choice(choices)() for _ in range(count)]
+
+def wait_for(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('server on port {} did not start'.format(port))
+
+def load(port, targets, concurrency, seconds):
+    '''Keeps `concurrency` connections busy for `seconds`; returns (requests, errors, latencies).'''
+    deadline = time.time() + seconds
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def client(offset):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        i = offset
+        while time.time() < deadline:
+            path = targets[i % len(targets)]
+            i += concurrency
+            start = time.perf_counter()
+            try:
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read()
+                failed = response.status >= 500
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                failed = True
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += failed
+        connection.close()
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(latencies), errors[0], latencies
+
+def run(mode, args, targets):
+    env = dict(os.environ, ASYNC_DB='1' if mode == 'async' else '0', PAGE_CACHE='null', SQL_CHECK='off')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'asgi:application', '--workers', str(args.workers),
+         '--port', str(args.port), '--log-level', 'warning'], env=env)
+    try:
+        wait_for(args.port)
+        load(args.port, targets, args.concurrency, args.warmup)
+        requests, errors, latencies = load(args.port, targets, args.concurrency, args.seconds)
+    finally:
+        server.terminate()
+        server.wait()
+    latencies.sort()
+    return {
+        'rps': requests / args.seconds,
+        'p50_ms': statistics.median(latencies) * 1000 if latencies else 0,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0,
+        'errors': errors
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    targets = paths(5000, random.Random(args.seed))
+    results = {mode: run(mode, args, targets) for mode in ('sync', 'async')}
+
+    print('{} workers, {} concurrent clients, {:.0f}s'.format(args.workers, args.concurrency, args.seconds))
+    print('{:<8} {:>10} {:>10} {:>10} {:>8}'.format('mode', 'req/s', 'p50 ms', 'p99 ms', 'errors'))
+    for mode, result in results.items():
+        print('{:<8} {:>10.1f} {:>10.2f} {:>10.2f} {:>8}'.format(
+            mode, result['rps'], result['p50_ms'], result['p99_ms'], result['errors']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+'''
+Times the autocomplete prefix index on generated names.
+
+Run from the project root (no database needed):
+
+    python -m benchmarks.bench_autocomplete --names 1000000
+
+Builds a PrefixIndex of --names venue-like names, then times suggestions
+for random prefixes of them, with the prefixes' best names cached and
+again right after a burst of renames has invalidated some of them.
+'''
+import argparse
+import random
+import time
+
+from autocomplete import PrefixIndex, normalize
+
+ADJECTIVES = ['Lucky', 'Golden', 'Neon', 'Blue', 'Velvet', 'Silver', 'Electric', 'Crimson',
+              'Wild', 'Quiet', 'Rusty', 'Midnight', 'Grand', 'Little', 'Café', 'Old']
+NOUNS = ['Hall', 'Room', 'Garden', 'Tavern', 'Lounge', 'Club', 'Stage', 'Barn', 'Cellar',
+         'Dome', 'Station', 'Den', 'House', 'Theater', 'Pub', 'Loft']
+
+
+def name(i):
+    return '{}{} {} {}'.format('The ' if i % 2 else '', random.choice(ADJECTIVES), random.choice(NOUNS), i)
+
+
+def timed(index, prefixes):
+    times = []
+    for prefix in prefixes:
+        start = time.perf_counter()
+        index.suggest(prefix)
+        times.append((time.perf_counter() - start) * 1e6)
+    times.sort()
+    return sum(times) / len(times), times[len(times) // 2], times[int(len(times) * 0.99)], times[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--names', type=int, default=1000000)
+    parser.add_argument('--probes', type=int, default=20000)
+    parser.add_argument('--edits', type=int, default=100)
+    args = parser.parse_args()
+
+    names = [name(i) for i in range(1, args.names + 1)]
+    start = time.perf_counter()
+    index = PrefixIndex.build((i, text, random.randrange(50)) for i, text in enumerate(names, 1))
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    index.warm()
+    print('{} names: built in {:.1f}s, warmed in {:.1f}s, {:.0f}MB'.format(
+        len(index), built, time.perf_counter() - start, index.nbytes / 1e6))
+
+    prefixes = []
+    for _ in range(args.probes):
+        words = normalize(random.choice(names)).split(' ')
+        text = ' '.join(words[random.randrange(len(words)):])
+        prefixes.append(text[:random.randint(1, len(text))])
+
+    print('{:<24} {:>10} {:>10} {:>10} {:>10}'.format('suggest', 'mean us', 'p50 us', 'p99 us', 'max us'))
+    print('{:<24} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}'.format('cached', *timed(index, prefixes)))
+    for i in random.sample(range(1, args.names + 1), args.edits):
+        index.put(i, name(i))
+    print('{:<24} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}'.format(
+        'after {} renames'.format(args.edits), *timed(index, prefixes)))
+
+
+if __name__ == '__main__':
+    main()
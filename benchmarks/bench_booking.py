@@ -0,0 +1,89 @@
+'''
+Times the booking checks of bookings.py on a venue with many shows.
+
+Run from the project root against the database in DB_URI:
+
+    python -m benchmarks.bench_booking --shows 20000
+
+A venue and artist holding --shows back-to-back shows are written in a
+transaction that is rolled back at the end. Each probe is checked with
+bookings.conflicts (one seek per key) and with the plain range condition
+`start_time < end AND end_time > start`, which scans every earlier show.
+'''
+import argparse
+import random
+import time
+from datetime import datetime, timezone, timedelta
+
+from app import app
+from importer import insert
+from models import db, Venue, Artist, Show
+import bookings
+
+
+def seed(shows, duration):
+    now = datetime.now(timezone(timedelta(hours=-3)))
+    venue = Venue(name='Booking benchmark', city='Austin', state='TX', genres=['Jazz'],
+                  created_at=now, updated_at=now)
+    artist = Artist(name='Booking benchmark', city='Austin', state='TX', genres=['Jazz'],
+                    created_at=now, updated_at=now)
+    db.session.add_all([venue, artist])
+    db.session.flush()
+    first = now.replace(minute=0, second=0, microsecond=0) - timedelta(minutes=duration * shows // 2)
+    insert(Show, ['venue_id', 'artist_id', 'start_time', 'end_time', 'created_at', 'updated_at'], [{
+        "venue_id": venue.id,
+        "artist_id": artist.id,
+        "start_time": first + timedelta(minutes=duration * i),
+        "end_time": first + timedelta(minutes=duration * (i + 1)),
+        "created_at": now,
+        "updated_at": now
+    } for i in range(shows)])
+    return venue.id, artist.id, first, first + timedelta(minutes=duration * shows)
+
+
+def scan(venue_id, start_time, end_time):
+    return db.session.query(Show.id).filter(
+        Show.venue_id == venue_id, Show.start_time < end_time, Show.end_time > start_time).first()
+
+
+def timed(fn, probes):
+    times = []
+    for probe in probes:
+        start = time.perf_counter()
+        fn(*probe)
+        times.append((time.perf_counter() - start) * 1e6)
+    times.sort()
+    return sum(times) / len(times), times[len(times) // 2], times[int(len(times) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--probes', type=int, default=2000)
+    args = parser.parse_args()
+
+    with app.app_context():
+        duration = app.config['SHOW_DURATION']
+        try:
+            venue_id, artist_id, first, last = seed(args.shows, duration)
+            span = int((last - first).total_seconds() // 60)
+            probes = []
+            for _ in range(args.probes):
+                start = first + timedelta(minutes=random.randrange(span))
+                probes.append((start, start + timedelta(minutes=duration)))
+
+            print('{:<22} {:>10} {:>10} {:>10}'.format('check', 'mean us', 'p50 us', 'p99 us'))
+            for name, fn in [
+                ('conflicts (seek)', lambda s, e: bookings.conflicts(venue_id, artist_id, s, e)),
+                ('range scan', lambda s, e: scan(venue_id, s, e)),
+            ]:
+                print('{:<22} {:>10.1f} {:>10.1f} {:>10.1f}'.format(name, *timed(fn, probes)))
+            week = [(start, start + timedelta(days=7)) for start, _ in probes[:200]]
+            print('{:<22} {:>10.1f} {:>10.1f} {:>10.1f}'.format(
+                'free_slots (7 days)', *timed(lambda s, e: bookings.free_slots(venue_id, s, e), week)))
+        finally:
+            db.session.rollback()
+
+
+if __name__ == '__main__':
+    main()
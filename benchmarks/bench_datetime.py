@@ -0,0 +1,80 @@
+'''
+Renders 10k show tiles with the old and the memoized `datetime` filter.
+
+Run from the project root (DB_URI must be set, the database is not used):
+
+    python -m benchmarks.bench_datetime --tiles 10000
+'''
+import argparse
+import random
+import time
+from datetime import datetime, timezone, timedelta
+
+import babel.dates
+import dateutil.parser
+
+from app import app
+
+TILES = '''{% for show in shows %}
+<div class="tile tile-show">
+  <h4>{{ show.start_time|datetime('full') }}</h4>
+  <h5><a href="/artists/{{ show.artist_id }}">{{ show.artist_name }}</a></h5>
+</div>
+{% endfor %}'''
+
+
+def baseline_format_datetime(value, format='medium'):
+    # the filter as it was: parse, pick the pattern and let babel do the rest
+    if isinstance(value, str):
+        date = dateutil.parser.parse(value)
+    else:
+        date = value
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def shows(count, distinct_times):
+    tz = timezone(timedelta(hours=-3))
+    start = datetime(2021, 1, 1, 20, tzinfo=tz)
+    times = [start + timedelta(hours=6 * i) for i in range(distinct_times)]
+    return [{"start_time": random.choice(times), "artist_id": i, "artist_name": 'Artist {}'.format(i)}
+            for i in range(count)]
+
+
+def render(data, repeat):
+    template = app.jinja_env.from_string(TILES)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        template.render(shows=data)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tiles', type=int, default=10000)
+    parser.add_argument('--distinct-times', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    data = shows(args.tiles, args.distinct_times)
+    with app.test_request_context('/shows'):
+        app.preprocess_request()
+        memoized = app.jinja_env.filters['datetime']
+        app.jinja_env.filters['datetime'] = baseline_format_datetime
+        baseline_ms = render(data, args.repeat)
+        app.jinja_env.filters['datetime'] = memoized
+        memoized_ms = render(data, args.repeat)
+
+    print('{} tiles, {} distinct start times'.format(args.tiles, args.distinct_times))
+    print('{:<22} {:>10.2f} ms'.format('babel per tile', baseline_ms))
+    print('{:<22} {:>10.2f} ms'.format('memoized filter', memoized_ms))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+'''
+Times the similar artists job on generated artists, venues and shows.
+
+Run from the project root (no database needed; needs NumPy and SciPy):
+
+    python -m benchmarks.bench_recommendations --artists 10000 100000 1000000
+
+For each size, generates artists living in cities of about --city-artists
+artists each, playing about --shows shows mostly at their city's venues
+(the more popular venues more often), with one to three of --genres
+genres, then scores them like `flask recommend-artists` does, without
+writing the rows. Prints the time taken and the peak memory the scoring
+allocated beyond its input, which stays bounded by --chunk-pairs whatever
+the number of artists.
+'''
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+from scipy import sparse
+
+import recommendations
+
+
+def generate(artists, shows, city_artists, genres, rng):
+    '''Data in the shape recommendations.load returns.'''
+    cities = max(1, artists // city_artists)
+    venues_per_city = max(1, city_artists // 4)
+    city = rng.integers(0, cities, artists)
+    # a fifth of the artists have no shows yet
+    counts = np.where(rng.random(artists) < 0.2, 0, rng.geometric(1 / shows, artists))
+    rows = np.repeat(np.arange(artists), counts)
+    # most shows in the artist's city, at its more popular venues
+    local = np.minimum(rng.zipf(1.5, len(rows)) - 1, venues_per_city - 1)
+    away = rng.random(len(rows)) < 0.1
+    venue_city = np.where(away, rng.integers(0, cities, len(rows)), city[rows])
+    columns = venue_city * venues_per_city + local
+    venues = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, columns)),
+                               shape=(artists, cities * venues_per_city))
+    venues.sum_duplicates()
+
+    # genre combinations as bit masks of one to three genres, the first ones more common
+    weights = 1 / np.arange(1, genres + 1) ** 0.8
+    picked = rng.choice(genres, size=(artists, 3), p=weights / weights.sum())
+    picked[:, 1:][rng.random((artists, 2)) < [0.4, 0.7]] = -1
+    masks = np.zeros(artists, dtype=np.int64)
+    for column in picked.T:
+        masks |= np.where(column >= 0, 1 << np.maximum(column, 0), 0)
+    masks, combination = np.unique(masks, return_inverse=True)
+    bits = (masks[:, None] >> np.arange(genres)) & 1
+    return {
+        'ids': np.arange(1, artists + 1),
+        'venues': venues,
+        'popularity': np.asarray(venues.sum(axis=1)).ravel(),
+        'combination': combination.ravel(),
+        'combinations': sparse.csr_matrix(bits.astype(np.float32)),
+    }
+
+
+def nbytes(data):
+    total = 0
+    for value in data.values():
+        if sparse.issparse(value):
+            total += value.data.nbytes + value.indices.nbytes + value.indptr.nbytes
+        else:
+            total += value.nbytes
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--artists', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--shows', type=int, default=10, help='Mean shows per artist with any.')
+    parser.add_argument('--city-artists', type=int, default=2000)
+    parser.add_argument('--genres', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--genre-weight', type=float, default=0.3)
+    parser.add_argument('--chunk-pairs', type=int, default=2000000)
+    parser.add_argument('--max-venue-artists', type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print('{:>9} {:>9} {:>7} {:>7} {:>10} {:>8} {:>9} {:>10}'.format(
+        'artists', 'shows', 'combos', 'chunks', 'rows', 'secs', 'input MB', 'peak MB'))
+    for artists in args.artists:
+        data = generate(artists, args.shows, args.city_artists, args.genres, rng)
+        tracemalloc.start()
+        start = time.perf_counter()
+        chunks = written = 0
+        for lo, hi, rows, columns, ranks, scores in recommendations.similar(
+                data, args.limit, args.genre_weight, args.chunk_pairs, args.max_venue_artists):
+            chunks += 1
+            written += len(rows)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print('{:>9} {:>9} {:>7} {:>7} {:>10} {:>8.1f} {:>9.0f} {:>10.0f}'.format(
+            artists, int(data['venues'].sum()), data['combinations'].shape[0], chunks, written, elapsed,
+            nbytes(data) / 1e6, peak / 1e6))
+
+
+if __name__ == '__main__':
+    main()
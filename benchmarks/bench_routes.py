@@ -0,0 +1,229 @@
+'''
+Times every route of the app through the Flask test client.
+
+Seed a dataset first (see benchmarks/dataset.py), then run from the
+project root against the same DB_URI (PostgreSQL or SQLite):
+
+    python -m benchmarks.bench_routes --requests 200 --output before.json
+    python -m benchmarks.bench_routes --requests 200 --compare before.json
+
+For each route it reports p50/p95/p99 latency, SQL statements per request
+and the peak Python memory allocated while serving one request, and saves
+everything as JSON (with the commit and dataset size) so runs on different
+commits can be compared. Set PAGE_CACHE=null to time uncached detail pages.
+'''
+import argparse
+import json
+import random
+import re
+import resource
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import app
+from models import db, Venue, Artist
+from benchmarks.dataset import counts, GENRES
+
+SEARCH_TERMS = ['the', 'blue', 'room', 'jazz', 'band', 'new york', 'elec', 'zq']
+# routes that change data are only timed with --writes, and the ones that
+# delete or rewrite existing rows never are
+DESTRUCTIVE = {'delete_venue', 'delete_artist', 'edit_venue_submission', 'edit_artist_submission'}
+
+statements = 0
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    global statements
+    statements += 1
+
+
+def sample_ids(model, count, rng):
+    ids = [id for id, in db.session.query(model.id).order_by(db.func.random()).limit(count)]
+    return ids or [0]
+
+def csrf_token(client):
+    '''A CSRF token valid for the client's session, for the form submissions.'''
+    page = client.get('/shows/create').get_data(as_text=True)
+    return re.search(r'name="csrf_token"[^>]*value="([^"]+)"', page).group(1)
+
+def cases(rng, writes, token=None):
+    '''(name, method, url factory, form data factory) for every route.'''
+    venue_ids = sample_ids(Venue, 200, rng)
+    artist_ids = sample_ids(Artist, 200, rng)
+    when = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S')
+    venue_form = lambda: {
+        'csrf_token': token, 'name': 'Bench Venue {}'.format(rng.randrange(10 ** 9)), 'city': 'Austin', 'state': 'TX',
+        'address': '1 Main St', 'phone': '512-555-0100', 'genres': 'Jazz',
+        'facebook_link': 'https://facebook.com/bench', 'image_link': 'https://picsum.photos/300',
+        'website_link': 'https://bench.example', 'seeking_description': ''}
+    artist_form = lambda: {
+        'csrf_token': token, 'name': 'Bench Artist {}'.format(rng.randrange(10 ** 9)), 'city': 'Austin', 'state': 'TX',
+        'phone': '512-555-0100', 'genres': 'Jazz',
+        'facebook_link': 'https://facebook.com/bench', 'image_link': 'https://picsum.photos/300',
+        'website_link': 'https://bench.example', 'seeking_description': ''}
+    show_form = lambda: {'csrf_token': token, 'venue_id': rng.choice(venue_ids), 'artist_id': rng.choice(artist_ids), 'start_time': when}
+
+    def window(length):
+        '''ISO start and end (naive, so UTC-3) of a period within 60 days of now, on the hour.'''
+        start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=rng.randint(-1440, 1440))
+        return start.isoformat(), (start + length).isoformat()
+
+    fixed = {
+        'venues': [('', lambda: '/venues'), ('genre', lambda: '/venues?genre=' + rng.choice(GENRES))],
+        'artists': [('', lambda: '/artists'), ('genre', lambda: '/artists?genre=' + rng.choice(GENRES))],
+        'search_venues': [('', lambda: '/venues/search?search_term=' + rng.choice(SEARCH_TERMS))],
+        'search_artists': [('', lambda: '/artists/search?search_term=' + rng.choice(SEARCH_TERMS))],
+        'api.search_venues': [('', lambda: '/api/v1/venues/search?q=' + rng.choice(SEARCH_TERMS))],
+        'api.search_artists': [('', lambda: '/api/v1/artists/search?q=' + rng.choice(SEARCH_TERMS))],
+        'api.venue_availability': [('', lambda: '/api/v1/venues/{}/availability?start={}&end={}'.format(
+            rng.choice(venue_ids), *window(timedelta(minutes=app.config['SHOW_DURATION']))))],
+        'api.venue_free_slots': [('', lambda: '/api/v1/venues/{}/free-slots?start={}&end={}'.format(
+            rng.choice(venue_ids), *window(timedelta(days=7))))],
+    }
+    forms = {
+        'create_venue_submission': venue_form,
+        'create_artist_submission': artist_form,
+        'create_show_submission': show_form,
+    }
+    values = {
+        'venue_id': lambda: rng.choice(venue_ids),
+        'artist_id': lambda: rng.choice(artist_ids),
+    }
+
+    adapter = app.url_map.bind('localhost')
+    found = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        if rule.endpoint in ('static', 'metrics') or rule.endpoint in DESTRUCTIVE:
+            continue
+        if 'GET' in rule.methods:
+            if rule.endpoint in fixed:
+                for variant, url in fixed[rule.endpoint]:
+                    found.append((rule.endpoint + ('[{}]'.format(variant) if variant else ''), 'GET', url, None))
+                continue
+            for when_value in (('past', 'upcoming') if 'when' in rule.arguments else (None,)):
+                def url(rule=rule, when_value=when_value):
+                    args = {name: values[name]() for name in rule.arguments if name in values}
+                    if when_value is not None:
+                        args['when'] = when_value
+                    return adapter.build(rule.endpoint, args, method='GET')
+                name = rule.endpoint + ('[{}]'.format(when_value) if when_value else '')
+                found.append((name, 'GET', url, None))
+        elif writes and rule.endpoint in forms:
+            found.append((rule.endpoint, 'POST', lambda rule=rule: rule.rule, forms[rule.endpoint]))
+    return found
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+def measure(client, method, url, data, requests, warmup):
+    global statements
+    for _ in range(warmup):
+        client.open(url(), method=method, data=data() if data else None)
+    timings, queries, errors = [], [], 0
+    for _ in range(requests):
+        target = url()
+        form = data() if data else None
+        statements = 0
+        start = time.perf_counter()
+        response = client.open(target, method=method, data=form)
+        response.get_data()
+        timings.append((time.perf_counter() - start) * 1000)
+        queries.append(statements)
+        if response.status_code >= 500:
+            errors += 1
+    # allocation tracing slows requests down, so memory gets its own pass
+    tracemalloc.start()
+    peak = 0
+    for _ in range(min(requests, 10)):
+        tracemalloc.reset_peak()
+        client.open(url(), method=method, data=data() if data else None).get_data()
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+    return {
+        "example": target,
+        "requests": requests,
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "mean_ms": round(sum(timings) / len(timings), 3),
+        "queries": round(sum(queries) / len(queries), 2),
+        "peak_kib": round(peak / 1024, 1),
+        "errors": errors
+    }
+
+def commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results, baseline=None):
+    header = '{:<34} {:>9} {:>9} {:>9} {:>8} {:>10}'.format('route', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'peak KiB')
+    if baseline:
+        header += ' {:>9}'.format('p95 diff')
+    print(header)
+    for name, result in results['routes'].items():
+        line = '{:<34} {:>9.2f} {:>9.2f} {:>9.2f} {:>8.2f} {:>10.1f}'.format(
+            name, result['p50_ms'], result['p95_ms'], result['p99_ms'], result['queries'], result['peak_kib'])
+        before = baseline and baseline['routes'].get(name)
+        if before:
+            line += ' {:>+8.0f}%'.format((result['p95_ms'] / before['p95_ms'] - 1) * 100 if before['p95_ms'] else 0)
+        if result['errors']:
+            line += '  ({} errors)'.format(result['errors'])
+        print(line)
+    print('max RSS {:.1f} MiB'.format(results['max_rss_kib'] / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=100, help='Timed requests per route.')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--routes', help='Only time routes whose name contains this.')
+    parser.add_argument('--writes', action='store_true', help='Also time the create form submissions.')
+    parser.add_argument('--output', help='Where to save the JSON results (default bench-<commit>.json).')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare p95 against.')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    client = app.test_client()
+    token = csrf_token(client) if args.writes else None
+    with app.app_context():
+        dataset = counts()
+        found = cases(rng, args.writes, token)
+        dialect = db.engine.dialect.name
+
+    results = {
+        "commit": commit(),
+        "date": datetime.now().isoformat(timespec='seconds'),
+        "database": dialect,
+        "dataset": dataset,
+        "routes": {}
+    }
+    for name, method, url, data in found:
+        if args.routes and args.routes not in name:
+            continue
+        results['routes'][name] = measure(client, method, url, data, args.requests, args.warmup)
+    results['max_rss_kib'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    output = args.output or 'bench-{}.json'.format(results['commit'] or 'results')
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print('{} on {}, {}'.format(results['commit'], dialect, ', '.join('{} {}'.format(v, k) for k, v in dataset.items())))
+    report(results, baseline)
+    print('saved to {}'.format(output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+'''
+Compares search() against the old `name ILIKE '%term%'` query.
+
+Run from the project root against the database in DB_URI:
+
+    python -m benchmarks.bench_search --rows 1000000
+
+Missing venues are generated first, so the table holds at least --rows rows.
+'''
+import argparse
+import random
+import string
+import time
+from datetime import datetime, timezone, timedelta
+
+from app import app
+from models import db, Venue
+from search import search
+
+TERMS = ['hop', 'music', 'park', 'the', 'jazz', 'san', 'zq']
+WORDS = ['The', 'Musical', 'Hop', 'Park', 'Square', 'Live', 'Music', 'Coffee',
+         'Dueling', 'Pianos', 'Bar', 'Hall', 'Club', 'Lounge', 'Room', 'House']
+CITIES = ['San Francisco', 'New York', 'Austin', 'Seattle', 'Chicago', 'Denver']
+
+
+def seed(rows, chunk=10000):
+    count = db.session.query(db.func.count(Venue.id)).scalar()
+    now = datetime.now(timezone(timedelta(hours=-3)))
+    while count < rows:
+        batch = [{
+            "name": '{} {} {}'.format(random.choice(WORDS), random.choice(WORDS),
+                                      ''.join(random.choice(string.ascii_lowercase) for _ in range(5))),
+            "city": random.choice(CITIES),
+            "state": 'CA',
+            "created_at": now,
+            "updated_at": now
+        } for _ in range(min(chunk, rows - count))]
+        db.session.execute(Venue.__table__.insert(), batch)
+        db.session.commit()
+        count += len(batch)
+
+
+def ilike(term):
+    return Venue.query.filter(Venue.name.ilike('%{}%'.format(term))).order_by(Venue.name).all()
+
+
+def timed(fn, term, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = fn(term)
+    return (time.perf_counter() - start) / repeat * 1000, len(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with app.app_context():
+        seed(args.rows)
+        search(Venue, TERMS[0])  # builds the fallback index outside the timings
+        print('{:<8} {:>12} {:>8} {:>12} {:>8}'.format('term', 'ilike ms', 'rows', 'search ms', 'rows'))
+        for term in TERMS:
+            ilike_ms, ilike_rows = timed(ilike, term, args.repeat)
+            search_ms, search_rows = timed(lambda t: search(Venue, t).items, term, args.repeat)
+            print('{:<8} {:>12.2f} {:>8} {:>12.2f} {:>8}'.format(term, ilike_ms, ilike_rows, search_ms, search_rows))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+'''
+First-request latency of fresh workers with and without the template bytecode cache.
+
+Run from the project root (DB_URI must be set, but the measured pages
+do not query the database):
+
+    python -m benchmarks.bench_templates --runs 10
+
+Each run starts a new interpreter, imports the app and times the first
+request to every page in PAGES, as a recycled worker would.
+'''
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PAGES = ['/', '/venues/create', '/artists/create', '/shows/create']
+
+WORKER = '''
+import json, time
+from app import app
+client = app.test_client()
+timings = {}
+for page in %r:
+    start = time.perf_counter()
+    client.get(page)
+    timings[page] = (time.perf_counter() - start) * 1000
+print(json.dumps(timings))
+''' % PAGES
+
+
+def first_requests(cache_dir, runs):
+    env = dict(os.environ, TEMPLATE_CACHE_DIR=cache_dir, TEMPLATES_AUTO_RELOAD='0')
+    samples = {page: [] for page in PAGES}
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', WORKER], env=env)
+        for page, ms in json.loads(output.decode().strip().splitlines()[-1]).items():
+            samples[page].append(ms)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix='fyyur-jinja-')
+    try:
+        cold = first_requests('', args.runs)
+        subprocess.check_call([sys.executable, '-m', 'flask', 'compile-templates'],
+                              env=dict(os.environ, FLASK_APP='app', TEMPLATE_CACHE_DIR=cache_dir))
+        warm = first_requests(cache_dir, args.runs)
+    finally:
+        shutil.rmtree(cache_dir)
+
+    print('{:<18} {:>14} {:>14}'.format('first request', 'no cache ms', 'cache ms'))
+    for page in PAGES:
+        print('{:<18} {:>14.2f} {:>14.2f}'.format(
+            page, statistics.median(cold[page]), statistics.median(warm[page])))
+    print('{:<18} {:>14.2f} {:>14.2f}'.format(
+        'total', sum(statistics.median(cold[p]) for p in PAGES), sum(statistics.median(warm[p]) for p in PAGES)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+'''
+Checks with EXPLAIN that the queries for upcoming shows only read the
+current and later Show partitions.
+
+Run from the project root against a PostgreSQL database in DB_URI, seeded
+with benchmarks.dataset (tests/test_partitions.py runs the same checks on a
+few shows):
+
+    python -m benchmarks.check_pruning
+
+Prints the partitions each query plan reads, plus its time over --repeat
+runs, and exits with status 1 when a plan reads a partition of a month
+that ended before the query's window.
+'''
+import argparse
+import sys
+import time
+from datetime import datetime, timezone, timedelta
+
+from app import app
+from models import db, Show
+from queries import show_rows_query, anchor_query
+import calendars
+import partitions
+
+
+def relations(plan):
+    '''Names of the tables a JSON plan node and its children read.'''
+    found = {plan['Relation Name']} if 'Relation Name' in plan else set()
+    for child in plan.get('Plans', ()):
+        found |= relations(child)
+    return found
+
+def explain(query):
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    connection = db.session.connection()
+    plan, = connection.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + str(compiled), compiled.params).scalar()
+    return {name for name in relations(plan['Plan']) if name.startswith('Show_')}
+
+def timed(query, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        query.all()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def checks(now, since, venue_id, artist_id, upcoming_id):
+    '''(name, start of the window, query) of each query checked.'''
+    return [
+        ('venue upcoming shows', now, show_rows_query(Show.venue_id == venue_id, now, True, 50)),
+        ('artist upcoming shows', now, show_rows_query(Show.artist_id == artist_id, now, True, 50)),
+        ('upcoming load-more anchor', now, anchor_query(upcoming_id, now, True)),
+        ('venue calendar feed', since, calendars.feed_query(Show.venue_id == venue_id, since)),
+    ]
+
+def stale(read, months, start):
+    '''The partitions read of months that ended before start.'''
+    return {months[month][0] for month in months if partitions.add_months(month, 1) <= start} & read
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    with app.app_context():
+        if not partitions.is_partitioned(db.session.connection()):
+            sys.exit('The Show table is not partitioned (PostgreSQL only, see partitions.py).')
+        now = datetime.now(timezone(timedelta(hours=-3)))
+        since = now - timedelta(days=app.config['CALENDAR_PAST_DAYS'])
+        months = partitions.months(db.session.connection())
+        # the venue and artist with the most shows
+        venue_id, = db.session.query(Show.venue_id).group_by(Show.venue_id) \
+            .order_by(db.func.count(Show.id).desc()).first()
+        artist_id, = db.session.query(Show.artist_id).group_by(Show.artist_id) \
+            .order_by(db.func.count(Show.id).desc()).first()
+        upcoming_id, = db.session.query(Show.id).filter(Show.venue_id == venue_id, Show.start_time > now) \
+            .order_by(Show.start_time).first()
+
+        failed = False
+        print('{:<28} {:>6} {:>6} {:>9}  {}'.format('query', 'read', 'of', 'ms', 'partitions'))
+        for name, start, query in checks(now, since, venue_id, artist_id, upcoming_id):
+            read = explain(query)
+            # months that ended before the window must not be read
+            found = stale(read, months, start)
+            failed |= bool(found)
+            monthly = sorted(read - {partitions.DEFAULT})
+            print('{:<28} {:>6} {:>6} {:>9.2f}  {}{}{}'.format(
+                name, len(read), len(months) + 1, timed(query, args.repeat),
+                '{} .. {}'.format(monthly[0], monthly[-1]) if monthly else '-',
+                ' + default' if partitions.DEFAULT in read else '',
+                '  STALE: ' + ', '.join(sorted(found)) if found else ''))
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+'''
+Seeds a synthetic Fyyur dataset for the benchmarks.
+
+Run from the project root against the database in DB_URI (PostgreSQL or
+SQLite; missing tables are created):
+
+    python -m benchmarks.dataset --size large --reset
+    python -m benchmarks.dataset --venues 20000 --artists 100000 --shows 1000000
+
+Cities and genres follow skewed (Zipf-like) distributions, a few venues
+and artists hold most of the shows, and show times span two years either
+side of today so pages have both past and upcoming shows.
+'''
+import argparse
+import random
+import time
+from datetime import datetime, timezone, timedelta
+from itertools import accumulate
+
+from sqlalchemy import text
+
+from app import app
+from importer import chunks, insert
+from models import db, Venue, Artist, Show, SimilarArtist
+import counters
+import partitions
+
+SIZES = {
+    'small': (1000, 5000, 50000),
+    'medium': (10000, 50000, 500000),
+    'large': (100000, 500000, 5000000),
+}
+
+# (city, state), most populous first
+CITIES = [
+    ('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'), ('Houston', 'TX'),
+    ('Phoenix', 'AZ'), ('Philadelphia', 'PA'), ('San Antonio', 'TX'), ('San Diego', 'CA'),
+    ('Dallas', 'TX'), ('Austin', 'TX'), ('San Jose', 'CA'), ('Jacksonville', 'FL'),
+    ('Columbus', 'OH'), ('Charlotte', 'NC'), ('San Francisco', 'CA'), ('Indianapolis', 'IN'),
+    ('Seattle', 'WA'), ('Denver', 'CO'), ('Washington', 'DC'), ('Nashville', 'TN'),
+    ('Boston', 'MA'), ('Portland', 'OR'), ('Las Vegas', 'NV'), ('Detroit', 'MI'),
+    ('Memphis', 'TN'), ('Louisville', 'KY'), ('Baltimore', 'MD'), ('Milwaukee', 'WI'),
+    ('Albuquerque', 'NM'), ('New Orleans', 'LA'),
+]
+# genres, most common first
+GENRES = ['Rock n Roll', 'Pop', 'Hip-Hop', 'Electronic', 'Alternative', 'Jazz', 'Country',
+          'R&B', 'Folk', 'Soul', 'Blues', 'Punk', 'Heavy Metal', 'Funk', 'Reggae',
+          'Classical', 'Instrumental', 'Musical Theatre', 'Other']
+
+ADJECTIVES = ['Blue', 'Velvet', 'Electric', 'Golden', 'Wild', 'Silent', 'Neon', 'Rusty',
+              'Midnight', 'Crimson', 'Lucky', 'Broken', 'Little', 'Grand', 'Hidden', 'Royal']
+NOUNS = ['Room', 'Hall', 'Lounge', 'Club', 'Garden', 'Theater', 'Tavern', 'Cellar',
+         'Station', 'Barn', 'Pavilion', 'Stage', 'House', 'Loft', 'Den', 'Parlor']
+BANDS = ['Band', 'Collective', 'Trio', 'Quartet', 'Orchestra', 'Project', 'Sound', 'Crew',
+         'Brothers', 'Sisters', 'Ensemble', 'Experience', 'Kids', 'Machine', 'Riders', 'Echoes']
+
+
+# shows start up to this long before or after now
+SPAN = timedelta(days=730)
+
+# random slots tried for a show before giving up on it
+SLOT_ATTEMPTS = 20
+
+
+def zipf_weights(count, s=1.0):
+    return list(accumulate(1 / (rank ** s) for rank in range(1, count + 1)))
+
+CITY_WEIGHTS = zipf_weights(len(CITIES))
+GENRE_WEIGHTS = zipf_weights(len(GENRES), 0.8)
+
+
+def genres(rng):
+    picked = set(rng.choices(GENRES, cum_weights=GENRE_WEIGHTS, k=rng.choice((1, 1, 2, 2, 3))))
+    return sorted(picked)
+
+def phone(rng):
+    return '{}-{}-{}'.format(rng.randint(200, 999), rng.randint(100, 999), rng.randint(1000, 9999))
+
+def venue(rng, i, now):
+    city, state = rng.choices(CITIES, cum_weights=CITY_WEIGHTS)[0]
+    name = 'The {} {} {}'.format(rng.choice(ADJECTIVES), rng.choice(NOUNS), i)
+    return {
+        "name": name, "city": city, "state": state,
+        "address": '{} {} St'.format(rng.randint(1, 9999), rng.choice(ADJECTIVES)),
+        "phone": phone(rng), "genres": genres(rng),
+        "image_link": 'https://picsum.photos/seed/venue{}/300/300'.format(i),
+        "facebook_link": None, "website": None,
+        "seeking_talent": rng.random() < 0.3, "seeking_description": None,
+        "created_at": now, "updated_at": now
+    }
+
+def artist(rng, i, now):
+    city, state = rng.choices(CITIES, cum_weights=CITY_WEIGHTS)[0]
+    name = '{} {} {}'.format(rng.choice(ADJECTIVES), rng.choice(BANDS), i)
+    return {
+        "name": name, "city": city, "state": state,
+        "phone": phone(rng), "genres": genres(rng),
+        "image_link": 'https://picsum.photos/seed/artist{}/300/300'.format(i),
+        "facebook_link": None, "website": None,
+        "seeking_venue": rng.random() < 0.3, "seeking_description": None,
+        "created_at": now, "updated_at": now
+    }
+
+
+def seed_rows(model, make, count, rng, chunk_size, now):
+    start = time.time()
+    for batch in chunks((make(rng, i, now) for i in range(count)), chunk_size):
+        insert(model, list(batch[0]), batch)
+        db.session.commit()
+    print('{}: {} rows in {:.1f}s'.format(model.__tablename__, count, time.time() - start))
+
+def seed_shows(count, rng, chunk_size, now):
+    venue_ids = [id for id, in db.session.query(Venue.id).order_by(Venue.id)]
+    artist_ids = [id for id, in db.session.query(Artist.id).order_by(Artist.id)]
+    # a few venues and artists hold most of the shows
+    venue_weights = zipf_weights(len(venue_ids), 0.7)
+    artist_weights = zipf_weights(len(artist_ids), 0.7)
+    rng.shuffle(venue_ids)
+    rng.shuffle(artist_ids)
+    # shows start on a grid of SHOW_DURATION-long slots, and each venue and
+    # artist takes a slot at most once, so no two of their shows overlap;
+    # a show whose venue or artist has no free slot left is dropped
+    length = timedelta(minutes=app.config['SHOW_DURATION'])
+    slots = int(SPAN / length)
+    base = now.replace(minute=0, second=0, microsecond=0)
+    taken_venues, taken_artists = set(), set()
+    columns = ['venue_id', 'artist_id', 'start_time', 'end_time', 'created_at', 'updated_at']
+    start = time.time()
+    inserted = 0
+    for offset in range(0, count, chunk_size):
+        size = min(chunk_size, count - offset)
+        venues = rng.choices(venue_ids, cum_weights=venue_weights, k=size)
+        artists = rng.choices(artist_ids, cum_weights=artist_weights, k=size)
+        rows = []
+        for i in range(size):
+            for _ in range(SLOT_ATTEMPTS):
+                slot = rng.randint(-slots, slots)
+                venue_slot = venues[i] * (2 * slots + 1) + slot
+                artist_slot = artists[i] * (2 * slots + 1) + slot
+                if venue_slot not in taken_venues and artist_slot not in taken_artists:
+                    taken_venues.add(venue_slot)
+                    taken_artists.add(artist_slot)
+                    rows.append({
+                        "venue_id": venues[i],
+                        "artist_id": artists[i],
+                        "start_time": base + slot * length,
+                        "end_time": base + (slot + 1) * length,
+                        "created_at": now,
+                        "updated_at": now
+                    })
+                    break
+        if rows:
+            insert(Show, columns, rows)
+            db.session.commit()
+        inserted += len(rows)
+    print('Show: {} rows in {:.1f}s ({} dropped for want of a free slot)'.format(
+        inserted, time.time() - start, count - inserted))
+
+
+def create_tables():
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        db.session.commit()
+    db.create_all()
+
+def reset():
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text('TRUNCATE "SimilarArtist", "Show", "Artist", "Venue" RESTART IDENTITY'))
+    else:
+        for model in (SimilarArtist, Show, Artist, Venue):
+            db.session.query(model).delete()
+    db.session.commit()
+
+def counts():
+    return {model.__tablename__: db.session.query(db.func.count(model.id)).scalar()
+            for model in (Venue, Artist, Show)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', choices=sorted(SIZES), default='small')
+    parser.add_argument('--venues', type=int)
+    parser.add_argument('--artists', type=int)
+    parser.add_argument('--shows', type=int)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--reset', action='store_true', help='Delete every venue, artist and show (and similar artist) first.')
+    args = parser.parse_args()
+
+    venues, artists, shows = SIZES[args.size]
+    venues = args.venues if args.venues is not None else venues
+    artists = args.artists if args.artists is not None else artists
+    shows = args.shows if args.shows is not None else shows
+    rng = random.Random(args.seed)
+    now = datetime.now(timezone(timedelta(hours=-3)))
+
+    with app.app_context():
+        create_tables()
+        if args.reset:
+            reset()
+        seed_rows(Venue, venue, venues, rng, args.chunk_size, now)
+        seed_rows(Artist, artist, artists, rng, args.chunk_size, now)
+        # on PostgreSQL, the monthly partitions the shows go to
+        partitions.ensure(db.session.connection(), 2 * SPAN.days // 28 + app.config['SHOW_PARTITIONS_AHEAD'],
+                          now=now - SPAN)
+        db.session.commit()
+        seed_shows(shows, rng, args.chunk_size, now)
+        counters.roll(everything=True)
+        db.session.commit()
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(text('ANALYZE "Venue", "Artist", "Show"'))
+            db.session.commit()
+        print(counts())
+
+
+if __name__ == '__main__':
+    main()
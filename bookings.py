@@ -0,0 +1,211 @@
+import bisect
+import functools
+from datetime import timedelta, timezone
+from flask import current_app
+from sqlalchemy import text
+from models import db, Venue, Artist, Show
+
+
+#----------------------------------------------------------------------------#
+# Bookings.
+#----------------------------------------------------------------------------#
+
+# A venue (or an artist) holds at most one show at a time: their shows'
+# [start_time, end_time) ranges never overlap. PostgreSQL enforces it with
+# GiST exclusion constraints, created on each monthly partition by
+# partitions.py (and by migration 5c1e9a3f7d20 on the partitions it made);
+# the checks below turn that into a readable error, and are the only guard
+# on SQLite.
+#
+# Because the ranges of one venue are disjoint, ordering its shows by
+# start_time orders them by end_time too, so the only show that can
+# overlap a slot is the last one starting before the slot ends: every
+# check is a single seek on the (venue_id, start_time) index. Shows last at
+# most SHOW_MAX_DURATION, so that show also starts after the slot's start
+# minus that, which bounds the seek to the one or two monthly partitions
+# it can be in (see partitions.py).
+
+NAMES = ('venue', 'artist')
+
+# rows whose bookings check_rows verifies in one statement (a power of two):
+# two columns each, under the limits on result columns (1664 on PostgreSQL,
+# 2000 on SQLite)
+CHECKS_PER_STATEMENT = 512
+
+# the shows a seek looks through; built once, since every check needs it
+EARLIER = Show.__table__.alias('earlier')
+
+# SQLite hands times back naive; the app writes them in UTC-3
+LOCAL = timezone(timedelta(hours=-3))
+
+
+def aware(value):
+    return value if value is None or value.tzinfo else value.replace(tzinfo=LOCAL)
+
+def end_time(start_time, end_time=None):
+    '''The end of a show: the given one, or SHOW_DURATION minutes after its start.'''
+    return end_time or start_time + timedelta(minutes=current_app.config['SHOW_DURATION'])
+
+def overlapping_select(name, id, start_time, end_time, earliest):
+    '''
+    SELECT of the show of venue/artist `id` (name is "venue" or "artist")
+    overlapping the slot; `earliest` is start_time minus SHOW_MAX_DURATION.
+    '''
+    show, earlier = Show.__table__, EARLIER
+    latest = db.select(earlier.c.id).where(
+        earlier.c[name + '_id'] == id, earlier.c.start_time < end_time, earlier.c.start_time > earliest,
+        # legacy zero-length shows overlap nothing (see the migration)
+        earlier.c.end_time > earlier.c.start_time
+    ).order_by(earlier.c.start_time.desc()).limit(1).scalar_subquery()
+    return db.select(show.c.id, show.c.venue_id, show.c.artist_id, show.c.start_time, show.c.end_time) \
+        .where(show.c.id == latest, show.c.end_time > start_time,
+               # the bounds of the seek again: the id alone would probe every partition
+               show.c.start_time < end_time, show.c.start_time > earliest)
+
+# the single checks run often (form submissions, the availability API):
+# their statements are built once, so only the bound values change
+OVERLAPPING = {name: overlapping_select(name, db.bindparam('id'), db.bindparam('start_time', type_=Show.start_time.type),
+                                        db.bindparam('end_time', type_=Show.end_time.type),
+                                        db.bindparam('earliest', type_=Show.start_time.type))
+               for name in NAMES}
+
+def lock(venue_ids, artist_ids):
+    '''
+    Makes concurrent bookings of the same venues and artists check and
+    write one at a time, before the checks: two could otherwise both pass
+    the checks. SQLite takes its write lock. PostgreSQL locks the venue and
+    artist rows, in id order so two bookings never wait on each other
+    crosswise; the counters update those rows anyway (see counters.py), and
+    updating them after inserting the shows, without the lock, deadlocks
+    concurrent bookings. The constraints still reject the loser of any race
+    the lock misses (see is_conflict).
+    '''
+    if db.engine.dialect.name == 'sqlite':
+        # a write matching no row, which still starts a write transaction
+        db.session.execute(text('UPDATE "Show" SET id = id WHERE 0'))
+        return
+    for model, ids in ((Venue, venue_ids), (Artist, artist_ids)):
+        ids = sorted(set(ids))
+        if ids:
+            db.session.query(model.id).filter(model.id.in_(ids)).order_by(model.id) \
+                .with_for_update(key_share=True).all()
+
+def earliest(start_time):
+    return start_time - timedelta(minutes=current_app.config['SHOW_MAX_DURATION'])
+
+def bounds(start_time, end_time):
+    # aware times: on PostgreSQL a naive one is a timestamp, whose comparison
+    # with the timestamptz column the planner cannot prune partitions with
+    start_time, end_time = aware(start_time), aware(end_time)
+    return {'start_time': start_time, 'end_time': end_time, 'earliest': earliest(start_time)}
+
+def overlapping(name, id, start_time, end_time):
+    return db.session.execute(OVERLAPPING[name], dict(bounds(start_time, end_time), id=id)).first()
+
+def conflicts(venue_id, artist_id, start_time, end_time):
+    '''{"venue"/"artist": show} for each of the show's venue and artist already booked in the slot.'''
+    found = {}
+    for name, id in (('venue', venue_id), ('artist', artist_id)):
+        show = overlapping(name, id, start_time, end_time) if id is not None else None
+        if show is not None:
+            found[name] = show
+    return found
+
+def describe(name, show):
+    # PostgreSQL hands times back in UTC: shown in the app's UTC-3, like the form takes them
+    return 'The {} already has show {} from {} to {}.'.format(
+        name, show.id, aware(show.start_time).astimezone(LOCAL).isoformat(),
+        aware(show.end_time).astimezone(LOCAL).isoformat())
+
+@functools.lru_cache(maxsize=None)
+def check_statement(size):
+    '''
+    One SELECT of the ids of the shows overlapping `size` rows: a column per
+    row and name, the seek of overlapping_select, with row i bound to
+    venue_id_i, artist_id_i, start_time_i, end_time_i and earliest_i.
+    '''
+    def bound(key, i, column=None):
+        return db.bindparam('{}_{}'.format(key, i), type_=Show.__table__.c[column or key].type)
+    return db.select(*[
+        overlapping_select(name, bound(name + '_id', i), bound('start_time', i), bound('end_time', i),
+                           bound('earliest', i, 'start_time'))
+            .with_only_columns(Show.__table__.c.id).scalar_subquery()
+        for i in range(size) for name in NAMES
+    ])
+
+def check_rows(rows):
+    '''
+    Errors ({index: [message]}) of the show rows (dicts of venue_id,
+    artist_id, start_time and end_time) that overlap a stored show or an
+    earlier row of the same list. The stored shows are checked with one
+    statement per CHECKS_PER_STATEMENT rows; chunks are padded to a power
+    of two so a handful of statements, built once, serve every batch.
+    '''
+    found = {}
+    for offset in range(0, len(rows), CHECKS_PER_STATEMENT):
+        chunk = rows[offset:offset + CHECKS_PER_STATEMENT]
+        size = 1 << (len(chunk) - 1).bit_length()
+        params = {}
+        for i in range(size):
+            # padding rows have no venue or artist, so they match nothing
+            row = chunk[i] if i < len(chunk) else {}
+            values = dict(row and bounds(row['start_time'], row['end_time']),
+                          venue_id=row.get('venue_id'), artist_id=row.get('artist_id'))
+            for key in ('venue_id', 'artist_id', 'start_time', 'end_time', 'earliest'):
+                params['{}_{}'.format(key, i)] = values.get(key)
+        ids = db.session.execute(check_statement(size), params).one()
+        for i, id in enumerate(ids[:len(chunk) * len(NAMES)]):
+            if id is not None:
+                found[offset + i // len(NAMES), NAMES[i % len(NAMES)]] = id
+    shows = {show.id: show for show in db.session.query(
+        Show.id, Show.start_time, Show.end_time).filter(Show.id.in_(set(found.values())))} if found else {}
+
+    errors = {}
+    taken = {name: {} for name in NAMES}
+    for index, row in enumerate(rows):
+        start, end = aware(row['start_time']), aware(row['end_time'])
+        messages = [describe(name, shows[found[index, name]]) for name in NAMES if (index, name) in found]
+        for name in NAMES:
+            # the accepted rows of a key are disjoint too: one bisect finds
+            # the only one that can overlap
+            accepted = taken[name].get(row[name + '_id'], [])
+            before = bisect.bisect_left(accepted, (end,))
+            if before and accepted[before - 1][1] > start:
+                messages.append('The {} is also booked by an earlier show of this list.'.format(name))
+        if messages:
+            errors[index] = messages
+            continue
+        for name in NAMES:
+            bisect.insort(taken[name].setdefault(row[name + '_id'], []), (start, end))
+    return errors
+
+def free_slots(venue_id, start_time, end_time, min_length=timedelta(0)):
+    '''
+    The [(start, end)] gaps of at least min_length between the venue's
+    shows within [start_time, end_time): the show overlapping start_time,
+    found with one seek, and one index range scan over the rest.
+    '''
+    shows = []
+    first = overlapping('venue', venue_id, start_time, start_time + timedelta(microseconds=1))
+    if first is not None:
+        shows.append((first.start_time, first.end_time))
+    shows += db.session.query(Show.start_time, Show.end_time).filter(
+        Show.venue_id == venue_id, Show.start_time >= start_time, Show.start_time < end_time,
+        Show.end_time > Show.start_time
+    ).order_by(Show.start_time).all()
+
+    slots = []
+    shortest = max(min_length, timedelta(microseconds=1))
+    cursor, end_time = aware(start_time), aware(end_time)
+    for show_start, show_end in shows:
+        show_start, show_end = aware(show_start), aware(show_end)
+        if show_start - cursor >= shortest:
+            slots.append((cursor, show_start))
+        cursor = max(cursor, show_end)
+    if end_time - cursor >= shortest:
+        slots.append((cursor, end_time))
+    return slots
+
+def is_conflict(error):
+    '''Whether a failed INSERT broke one of the exclusion constraints (PostgreSQL error 23P01).'''
+    return getattr(getattr(error, 'orig', None), 'pgcode', None) == '23P01'
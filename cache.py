@@ -0,0 +1,133 @@
+import json
+import time
+from collections import OrderedDict
+from threading import Lock
+from models import db, Show
+from metrics import metrics
+
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+class LRUCache:
+    '''In-process cache holding at most max_entries values, least recently used evicted first.'''
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl if ttl else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+
+class RedisCache:
+    '''Cache shared by every worker, kept in Redis (needs the `redis` package).'''
+
+    def __init__(self, url, prefix='fyyur:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl or None)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+
+class PageCache:
+    '''
+    Rendered venue/artist page fragments, keyed by entity id and stamped with
+    the page's version row (see queries.page_version), which changes with
+    the entity, its shows and the venues/artists they link to. An entry is
+    only served while its stamp matches, so every worker stops serving a
+    stale fragment on its next lookup; the write paths also drop the
+    entries they make stale, which frees them early in this process.
+
+    Lookups are counted on /metrics (fyyur_page_cache_lookups_total).
+
+    The backend comes from the PAGE_CACHE setting: "lru" (default) keeps
+    PAGE_CACHE_SIZE entries per process, "redis" shares them through
+    PAGE_CACHE_URL and "null" disables caching.
+    '''
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config.get('PAGE_CACHE', 'lru')
+        if kind == 'redis':
+            self.backend = RedisCache(app.config['PAGE_CACHE_URL'])
+        elif kind == 'lru':
+            self.backend = LRUCache(app.config.get('PAGE_CACHE_SIZE', 1024))
+        else:
+            self.backend = None
+        self.ttl = app.config.get('PAGE_CACHE_TTL')
+
+    def get(self, kind, id, stamp):
+        entry = self.backend.get('{}:{}'.format(kind, id)) if self.backend else None
+        hit = entry is not None and entry[0] == stamp
+        metrics.registry.inc('fyyur_page_cache_lookups_total', (('kind', kind), ('result', 'hit' if hit else 'miss')))
+        return entry[1] if hit else None
+
+    def set(self, kind, id, stamp, content):
+        if self.backend:
+            self.backend.set('{}:{}'.format(kind, id), [stamp, content], self.ttl)
+
+    def invalidate(self, kind, *ids):
+        if self.backend:
+            self.backend.delete(*['{}:{}'.format(kind, id) for id in ids])
+
+    def invalidate_venue(self, venue_id):
+        '''Drops a venue's page and the pages of the artists playing there.'''
+        artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+        self.invalidate('venue', venue_id)
+        self.invalidate('artist', *[id for id, in artist_ids])
+
+    def invalidate_artist(self, artist_id):
+        '''Drops an artist's page and the pages of the venues they play at.'''
+        venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+        self.invalidate('artist', artist_id)
+        self.invalidate('venue', *[id for id, in venue_ids])
+
+    def stats(self):
+        '''This process's lookups: {"hits", "misses", "hit_rate"}.'''
+        counts = {'hit': 0, 'miss': 0}
+        for (name, labels), value in metrics.registry.snapshot().items():
+            if name == 'fyyur_page_cache_lookups_total':
+                counts[dict(labels)['result']] += value
+        total = counts['hit'] + counts['miss']
+        return {"hits": counts['hit'], "misses": counts['miss'], "hit_rate": counts['hit'] / total if total else None}
+
+page_cache = PageCache()
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta, timezone
+from flask import Response, current_app, request, stream_with_context, url_for
+from werkzeug.exceptions import BadRequest
+from models import db, Venue, Artist, Show
+from queries import request_now, page_version, entity_version, feed_version
+from api import STREAM_BATCH_SIZE
+import bookings
+
+
+#----------------------------------------------------------------------------#
+# Calendar feeds.
+#----------------------------------------------------------------------------#
+
+# iCalendar (RFC 5545) feeds of a venue's or an artist's shows, for calendar
+# apps to subscribe to. The events are streamed off a server-side cursor in
+# start_time order, and clients polling an unchanged feed get a 304 (see
+# venue_version below) before the shows are read at all.
+
+PRODID = '-//Fyyur//Shows//EN'
+
+# content lines longer than this many octets are folded
+LINE_OCTETS = 75
+
+
+def since():
+    '''
+    Start of the feed's window: ?since= (an ISO 8601 date or time), else
+    CALENDAR_PAST_DAYS before today. Whole days, so the default window, and
+    the feed's ETag with it, change once a day.
+    '''
+    value = request.args.get('since')
+    if not value:
+        today = request_now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return today - timedelta(days=current_app.config['CALENDAR_PAST_DAYS'])
+    try:
+        time = datetime.fromisoformat(value)
+    except ValueError:
+        raise BadRequest('since is not an ISO 8601 date or time.')
+    return bookings.aware(time).astimezone(bookings.LOCAL)
+
+def venue_version(venue_id, **kwargs):
+    return page_version(entity_version(Venue, venue_id), feed_version(Show.venue_id == venue_id, since()))
+
+def artist_version(artist_id, **kwargs):
+    return page_version(entity_version(Artist, artist_id), feed_version(Show.artist_id == artist_id, since()))
+
+def escape(text):
+    return (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\r', '').replace('\n', '\\n')
+
+def fold(line):
+    '''The content line, folded at LINE_OCTETS octets without splitting a character.'''
+    data = line.encode('utf-8')
+    if len(data) <= LINE_OCTETS:
+        return line + '\r\n'
+    parts, start, limit = [], 0, LINE_OCTETS
+    while start < len(data):
+        end = min(start + limit, len(data))
+        # back off to the start of a UTF-8 character
+        while end < len(data) and data[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(data[start:end].decode('utf-8'))
+        # continuation lines start with a space, which counts toward the limit
+        start, limit = end, LINE_OCTETS - 1
+    return '\r\n '.join(parts) + '\r\n'
+
+def utc(value):
+    return bookings.aware(value).astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+def event(row, host):
+    location = ', '.join(part for part in (row.venue_name, row.venue_address, row.venue_city, row.venue_state) if part)
+    return ''.join(fold(line) for line in (
+        'BEGIN:VEVENT',
+        'UID:show-{}@{}'.format(row.id, host),
+        'DTSTAMP:' + utc(row.updated_at),
+        'DTSTART:' + utc(row.start_time),
+        'DTEND:' + utc(row.end_time),
+        'SUMMARY:' + escape('{} at {}'.format(row.artist_name, row.venue_name)),
+        'LOCATION:' + escape(location),
+        'URL:' + url_for('show_artist', artist_id=row.artist_id, _external=True),
+        'END:VEVENT',
+    ))
+
+def feed_query(criterion, start):
+    return db.session.query(
+        Show.id, Show.start_time, Show.end_time, Show.updated_at, Show.artist_id,
+        Venue.name.label('venue_name'), Venue.address.label('venue_address'),
+        Venue.city.label('venue_city'), Venue.state.label('venue_state'),
+        Artist.name.label('artist_name')
+    ).join(Venue, Venue.id == Show.venue_id) \
+     .join(Artist, Artist.id == Show.artist_id) \
+     .filter(criterion, Show.start_time >= start) \
+     .order_by(Show.start_time, Show.id)
+
+def feed(name, criterion, start):
+    '''Streams the shows matching criterion from start on as a text/calendar response.'''
+    rows = feed_query(criterion, start).yield_per(STREAM_BATCH_SIZE)
+    host = request.host.split(':')[0]
+
+    def generate():
+        yield ''.join(fold(line) for line in (
+            'BEGIN:VCALENDAR',
+            'VERSION:2.0',
+            'PRODID:' + PRODID,
+            'CALSCALE:GREGORIAN',
+            'METHOD:PUBLISH',
+            'X-WR-CALNAME:' + escape(name),
+        ))
+        batch = []
+        for row in rows:
+            batch.append(event(row, host))
+            if len(batch) == STREAM_BATCH_SIZE:
+                yield ''.join(batch)
+                batch = []
+        yield ''.join(batch) + 'END:VCALENDAR\r\n'
+    return Response(stream_with_context(generate()), mimetype='text/calendar')
@@ -0,0 +1,93 @@
+import functools
+import hashlib
+import inspect
+import time
+from datetime import datetime
+from flask import current_app, g, make_response, request, session
+from werkzeug.http import is_resource_modified
+
+
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#----------------------------------------------------------------------------#
+
+def conditional(version):
+    '''
+    Answers a GET with 304 Not Modified, before the view queries or renders
+    anything, when the client's copy of the page is still current. Put it
+    under the route decorator:
+
+        @app.route('/venues/<int:venue_id>')
+        @conditional(venue_version)
+
+    `version(**view_args)` runs one aggregate query (see queries.page_version)
+    whose row changes whenever the page would, or returns None to skip the
+    check. The page gets a weak ETag from that row and Last-Modified from
+    its latest time; a page showing flashed messages gets neither.
+    '''
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapper(*args, **kwargs):
+                state = check(version, kwargs)
+                if isinstance(state, current_app.response_class):
+                    return state
+                return validated(await view(*args, **kwargs), state)
+        else:
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                state = check(version, kwargs)
+                if isinstance(state, current_app.response_class):
+                    return state
+                return validated(view(*args, **kwargs), state)
+        return wrapper
+    return decorator
+
+def check(version, view_args):
+    '''The 304 response when the client is current, else the version row (None for no validators).'''
+    if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+        return None
+    row = g.page_version = version(**view_args)
+    if row is None:
+        return None
+    etag, last_modified = validators(row)
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return row
+    return validated(current_app.response_class(status=304), row)
+
+def request_version(version, **view_args):
+    '''
+    The version row check() read for this request (one statement saved),
+    or a fresh one when it skipped the check (e.g. for a page with flashes).
+    '''
+    if 'page_version' in g:
+        return g.page_version
+    return version(**view_args)
+
+def validators(row):
+    '''
+    (etag, last_modified) of a page built from the version row. Besides the
+    data, the page depends on the request's locale and timezone and embeds
+    the session's CSRF token, which is re-signed every half of its lifetime
+    so a revalidated page never carries an expired one.
+    '''
+    limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    token = session.get(current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token'))
+    key = repr((tuple(row), g.get('locale'), g.get('timezone'), token, int(time.time() // (limit / 2)) if limit else 0))
+    times = [value for value in row if isinstance(value, datetime)]
+    return hashlib.sha1(key.encode('utf-8')).hexdigest(), max(times) if times else None
+
+def validated(rv, row):
+    response = make_response(rv)
+    if row is None or response.status_code not in (200, 304):
+        return response
+    # validators are computed after the view ran, since rendering may have
+    # created the session's CSRF token
+    etag, last_modified = validators(row)
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Accept-Language')
+    return response
@@ -12,3 +12,130 @@ DEBUG = True
 # TODO IMPLEMENT DATABASE URL
 SQLALCHEMY_DATABASE_URI = os.environ['DB_URI']
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Connection pool of each worker (see pooling.py): DB_POOL_SIZE connections
+# kept open, up to DB_MAX_OVERFLOW more under load, DB_POOL_TIMEOUT seconds
+# to wait for one before failing, connections replaced after DB_POOL_RECYCLE
+# seconds and checked with a ping before use (which weeds out the dead ones
+# after a failover). Set DB_PGBOUNCER=1 behind PgBouncer in transaction
+# pooling mode to turn off prepared statements.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', '0') == '1'
+
+# Optional read replica (see replicas.py). With REPLICA_DB_URI set, GET
+# requests read from it unless the client wrote something in the last
+# REPLICA_STICKY_SECONDS or the replica is more than REPLICA_MAX_LAG seconds
+# behind (checked every REPLICA_LAG_CHECK_INTERVAL seconds); writes always
+# go to DB_URI.
+REPLICA_DB_URI = os.environ.get('REPLICA_DB_URI', '')
+SQLALCHEMY_BINDS = {'replica': REPLICA_DB_URI} if REPLICA_DB_URI else {}
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 5))
+REPLICA_LAG_CHECK_INTERVAL = 5
+
+# Number of shows listed per section on the venue and artist pages; the rest
+# are reachable through the "load more" links.
+PAST_SHOWS_LIMIT = 10
+UPCOMING_SHOWS_LIMIT = 50
+
+# Most venues/artists a single search returns.
+SEARCH_RESULTS_LIMIT = 50
+
+# Without pg_trgm, search runs on an in-memory index per process; rows it
+# did not see written (bulk loads, other workers) show up within this many
+# seconds (see search.py).
+SEARCH_INDEX_REFRESH_INTERVAL = 5
+
+# Rows per page on the paginated listings (/artists, /shows).
+PAGE_SIZE = 50
+
+# Type-ahead suggestions (/autocomplete, see autocomplete.py): at most
+# AUTOCOMPLETE_LIMIT names per answer, the best names of up to
+# AUTOCOMPLETE_CACHE_SIZE prefixes cached per kind, and the index of each
+# worker catching up with the other workers' writes every
+# AUTOCOMPLETE_REFRESH_INTERVAL seconds.
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_CACHE_SIZE = 100000
+AUTOCOMPLETE_REFRESH_INTERVAL = 60
+
+# Cache of rendered venue/artist pages: "lru" (per process), "redis" (shared
+# through PAGE_CACHE_URL) or "null". Entries also expire after PAGE_CACHE_TTL
+# seconds so shows move from upcoming to past on time.
+PAGE_CACHE = os.environ.get('PAGE_CACHE', 'lru')
+PAGE_CACHE_URL = os.environ.get('PAGE_CACHE_URL', 'redis://localhost:6379/0')
+PAGE_CACHE_SIZE = 1024
+PAGE_CACHE_TTL = 60
+
+# Most shows accepted by one POST /shows/batch.
+SHOW_BATCH_LIMIT = 1000
+
+# Length in minutes of a show listed without an end time, the longest a
+# show may last (which bounds the booking checks' seeks, see bookings.py),
+# and the longest date range (in days) one free-slots request may cover.
+SHOW_DURATION = 120
+SHOW_MAX_DURATION = 24 * 60
+FREE_SLOTS_MAX_DAYS = 92
+
+# Days of past shows in the calendar feeds (/venues/<id>/calendar.ics) when
+# the client does not ask for a ?since= window.
+CALENDAR_PAST_DAYS = 30
+
+# PostgreSQL keeps shows in monthly partitions (see partitions.py);
+# `flask create-show-partitions` keeps SHOW_PARTITIONS_AHEAD months ready.
+# `flask archive-shows` takes the months older than ARCHIVE_AFTER_MONTHS off
+# the hot tables: to ARCHIVE_TABLESPACE when set, else exported as CSV under
+# ARCHIVE_DIR and deleted.
+SHOW_PARTITIONS_AHEAD = 12
+ARCHIVE_AFTER_MONTHS = 24
+ARCHIVE_TABLESPACE = os.environ.get('ARCHIVE_TABLESPACE', '')
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', os.path.join(basedir, 'archive'))
+
+# Compiled templates are cached on disk here (warm it at build time with
+# `flask compile-templates`); empty disables the cache. Template auto-reload
+# follows DEBUG unless TEMPLATES_AUTO_RELOAD is set; keep it off in production.
+TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR', os.path.join(basedir, '.jinja_cache'))
+TEMPLATES_AUTO_RELOAD = os.environ.get('TEMPLATES_AUTO_RELOAD', '1' if DEBUG else '0') == '1'
+
+# Static files are built into static/dist/ by `flask build-assets` (bundled,
+# minified, content-hashed and precompressed; see assets.py). Built files
+# are cached by clients for ASSETS_MAX_AGE seconds without revalidating.
+ASSETS_MAX_AGE = 365 * 24 * 60 * 60
+
+# Locales the pages can be formatted in (picked from Accept-Language, the
+# first one is the default) and the timezone show times are displayed in;
+# None keeps each time's own offset. A "tz" cookie overrides the timezone.
+LOCALES = ['en']
+DISPLAY_TIMEZONE = None
+
+# Request metrics are served on /metrics. With several worker processes set
+# METRICS_DIR to a directory they share (empty it when the server starts):
+# each worker writes its numbers there every METRICS_FLUSH_INTERVAL seconds.
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = 1
+
+# Development/test SQL checks (see querycheck.py): "warn" logs N+1 patterns
+# (a statement run SQL_CHECK_REPEATS or more times in one request) and views
+# over their @query_budget, "raise" fails the request instead, which fails
+# the test that made it, and "off" leaves the engine unhooked.
+SQL_CHECK = os.environ.get('SQL_CHECK', 'warn' if DEBUG else 'off')
+SQL_CHECK_REPEATS = 3
+
+# Serve the detail pages and API entries with their async variants on an
+# async engine (asyncpg for PostgreSQL, aiosqlite for SQLite); see aio.py.
+ASYNC_DB = os.environ.get('ASYNC_DB', '0') == '1'
+
+# The artist page lists its SIMILAR_ARTISTS_LIMIT most similar artists,
+# computed by `flask recommend-artists` (see recommendations.py; run it
+# nightly or so). SIMILAR_ARTISTS_GENRE_WEIGHT is the share of the score
+# from shared genres, the rest from shared venues. The job takes about
+# RECOMMEND_CHUNK_PAIRS candidate pairs at a time, which bounds its memory,
+# and leaves the venues of more than RECOMMEND_MAX_VENUE_ARTISTS artists out
+# of the candidates.
+SIMILAR_ARTISTS_LIMIT = 10
+SIMILAR_ARTISTS_GENRE_WEIGHT = 0.3
+RECOMMEND_CHUNK_PAIRS = 2000000
+RECOMMEND_MAX_VENUE_ARTISTS = 5000
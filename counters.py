@@ -0,0 +1,101 @@
+from datetime import datetime, timezone, timedelta
+from itertools import chain
+from sqlalchemy import event
+from sqlalchemy.orm import attributes
+from models import db, Venue, Artist, Show, RoutingSession
+
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# each counted model and the Show column that references it
+COUNTED = ((Venue, Show.venue_id), (Artist, Show.artist_id))
+
+
+def recount_statement(model, foreign_key, now):
+    '''UPDATE setting the show counters of model's rows from their shows as of now.'''
+    def shows(column, condition):
+        return db.select(column).where(foreign_key == model.id, condition).scalar_subquery()
+    return model.__table__.update().values(
+        upcoming_shows_count=shows(db.func.count(Show.id), Show.start_time > now),
+        past_shows_count=shows(db.func.count(Show.id), Show.start_time <= now),
+        next_show_time=shows(db.func.min(Show.start_time), Show.start_time > now),
+        counted_at=now)
+
+def recount(connection, model, foreign_key, ids, now):
+    if not ids:
+        return 0
+    ids = sorted(ids)
+    # lock the rows first: the recount then runs in a snapshot taken after
+    # any concurrent recount of the same rows committed, so it also counts
+    # the shows that transaction added (no-op on SQLite, which serializes writes)
+    connection.execute(db.select(model.id).where(model.id.in_(ids)).order_by(model.id).with_for_update())
+    return connection.execute(recount_statement(model, foreign_key, now).where(model.id.in_(ids))).rowcount
+
+def refresh(venue_ids=(), artist_ids=(), now=None, connection=None):
+    '''
+    Recounts the shows of the given venues and artists, in the current
+    transaction. Call it after writing shows without the ORM (the ORM
+    write paths are tracked by refresh_flushed).
+    '''
+    now = now or datetime.now(timezone(timedelta(hours=-3)))
+    connection = connection or db.session.connection()
+    for (model, foreign_key), ids in zip(COUNTED, (venue_ids, artist_ids)):
+        recount(connection, model, foreign_key, {int(id) for id in ids}, now)
+
+def roll(now=None, everything=False):
+    '''
+    Recounts the venues and artists whose next show has started (or all of
+    them) and returns how many were updated; run it on a schedule so shows
+    move from upcoming to past in the counters.
+    '''
+    now = now or datetime.now(timezone(timedelta(hours=-3)))
+    connection = db.session.connection()
+    rolled = 0
+    for model, foreign_key in COUNTED:
+        due = db.session.query(model.id)
+        if not everything:
+            due = due.filter(model.next_show_time <= now)
+        rolled += recount(connection, model, foreign_key, {id for id, in due}, now)
+    return rolled
+
+def counts(entity, now):
+    '''
+    (past, upcoming) show counts from a venue or artist's counters, or None
+    when its next show has started since they were counted.
+    '''
+    next_show_time = entity.next_show_time
+    if next_show_time is not None:
+        # SQLite hands times back naive, in the offset they were written with
+        if next_show_time.tzinfo is None:
+            now = now.replace(tzinfo=None)
+        if next_show_time <= now:
+            return None
+    return entity.past_shows_count, entity.upcoming_shows_count
+
+def upcoming_count(model, foreign_key, now):
+    '''
+    The upcoming show count of model's rows as a column: the counter, or for
+    the rows whose next show has started since they were counted, a count of
+    their shows (the SQL side of counts, for listings).
+    '''
+    current = db.or_(model.next_show_time.is_(None), model.next_show_time > now)
+    shows = db.select(db.func.count(Show.id)).where(foreign_key == model.id, Show.start_time > now).scalar_subquery()
+    return db.case((current, model.upcoming_shows_count), else_=shows)
+
+
+def refresh_flushed(session, flush_context):
+    '''Recounts the venues and artists of the shows a flush added, moved or deleted.'''
+    ids = {'venue_id': set(), 'artist_id': set()}
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Show):
+            for key, values in ids.items():
+                history = attributes.get_history(obj, key)
+                values.update(id for id in chain(*history) if id is not None)
+    if ids['venue_id'] or ids['artist_id']:
+        refresh(ids['venue_id'], ids['artist_id'], connection=session.connection())
+
+
+def init_app(app):
+    event.listen(RoutingSession, 'after_flush', refresh_flushed)
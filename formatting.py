@@ -0,0 +1,65 @@
+from datetime import timezone
+from functools import lru_cache
+import babel
+import babel.dates
+import dateutil.parser
+from flask import g, request
+
+
+#----------------------------------------------------------------------------#
+# Date formatting.
+#----------------------------------------------------------------------------#
+
+PATTERNS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma"
+}
+
+@lru_cache(maxsize=256)
+def compiled(format, locale):
+    '''The parsed babel pattern and Locale for a (format, locale) pair.'''
+    return babel.dates.parse_pattern(PATTERNS.get(format, format)), babel.Locale.parse(locale)
+
+@lru_cache(maxsize=64)
+def zone(name):
+    return babel.dates.get_timezone(name)
+
+@lru_cache(maxsize=4096)
+def parse(value):
+    return dateutil.parser.parse(value)
+
+@lru_cache(maxsize=16384)
+def formatted(value, offset, format, locale, tz):
+    # offset is only part of the key: the same instant in two offsets
+    # compares equal, but reads differently without tz
+    pattern, locale = compiled(format, locale)
+    if value.tzinfo is None:
+        # babel.dates.format_datetime reads naive datetimes as UTC
+        value = value.replace(tzinfo=timezone.utc)
+    if tz:
+        value = value.astimezone(zone(tz))
+    return pattern.apply(value, locale)
+
+def format_datetime(value, format='medium'):
+    '''
+    The `datetime` template filter: formats a datetime (or a string holding
+    one) in the request's locale and timezone. Results are memoized, so the
+    same show time is only formatted once per process.
+    '''
+    date = parse(value) if isinstance(value, str) else value
+    return formatted(date, date.utcoffset(), format, g.get('locale', 'en'), g.get('timezone'))
+
+
+def select_locale(app):
+    '''Picks the request's locale from Accept-Language and its timezone from the "tz" cookie.'''
+    g.locale = request.accept_languages.best_match(app.config['LOCALES']) or app.config['LOCALES'][0]
+    g.timezone = request.cookies.get('tz') or app.config['DISPLAY_TIMEZONE']
+    if g.timezone:
+        try:
+            zone(g.timezone)
+        except LookupError:
+            g.timezone = app.config['DISPLAY_TIMEZONE']
+
+def init_app(app):
+    app.jinja_env.filters['datetime'] = format_datetime
+    app.before_request(lambda: select_locale(app))
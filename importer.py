@@ -0,0 +1,216 @@
+import csv
+import gzip
+import io
+import json
+import time
+from collections import defaultdict
+from datetime import datetime, timezone, timedelta
+from itertools import islice
+import click
+from werkzeug.datastructures import MultiDict
+from models import db, Venue, Artist, Show
+import counters
+import bookings
+from forms import VenueForm, ArtistForm, ShowForm
+
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+# kind -> (model, form, {column: form field})
+KINDS = {
+    'venues': (Venue, VenueForm, {
+        'name': 'name', 'city': 'city', 'state': 'state', 'address': 'address',
+        'phone': 'phone', 'genres': 'genres', 'image_link': 'image_link',
+        'facebook_link': 'facebook_link', 'website': 'website_link',
+        'seeking_talent': 'seeking_talent', 'seeking_description': 'seeking_description'
+    }),
+    'artists': (Artist, ArtistForm, {
+        'name': 'name', 'city': 'city', 'state': 'state', 'phone': 'phone',
+        'genres': 'genres', 'image_link': 'image_link', 'facebook_link': 'facebook_link',
+        'website': 'website_link', 'seeking_venue': 'seeking_venue',
+        'seeking_description': 'seeking_description'
+    }),
+    'shows': (Show, ShowForm, {
+        'venue_id': 'venue_id', 'artist_id': 'artist_id', 'start_time': 'start_time',
+        'end_time': 'end_time'
+    }),
+}
+
+FALSE_VALUES = ('', '0', 'false', 'f', 'no', 'n', 'off')
+
+
+def read_records(path, format=None):
+    '''Yields the records of a CSV or NDJSON file (gzipped when named *.gz) one at a time, as dicts.'''
+    compressed = path.lower().endswith('.gz')
+    if format is None:
+        format = 'csv' if path.lower()[:-3 if compressed else None].endswith('.csv') else 'ndjson'
+    with (gzip.open if compressed else open)(path, 'rt', newline='', encoding='utf-8') as f:
+        if format == 'csv':
+            for record in csv.DictReader(f):
+                yield record
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def formdata(record):
+    '''A record as the MultiDict the WTForms forms validate.'''
+    data = MultiDict()
+    for key, value in record.items():
+        if value is None:
+            continue
+        if key == 'genres':
+            if isinstance(value, str):
+                value = [genre.strip() for genre in value.split(';') if genre.strip()]
+            for genre in value:
+                data.add(key, genre)
+        elif key.startswith('seeking_') and key != 'seeking_description':
+            # BooleanField only treats 'false' and '' as false
+            if str(value).strip().lower() not in FALSE_VALUES:
+                data.add(key, 'y')
+        else:
+            data.add(key, str(value))
+    return data
+
+def resolve(model, names):
+    '''Maps each name to the id of the one row of model carrying it.'''
+    ids = defaultdict(list)
+    if names:
+        for id, name in db.session.query(model.id, model.name).filter(model.name.in_(names)):
+            ids[name].append(id)
+    return {name: found[0] for name, found in ids.items() if len(found) == 1}
+
+def resolve_references(records):
+    '''Fills venue_id/artist_id of show records that name their venue/artist instead.'''
+    venues = resolve(Venue, {r['venue'] for r in records if not r.get('venue_id') and r.get('venue')})
+    artists = resolve(Artist, {r['artist'] for r in records if not r.get('artist_id') and r.get('artist')})
+    for record in records:
+        if not record.get('venue_id') and record.get('venue') in venues:
+            record['venue_id'] = venues[record['venue']]
+        if not record.get('artist_id') and record.get('artist') in artists:
+            record['artist_id'] = artists[record['artist']]
+
+
+def existing_ids(model, ids):
+    return {id for id, in db.session.query(model.id).filter(model.id.in_(ids))} if ids else set()
+
+def check_references(rows, errors):
+    '''Drops show rows whose venue or artist does not exist, recording why.'''
+    venues = existing_ids(Venue, {row['venue_id'] for _, row in rows})
+    artists = existing_ids(Artist, {row['artist_id'] for _, row in rows})
+    kept = []
+    for line, row in rows:
+        if row['venue_id'] in venues and row['artist_id'] in artists:
+            kept.append((line, row))
+        else:
+            errors.append((line, {'venue_id/artist_id': ['No such venue or artist.']}))
+    return kept
+
+
+def check_bookings(rows, errors):
+    '''Drops show rows overlapping a stored show, or an earlier row, of their venue or artist.'''
+    bookings.lock({row['venue_id'] for _, row in rows}, {row['artist_id'] for _, row in rows})
+    booked = bookings.check_rows([row for _, row in rows])
+    for index, messages in booked.items():
+        errors.append((rows[index][0], {'booking': messages}))
+    return [row for index, row in enumerate(rows) if index not in booked]
+
+def copy_value(value):
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, list):
+        return '{' + ','.join('"{}"'.format(v.replace('\\', '\\\\').replace('"', '\\"')) for v in value) + '}'
+    if isinstance(value, datetime):
+        # with its offset: COPY would read a naive time in the session's time zone
+        return bookings.aware(value).isoformat()
+    return value
+
+def insert(model, columns, rows):
+    '''Writes rows with COPY on PostgreSQL and a plain executemany elsewhere.'''
+    if db.engine.dialect.name != 'postgresql':
+        db.session.execute(model.__table__.insert(), rows)
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([copy_value(row[column]) for column in columns])
+    buffer.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert('COPY "{}" ({}) FROM STDIN WITH (FORMAT csv)'.format(
+        model.__tablename__, ', '.join('"{}"'.format(column) for column in columns)), buffer)
+
+
+def import_file(kind, path, format=None, chunk_size=5000, echo=click.echo):
+    '''
+    Streams the venues, artists or shows of a CSV/NDJSON file into the
+    database, chunk_size records per transaction, and returns
+    (imported, rejected).
+
+    Fields are named like the form fields (genres separated by ";" in
+    CSV). Show records may name their venue/artist in "venue"/"artist"
+    instead of giving venue_id/artist_id; those without an end_time last
+    SHOW_DURATION minutes, and those overlapping another show of their
+    venue or artist are rejected.
+    '''
+    model, form_class, fields = KINDS[kind]
+    columns = list(fields) + ['created_at', 'updated_at']
+    imported = rejected = line = 0
+    start = time.time()
+
+    for records in chunks(read_records(path, format), chunk_size):
+        if kind == 'shows':
+            resolve_references(records)
+        now = datetime.now(timezone(timedelta(hours=-3)))
+        rows = []
+        errors = []
+        for record in records:
+            line += 1
+            form = form_class(formdata(record), meta={'csrf': False})
+            if not form.validate():
+                errors.append((line, form.errors))
+                continue
+            row = {column: form[field].data for column, field in fields.items()}
+            row['created_at'] = row['updated_at'] = now
+            if kind == 'shows':
+                try:
+                    row['venue_id'], row['artist_id'] = int(row['venue_id']), int(row['artist_id'])
+                except ValueError:
+                    errors.append((line, {'venue_id/artist_id': ['Ids must be integers.']}))
+                    continue
+                # naive times are UTC-3: made aware once, for the check and the COPY
+                row['start_time'] = bookings.aware(row['start_time'])
+                row['end_time'] = bookings.aware(bookings.end_time(row['start_time'], row['end_time']))
+            rows.append((line, row))
+        if kind == 'shows':
+            rows = check_bookings(check_references(rows, errors), errors)
+        for error in sorted(errors, key=lambda error: error[0]):
+            echo('record {}: {}'.format(*error), err=True)
+        rejected += len(errors)
+        rows = [row for _, row in rows]
+        if rows:
+            try:
+                insert(model, columns, rows)
+                if kind == 'shows':
+                    counters.refresh({row['venue_id'] for row in rows}, {row['artist_id'] for row in rows}, now)
+                db.session.commit()
+            except:
+                db.session.rollback()
+                raise
+            imported += len(rows)
+        elapsed = time.time() - start
+        echo('{}: {} imported, {} rejected, {:.0f} rows/s'.format(
+            kind, imported, rejected, (imported + rejected) / elapsed if elapsed else 0))
+    return imported, rejected
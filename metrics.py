@@ -0,0 +1,240 @@
+import glob
+import json
+import os
+import time
+from bisect import bisect_left
+from threading import Lock
+from flask import Response, g, has_app_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+#----------------------------------------------------------------------------#
+# Metrics.
+#----------------------------------------------------------------------------#
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# name: (type, help, buckets)
+METRICS = {
+    'fyyur_requests_total': (
+        'counter', 'Requests served, by endpoint, method and status.', None),
+    'fyyur_request_duration_seconds': (
+        'histogram', 'Request latency, by endpoint and method.', LATENCY_BUCKETS),
+    'fyyur_response_size_bytes': (
+        'histogram', 'Response body size, by endpoint (streamed responses are not counted).', SIZE_BUCKETS),
+    'fyyur_request_sql_queries': (
+        'histogram', 'SQL statements executed per request, by endpoint.', QUERY_BUCKETS),
+    'fyyur_request_sql_seconds': (
+        'histogram', 'Total SQL time per request, by endpoint.', LATENCY_BUCKETS),
+    'fyyur_template_render_seconds': (
+        'histogram', 'Template render time, by template.', LATENCY_BUCKETS),
+    'fyyur_page_cache_lookups_total': (
+        'counter', 'Page fragment cache lookups, by page kind and result (hit or miss).', None),
+}
+
+
+class Registry:
+    '''
+    Counters and histograms of one process, keyed by (name, labels) where
+    labels is a sorted tuple of (label, value) pairs. A histogram sample is
+    its per-bucket counts (the last one being +Inf) followed by the sum.
+    '''
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = Lock()
+
+    def inc(self, name, labels, amount=1):
+        key = (name, labels)
+        with self._lock:
+            self.samples[key] = self.samples.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, labels)
+        with self._lock:
+            counts = self.samples.get(key)
+            if counts is None:
+                counts = self.samples[key] = [0] * (len(buckets) + 1) + [0.0]
+            counts[bisect_left(buckets, value)] += 1
+            counts[-1] += value
+
+    def dump(self):
+        with self._lock:
+            return [[name, labels, value] for (name, labels), value in self.samples.items()]
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(value) if isinstance(value, list) else value
+                    for key, value in self.samples.items()}
+
+
+def merge(samples, dumped):
+    '''Adds the samples of a dumped registry into samples.'''
+    for name, labels, value in dumped:
+        if name not in METRICS:
+            continue
+        key = (name, tuple(tuple(pair) for pair in labels))
+        current = samples.get(key)
+        if current is None:
+            samples[key] = value
+        elif isinstance(value, list):
+            samples[key] = [a + b for a, b in zip(current, value)]
+        else:
+            samples[key] = current + value
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, _label_value(value)) for name, value in pairs) + '}'
+
+def _number(value):
+    if isinstance(value, float) and value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+def exposition(samples):
+    '''Renders samples in the Prometheus text format (version 0.0.4).'''
+    lines = []
+    for name, (kind, help, buckets) in METRICS.items():
+        series = sorted((labels, value) for (metric, labels), value in samples.items() if metric == name)
+        if not series:
+            continue
+        lines.append('# HELP {} {}'.format(name, help))
+        lines.append('# TYPE {} {}'.format(name, kind))
+        for labels, value in series:
+            if kind == 'counter':
+                lines.append('{}{} {}'.format(name, _labels(labels), _number(value)))
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + (float('inf'),), value[:-1]):
+                cumulative += count
+                lines.append('{}_bucket{} {}'.format(name, _labels(labels, [('le', _number(bound))]), cumulative))
+            lines.append('{}_sum{} {}'.format(name, _labels(labels), _number(value[-1])))
+            lines.append('{}_count{} {}'.format(name, _labels(labels), cumulative))
+    return '\n'.join(lines) + '\n'
+
+
+class Metrics:
+    '''
+    Request instrumentation: per-endpoint latency, status, response size,
+    SQL statement count and SQL time, plus template render time, served
+    on /metrics in the Prometheus text format.
+
+    With METRICS_DIR set, each worker writes its registry to <pid>.json
+    there at most every METRICS_FLUSH_INTERVAL seconds and /metrics adds
+    up every worker's file, so any worker can answer the scrape.
+    '''
+
+    def __init__(self, app=None):
+        self.registry = Registry()
+        self.directory = None
+        self.flush_interval = 1
+        self._flushed = 0
+        self._flush_lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = app.config.get('METRICS_DIR') or None
+        self.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 1)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+        app.teardown_request(self.record_request)
+        before_render_template.connect(self.start_template, app)
+        template_rendered.connect(self.finish_template, app)
+        event.listen(Engine, 'before_cursor_execute', self.start_query)
+        event.listen(Engine, 'after_cursor_execute', self.finish_query)
+        app.add_url_rule('/metrics', 'metrics', self.view)
+
+    def start_request(self):
+        g.request_started = time.perf_counter()
+        g.sql_queries = 0
+        g.sql_seconds = 0.0
+
+    def finish_request(self, response):
+        g.response_status = response.status_code
+        g.response_size = response.content_length
+        return response
+
+    def record_request(self, exc):
+        # runs after the response has been sent (streamed ones included)
+        if 'request_started' not in g:
+            return
+        duration = time.perf_counter() - g.request_started
+        endpoint = request.endpoint or 'unmatched'
+        # the status that was sent; after_request never ran if the view raised
+        status = g.get('response_status', 500)
+        labels = (('endpoint', endpoint), ('method', request.method))
+        self.registry.inc('fyyur_requests_total', labels + (('status', str(status)),))
+        self.registry.observe('fyyur_request_duration_seconds', labels, duration)
+        by_endpoint = (('endpoint', endpoint),)
+        if g.get('response_size') is not None:
+            self.registry.observe('fyyur_response_size_bytes', by_endpoint, g.response_size)
+        self.registry.observe('fyyur_request_sql_queries', by_endpoint, g.sql_queries)
+        self.registry.observe('fyyur_request_sql_seconds', by_endpoint, g.sql_seconds)
+        self.maybe_flush()
+
+    def start_template(self, sender, template, context, **extra):
+        g.setdefault('template_started', []).append(time.perf_counter())
+
+    def finish_template(self, sender, template, context, **extra):
+        started = g.get('template_started')
+        if started:
+            self.registry.observe('fyyur_template_render_seconds', (('template', template.name),),
+                                  time.perf_counter() - started.pop())
+
+    def start_query(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def finish_query(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        # only statements run while serving a request are tallied
+        if has_app_context() and 'request_started' in g:
+            g.sql_queries += 1
+            g.sql_seconds += elapsed
+
+    def path(self, pid=None):
+        return os.path.join(self.directory, '{}.json'.format(pid or os.getpid()))
+
+    def maybe_flush(self):
+        if self.directory and time.time() - self._flushed >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            self._flushed = time.time()
+            path = self.path()
+            with open(path + '.tmp', 'w') as f:
+                json.dump(self.registry.dump(), f)
+            os.replace(path + '.tmp', path)
+
+    def collect(self):
+        '''This process's samples plus, with METRICS_DIR, every other worker's last flush.'''
+        samples = self.registry.snapshot()
+        if self.directory:
+            own = self.path()
+            for path in glob.glob(os.path.join(self.directory, '*.json')):
+                if path == own:
+                    continue
+                try:
+                    with open(path) as f:
+                        merge(samples, json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return samples
+
+    def view(self):
+        return Response(exposition(self.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+metrics = Metrics()
@@ -0,0 +1,44 @@
+"""show counters
+
+Revision ID: 0b7d4e6f2a91
+Revises: f5a2c8d1e9b3
+Create Date: 2026-10-18 19:02:37.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b7d4e6f2a91'
+down_revision = 'f5a2c8d1e9b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table, key in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('next_show_time', sa.DateTime(timezone=True), nullable=True))
+        op.add_column(table, sa.Column('counted_at', sa.DateTime(timezone=True), nullable=True))
+        op.create_index(op.f('ix_{}_next_show_time'.format(table)), table, ['next_show_time'], unique=False)
+        op.create_index(op.f('ix_{}_counted_at'.format(table)), table, ['counted_at'], unique=False)
+        # backfill; `flask roll-show-counters` keeps them current from here on
+        op.execute('''
+            UPDATE "{0}" SET
+                upcoming_shows_count = (SELECT count(*) FROM "Show" WHERE "Show".{1} = "{0}".id AND start_time > now()),
+                past_shows_count = (SELECT count(*) FROM "Show" WHERE "Show".{1} = "{0}".id AND start_time <= now()),
+                next_show_time = (SELECT min(start_time) FROM "Show" WHERE "Show".{1} = "{0}".id AND start_time > now()),
+                counted_at = now()
+        '''.format(table, key))
+
+
+def downgrade():
+    for table in ('Venue', 'Artist'):
+        op.drop_index(op.f('ix_{}_counted_at'.format(table)), table_name=table)
+        op.drop_index(op.f('ix_{}_next_show_time'.format(table)), table_name=table)
+        op.drop_column(table, 'counted_at')
+        op.drop_column(table, 'next_show_time')
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
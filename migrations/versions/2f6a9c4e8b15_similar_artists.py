@@ -0,0 +1,35 @@
+"""similar artists
+
+Revision ID: 2f6a9c4e8b15
+Revises: 8d4b1f6e3a57
+Create Date: 2026-10-18 23:02:17.604118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2f6a9c4e8b15'
+down_revision = '8d4b1f6e3a57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('SimilarArtist',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.SmallInteger(), autoincrement=False, nullable=False),
+    sa.Column('similar_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['similar_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('artist_id', 'rank')
+    )
+    op.create_index(op.f('ix_SimilarArtist_similar_id'), 'SimilarArtist', ['similar_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_SimilarArtist_similar_id'), table_name='SimilarArtist')
+    op.drop_table('SimilarArtist')
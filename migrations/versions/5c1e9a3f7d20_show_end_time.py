@@ -0,0 +1,58 @@
+"""show end time and no-overlap constraints
+
+Revision ID: 5c1e9a3f7d20
+Revises: 0b7d4e6f2a91
+Create Date: 2026-10-18 19:48:05.331870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1e9a3f7d20'
+down_revision = '0b7d4e6f2a91'
+branch_labels = None
+depends_on = None
+
+# length given to the existing shows (config.SHOW_DURATION)
+DURATION = "interval '120 minutes'"
+
+
+def upgrade():
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(timezone=True), nullable=True))
+    # existing shows last DURATION, cut short where the next show of their
+    # venue or artist starts earlier, so the constraints below hold; shows
+    # double-booked at the very same time become zero-length (an empty range,
+    # which overlaps nothing) and are left for someone to reschedule.
+    op.execute('''
+        UPDATE "Show" SET end_time = LEAST("Show".start_time + {}, next.venue_start, next.artist_start)
+        FROM (
+            SELECT id,
+                lead(start_time) OVER (PARTITION BY venue_id ORDER BY start_time, id) AS venue_start,
+                lead(start_time) OVER (PARTITION BY artist_id ORDER BY start_time, id) AS artist_start
+            FROM "Show"
+        ) AS next
+        WHERE next.id = "Show".id
+    '''.format(DURATION))
+    op.alter_column('Show', 'end_time', nullable=False)
+
+    op.drop_index('ix_Show_venue_id', table_name='Show')
+    op.drop_index('ix_Show_artist_id', table_name='Show')
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], unique=False)
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for key in ('venue_id', 'artist_id'):
+        op.execute('ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_{0}_overlap" '
+                   'EXCLUDE USING gist ({0} WITH =, tstzrange(start_time, end_time) WITH &&)'.format(key))
+
+
+def downgrade():
+    for key in ('venue_id', 'artist_id'):
+        op.drop_constraint('ex_Show_{}_overlap'.format(key), 'Show')
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
+    op.create_index('ix_Show_venue_id', 'Show', ['venue_id'], unique=False)
+    op.create_index('ix_Show_artist_id', 'Show', ['artist_id'], unique=False)
+    op.drop_column('Show', 'end_time')
@@ -0,0 +1,112 @@
+"""partition shows by month
+
+Revision ID: 8d4b1f6e3a57
+Revises: 5c1e9a3f7d20
+Create Date: 2026-10-18 21:10:42.518304
+
+"""
+from datetime import datetime, timedelta, timezone
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d4b1f6e3a57'
+down_revision = '5c1e9a3f7d20'
+branch_labels = None
+depends_on = None
+
+# months prepared after the current one (config.SHOW_PARTITIONS_AHEAD)
+AHEAD = 12
+LOCAL = timezone(timedelta(hours=-3))
+COLUMNS = 'id, venue_id, artist_id, start_time, end_time, created_at, updated_at'
+INDEXES = {
+    'ix_Show_updated_at': ['updated_at'],
+    'ix_Show_start_time_id': ['start_time', 'id'],
+    'ix_Show_venue_id_start_time': ['venue_id', 'start_time'],
+    'ix_Show_artist_id_start_time': ['artist_id', 'start_time'],
+}
+
+
+def add_months(month, count):
+    years, index = divmod(month.month - 1 + count, 12)
+    return month.replace(year=month.year + years, month=index + 1)
+
+def add_overlap_constraints(table):
+    for key in ('venue_id', 'artist_id'):
+        op.execute('ALTER TABLE "{0}" ADD CONSTRAINT "ex_{0}_{1}_overlap" '
+                   'EXCLUDE USING gist ({1} WITH =, tstzrange(start_time, end_time) WITH &&)'.format(table, key))
+
+def set_aside():
+    # index and primary key names are schema-wide: the old ones go first
+    op.execute('ALTER TABLE "Show" RENAME TO "Show_old"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+    op.execute('ALTER TABLE "Show_old" RENAME CONSTRAINT "Show_pkey" TO "Show_old_pkey"')
+    for name in INDEXES:
+        op.drop_index(name, table_name='Show_old')
+
+def create_indexes():
+    for name, columns in INDEXES.items():
+        op.create_index(name, 'Show', columns, unique=False)
+
+
+def upgrade():
+    set_aside()
+    op.execute('''
+        CREATE TABLE "Show" (
+            created_at TIMESTAMP WITH TIME ZONE,
+            updated_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            id INTEGER NOT NULL DEFAULT nextval('"Show_id_seq"'),
+            venue_id INTEGER NOT NULL REFERENCES "Venue" (id),
+            artist_id INTEGER NOT NULL REFERENCES "Artist" (id),
+            start_time TIMESTAMP WITH TIME ZONE NOT NULL,
+            end_time TIMESTAMP WITH TIME ZONE NOT NULL,
+            PRIMARY KEY (id, start_time)
+        ) PARTITION BY RANGE (start_time)
+    ''')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+
+    # a partition per month with shows, and per month up to AHEAD from now;
+    # shows outside them go to the default partition
+    months = {month.replace(tzinfo=LOCAL) for month, in op.get_bind().execute(sa.text(
+        'SELECT DISTINCT date_trunc(\'month\', start_time AT TIME ZONE INTERVAL \'-03:00\') FROM "Show_old"'))}
+    current = datetime.now(LOCAL).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    months.update(add_months(current, count) for count in range(AHEAD + 1))
+    tables = ['Show_default']
+    op.execute('CREATE TABLE "Show_default" PARTITION OF "Show" DEFAULT')
+    for month in sorted(months):
+        name = 'Show_p{:%Y_%m}'.format(month)
+        op.execute('CREATE TABLE "{}" PARTITION OF "Show" FOR VALUES FROM (\'{}\') TO (\'{}\')'.format(
+            name, month.isoformat(), add_months(month, 1).isoformat()))
+        tables.append(name)
+
+    # indexes and constraints after the copy, which is faster than
+    # maintaining them row by row
+    op.execute('INSERT INTO "Show" ({0}) SELECT {0} FROM "Show_old"'.format(COLUMNS))
+    op.execute('DROP TABLE "Show_old"')
+    create_indexes()
+    for table in tables:
+        add_overlap_constraints(table)
+    op.execute('ANALYZE "Show"')
+
+
+def downgrade():
+    set_aside()
+    op.execute('''
+        CREATE TABLE "Show" (
+            created_at TIMESTAMP WITH TIME ZONE,
+            updated_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            id INTEGER NOT NULL DEFAULT nextval('"Show_id_seq"'),
+            venue_id INTEGER NOT NULL REFERENCES "Venue" (id),
+            artist_id INTEGER NOT NULL REFERENCES "Artist" (id),
+            start_time TIMESTAMP WITH TIME ZONE NOT NULL,
+            end_time TIMESTAMP WITH TIME ZONE NOT NULL,
+            PRIMARY KEY (id)
+        )
+    ''')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+    op.execute('INSERT INTO "Show" ({0}) SELECT {0} FROM "Show_old"'.format(COLUMNS))
+    # drops the partitions with it
+    op.execute('DROP TABLE "Show_old"')
+    create_indexes()
+    add_overlap_constraints('Show')
@@ -0,0 +1,32 @@
+"""search indexes
+
+Revision ID: a1c5e2f9d3b7
+Revises: 3b9129e0832c
+Create Date: 2026-10-18 10:02:11.514210
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c5e2f9d3b7'
+down_revision = '3b9129e0832c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('Venue', 'Artist'):
+        for column in ('name', 'city'):
+            op.create_index('ix_{}_{}_trgm'.format(table, column), table, [column],
+                unique=False, postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+        op.execute('CREATE INDEX "ix_{0}_genres_trgm" ON "{0}" USING gin ((genres::text) gin_trgm_ops)'.format(table))
+
+
+def downgrade():
+    for table in ('Venue', 'Artist'):
+        op.drop_index('ix_{}_genres_trgm'.format(table), table_name=table)
+        for column in ('name', 'city'):
+            op.drop_index('ix_{}_{}_trgm'.format(table, column), table_name=table)
@@ -0,0 +1,37 @@
+"""show id sequence
+
+Revision ID: d7f3b06a2c1e
+Revises: c42d8e1f7a90
+Create Date: 2026-10-18 12:48:05.361927
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7f3b06a2c1e'
+down_revision = 'c42d8e1f7a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Show ids come from a sequence instead of max(id) + 1, and the primary
+    # key narrows from (id, venue_id, artist_id) to id alone.
+    op.execute('CREATE SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+    op.execute('SELECT setval(\'"Show_id_seq"\', COALESCE((SELECT MAX(id) FROM "Show"), 0) + 1, false)')
+    op.alter_column('Show', 'id', server_default=sa.text('nextval(\'"Show_id_seq"\')'))
+    op.drop_constraint('Show_pkey', 'Show', type_='primary')
+    op.create_primary_key('Show_pkey', 'Show', ['id'])
+    op.create_index(op.f('ix_Show_venue_id'), 'Show', ['venue_id'], unique=False)
+    op.create_index(op.f('ix_Show_artist_id'), 'Show', ['artist_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_Show_artist_id'), table_name='Show')
+    op.drop_index(op.f('ix_Show_venue_id'), table_name='Show')
+    op.drop_constraint('Show_pkey', 'Show', type_='primary')
+    op.create_primary_key('Show_pkey', 'Show', ['id', 'venue_id', 'artist_id'])
+    op.alter_column('Show', 'id', server_default=None)
+    op.execute('DROP SEQUENCE "Show_id_seq"')
@@ -0,0 +1,35 @@
+"""genre arrays
+
+Revision ID: e81a4c9b5f26
+Revises: d7f3b06a2c1e
+Create Date: 2026-10-18 14:05:52.730418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e81a4c9b5f26'
+down_revision = 'd7f3b06a2c1e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # genres were varchar columns holding array literals such as
+    # '{Jazz,"Rock n Roll"}'; cast them into real arrays behind GIN indexes.
+    for table in ('Venue', 'Artist'):
+        op.drop_index('ix_{}_genres_trgm'.format(table), table_name=table)
+        op.execute('ALTER TABLE "{}" ALTER COLUMN genres TYPE varchar(200)[] '
+                   'USING COALESCE(NULLIF(genres, \'\'), \'{{}}\')::varchar(200)[]'.format(table))
+        op.alter_column(table, 'genres', server_default='{}')
+        op.create_index('ix_{}_genres'.format(table), table, ['genres'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    for table in ('Venue', 'Artist'):
+        op.drop_index('ix_{}_genres'.format(table), table_name=table)
+        op.alter_column(table, 'genres', server_default=None)
+        op.execute('ALTER TABLE "{}" ALTER COLUMN genres TYPE varchar(200) USING genres::varchar'.format(table))
+        op.execute('CREATE INDEX "ix_{0}_genres_trgm" ON "{0}" USING gin ((genres::text) gin_trgm_ops)'.format(table))
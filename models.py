@@ -1,20 +1,42 @@
-from flask_sqlalchemy import SQLAlchemy, model
+from flask import g, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state, model
 from datetime import datetime, timezone, timedelta
-from time import timezone
+from sqlalchemy import DDL, event, orm
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import PrimaryKeyConstraint
 
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
-db = SQLAlchemy()
+class RoutingSession(SignallingSession):
+    '''
+    Sends reads to the "replica" bind while the request allows it (g.use_replica,
+    decided in replicas.py); flushes, and so every write, go to the primary.
+    '''
+
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing and has_request_context() and g.get('use_replica'):
+            return get_state(self.app).db.get_engine(self.app, bind='replica')
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+db = RoutingSQLAlchemy()
 
 class BaseModel(db.Model):
     __abstract__ = True
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone(timedelta(hours=-3))))
-    updated_at = db.Column(db.DateTime(timezone=True), nullable=False)
+    # indexed so the conditional GETs (see conditional.py) read max(updated_at) off the index
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
 
     def save(self, commit=True):
         db.session.add(self)
@@ -37,8 +59,24 @@ class BaseModel(db.Model):
         if commit:
             db.session.commit()
 
-class Venue(BaseModel):
+class ShowCounters:
+    # upcoming/past show counts kept up to date by counters.py; they go stale
+    # once next_show_time has started, until `flask roll-show-counters` runs,
+    # so readers check it first (counters.counts, counters.upcoming_count)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_time = db.Column(db.DateTime(timezone=True), index=True)
+    counted_at = db.Column(db.DateTime(timezone=True), index=True)
+
+class Venue(ShowCounters, BaseModel):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        # trigram indexes backing search (see search.py); they need pg_trgm
+        db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_Venue_city_trgm', 'city', postgresql_using='gin', postgresql_ops={'city': 'gin_trgm_ops'}),
+        # genre filtering and search (genres @> ARRAY[...])
+        db.Index('ix_Venue_genres', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -46,7 +84,8 @@ class Venue(BaseModel):
     state = db.Column(db.String(120))
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String(200)), server_default='{}')
+    # a JSON list on SQLite; filter it with queries.has_genre
+    genres = db.Column(postgresql.ARRAY(db.String(200)).with_variant(db.JSON, 'sqlite'), server_default='{}')
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
@@ -60,15 +99,25 @@ class Venue(BaseModel):
     def __repr__(self) -> str:
         return '<Venue {}>'.format(self.name)
 
-class Artist(BaseModel):
+class Artist(ShowCounters, BaseModel):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        # trigram indexes backing search (see search.py); they need pg_trgm
+        db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_Artist_city_trgm', 'city', postgresql_using='gin', postgresql_ops={'city': 'gin_trgm_ops'}),
+        # genre filtering and search (genres @> ARRAY[...])
+        db.Index('ix_Artist_genres', 'genres', postgresql_using='gin'),
+        # keyset pagination of /artists
+        db.Index('ix_Artist_name_id', 'name', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String(200)), server_default='{}')
+    # a JSON list on SQLite; filter it with queries.has_genre
+    genres = db.Column(postgresql.ARRAY(db.String(200)).with_variant(db.JSON, 'sqlite'), server_default='{}')
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(300))
     seeking_venue = db.Column(db.Boolean, default=True)
@@ -81,10 +130,54 @@ class Artist(BaseModel):
 
 class Show(BaseModel):
     __tablename__ = 'Show'
+    __table_args__ = (
+        # keyset pagination of /shows
+        db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+        # a venue's/artist's shows in time order, and the booking checks (see bookings.py)
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        # PostgreSQL keeps shows in monthly partitions of start_time (see partitions.py)
+        # on SQLite, AUTOINCREMENT keeps the id of a deleted show from being reused
+        {'postgresql_partition_by': 'RANGE (start_time)', 'info': {'partition_key': 'start_time'},
+         'sqlite_autoincrement': True},
+    )
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), primary_key=True, nullable=False)
-    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), primary_key=True, nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
     start_time = db.Column(db.DateTime(timezone=True), nullable=False)
+    end_time = db.Column(db.DateTime(timezone=True), nullable=False)
+
+    def __repr__(self) -> str:
+        return '<Show {} {}>'.format(self.artist_id, self.venue_id)
+
+class SimilarArtist(db.Model):
+    # the artists most like each artist, best first, precomputed by
+    # `flask recommend-artists` (see recommendations.py); the artist page
+    # reads its rows off the primary key
+    __tablename__ = 'SimilarArtist'
+
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    # indexed for the cascade when an artist is deleted
+    similar_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime(timezone=True), nullable=False)
 
     def __repr__(self) -> str:
-        return '<Show {} {}>'.format(self.artist_id, self.venue_id)
\ No newline at end of file
+        return '<SimilarArtist {} {} {}>'.format(self.artist_id, self.rank, self.similar_id)
+
+# no two shows of a venue, or of an artist, may overlap; PostgreSQL enforces
+# it with GiST exclusion constraints on each partition (see partitions.py),
+# which need btree_gist for the ids
+event.listen(Show.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql'))
+
+@compiles(PrimaryKeyConstraint, 'postgresql')
+def partitioned_primary_key(constraint, compiler, **kw):
+    # a partitioned table's primary key must hold the partition key; the ORM
+    # still identifies shows by id alone
+    partition_key = constraint.table.info.get('partition_key')
+    if partition_key is None:
+        return compiler.visit_primary_key_constraint(constraint, **kw)
+    columns = [column.name for column in constraint.columns] + [partition_key]
+    return 'PRIMARY KEY ({})'.format(', '.join(compiler.preparer.quote(name) for name in columns))
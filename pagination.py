@@ -0,0 +1,99 @@
+import base64
+import json
+from bisect import bisect_left, bisect_right
+import dateutil.parser
+from models import db
+
+
+#----------------------------------------------------------------------------#
+# Keyset pagination.
+#----------------------------------------------------------------------------#
+
+class Page:
+    '''One page of items plus the opaque cursors of its neighbours.'''
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+def encode_cursor(key, direction):
+    '''Packs a sort key and a direction ("next" or "prev") into a url-safe token.'''
+    key = [value.isoformat() if hasattr(value, 'isoformat') else value for value in key]
+    data = json.dumps([direction, key], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+def decode_cursor(cursor, types=()):
+    '''
+    Returns (key, direction) for a cursor made by encode_cursor, or
+    (None, "next") -- the first page -- when it is missing or malformed.
+    `types` are the SQL types of the key columns, used to restore datetimes;
+    when given, a key of another length is malformed too.
+    '''
+    if not cursor:
+        return None, 'next'
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, key = json.loads(data)
+        if direction not in ('next', 'prev') or not isinstance(key, list) or (types and len(key) != len(types)):
+            raise ValueError(cursor)
+        key = [dateutil.parser.parse(value) if isinstance(type_, db.DateTime) and value is not None else value
+               for value, type_ in zip(key, list(types) + [None] * len(key))]
+    except (ValueError, TypeError):
+        return None, 'next'
+    return tuple(key), direction
+
+def page_of(rows, per_page, key, sort_key, direction):
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == 'prev':
+        rows.reverse()
+    has_next = more if direction == 'next' else key is not None
+    has_prev = key is not None if direction == 'next' else more
+    return Page(
+        rows,
+        encode_cursor(sort_key(rows[-1]), 'next') if rows and has_next else None,
+        encode_cursor(sort_key(rows[0]), 'prev') if rows and has_prev else None
+    )
+
+def paginate_query(query, keys, cursor, per_page, sort_key):
+    '''
+    Returns the Page of `query` that `cursor` points at.
+
+    `keys` are the columns the query is ordered by (ascending, ending in a
+    unique column) and `sort_key(row)` gives a row's values for them. Pages
+    are found with a row-value comparison against the cursor key instead of
+    OFFSET, so a deep page costs the same as the first one.
+    '''
+    query, key, direction = keyset_query(query, keys, cursor, per_page)
+    return page_of(query.all(), per_page, key, sort_key, direction)
+
+def keyset_query(query, keys, cursor, per_page):
+    '''
+    The query paginate_query runs for the page `cursor` points at, with the
+    key and direction page_of needs to make a Page of its rows (for running
+    the query some other way, e.g. on the async engine).
+    '''
+    key, direction = decode_cursor(cursor, [column.type for column in keys])
+    position = db.tuple_(*keys)
+    if key is not None:
+        bound = db.tuple_(*[db.literal(value, column.type) for value, column in zip(key, keys)])
+        query = query.filter(position > bound if direction == 'next' else position < bound)
+    if direction == 'next':
+        query = query.order_by(*keys)
+    else:
+        query = query.order_by(*[column.desc() for column in keys])
+    return query.limit(per_page + 1), key, direction
+
+def paginate_list(keys, cursor, per_page):
+    '''paginate_query() for an already sorted list of sort keys held in memory.'''
+    key, direction = decode_cursor(cursor, [None] * len(keys[0]) if keys else ())
+    if key is None:
+        rows = keys[:per_page + 1]
+    elif direction == 'next':
+        start = bisect_right(keys, key)
+        rows = keys[start:start + per_page + 1]
+    else:
+        end = bisect_left(keys, key)
+        rows = keys[max(end - per_page - 1, 0):end][::-1]
+    return page_of(rows, per_page, key, tuple, direction)
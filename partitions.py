@@ -0,0 +1,221 @@
+import csv
+import gzip
+import os
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import event, text
+from models import db, Show
+import counters
+
+
+#----------------------------------------------------------------------------#
+# Show partitions.
+#----------------------------------------------------------------------------#
+
+# On PostgreSQL the Show table is range-partitioned by start_time: one
+# partition per month (UTC-3, like the rest of the app) named Show_pYYYY_MM,
+# and Show_default for shows in months without one. Queries filtering on
+# start_time (upcoming shows, calendar windows, booking seeks) only read the
+# partitions they can match. Past months can then be moved to a cold
+# tablespace, or exported and dropped, a partition at a time (see archive).
+#
+# PostgreSQL has no exclusion constraint spanning partitions: each partition
+# gets its own (see bookings.py), and bookings.py's checks are what catch two
+# shows overlapping across a month boundary.
+
+LOCAL = timezone(timedelta(hours=-3))
+DEFAULT = 'Show_default'
+OVERLAP_KEYS = ('venue_id', 'artist_id')
+
+# columns of the exported files; `flask import shows` reads them back (as new shows)
+EXPORT_COLUMNS = ('id', 'venue_id', 'artist_id', 'start_time', 'end_time', 'created_at', 'updated_at')
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def local(value):
+    # SQLite hands times back naive, in the app's offset
+    return value.astimezone(LOCAL) if value.tzinfo else value.replace(tzinfo=LOCAL)
+
+def month_start(value):
+    return local(value).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def add_months(month, count):
+    years, index = divmod(month.month - 1 + count, 12)
+    return month.replace(year=month.year + years, month=index + 1)
+
+def partition_name(month):
+    return 'Show_p{:%Y_%m}'.format(month)
+
+def literal(value):
+    return "'{}'".format(value.isoformat())
+
+def is_partitioned(connection):
+    if connection.dialect.name != 'postgresql':
+        return False
+    return connection.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('\"Show\"'))"
+    )).scalar()
+
+def months(connection):
+    '''{month: (partition, tablespace or None)} of the monthly partitions.'''
+    rows = connection.execute(text('''
+        SELECT c.relname, t.spcname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        LEFT JOIN pg_tablespace t ON t.oid = c.reltablespace
+        WHERE i.inhparent = '"Show"'::regclass AND c.relname LIKE 'Show\\_p%'
+    '''))
+    found = {}
+    for name, tablespace in rows:
+        year, month = name[len('Show_p'):].split('_')
+        found[datetime(int(year), int(month), 1, tzinfo=LOCAL)] = (name, tablespace)
+    return found
+
+def constrain(connection, table):
+    '''Adds the no-overlap exclusion constraints to a partition.'''
+    for key in OVERLAP_KEYS:
+        connection.execute(text(
+            'ALTER TABLE "{0}" ADD CONSTRAINT "ex_{0}_{1}_overlap" '
+            'EXCLUDE USING gist ({1} WITH =, tstzrange(start_time, end_time) WITH &&)'.format(table, key)))
+
+def create(connection, month):
+    '''
+    Creates and attaches the partition of a month, moving in the shows of
+    that month the default partition holds.
+    '''
+    name, lower, upper = partition_name(month), month, add_months(month, 1)
+    connection.execute(text('CREATE TABLE "{}" (LIKE "Show" INCLUDING DEFAULTS)'.format(name)))
+    connection.execute(text('''
+        WITH moved AS (
+            DELETE FROM "{}" WHERE start_time >= :lower AND start_time < :upper RETURNING *
+        ) INSERT INTO "{}" SELECT * FROM moved
+    '''.format(DEFAULT, name)), {'lower': lower, 'upper': upper})
+    # with a CHECK matching the bounds, ATTACH does not scan the table again
+    connection.execute(text('ALTER TABLE "{0}" ADD CONSTRAINT "{0}_bounds" CHECK (start_time >= {1} AND start_time < {2})'
+                            .format(name, literal(lower), literal(upper))))
+    connection.execute(text('ALTER TABLE "Show" ATTACH PARTITION "{}" FOR VALUES FROM ({}) TO ({})'
+                            .format(name, literal(lower), literal(upper))))
+    connection.execute(text('ALTER TABLE "{0}" DROP CONSTRAINT "{0}_bounds"'.format(name)))
+    constrain(connection, name)
+    return name
+
+def ensure(connection, ahead, now=None):
+    '''
+    Creates the missing partitions of this month, the `ahead` months after
+    it and every month the default partition holds shows of; returns the
+    names of those created.
+    '''
+    if not is_partitioned(connection):
+        return []
+    current = month_start(now or datetime.now(LOCAL))
+    wanted = {add_months(current, count) for count in range(ahead + 1)}
+    for month, in connection.execute(text(
+            'SELECT DISTINCT date_trunc(\'month\', start_time AT TIME ZONE INTERVAL \'-03:00\') FROM "{}"'.format(DEFAULT))):
+        wanted.add(month.replace(tzinfo=LOCAL))
+    existing = months(connection)
+    return [create(connection, month) for month in sorted(wanted) if month not in existing]
+
+
+#----------------------------------------------------------------------------#
+# Archive.
+#----------------------------------------------------------------------------#
+
+def export_path(directory, month):
+    return os.path.join(directory, 'shows-{:%Y-%m}.csv.gz'.format(month))
+
+def source(name):
+    '''The Show table, or one of its partitions, as a selectable.'''
+    if name is None:
+        return Show.__table__
+    return db.table(name, *[db.column(column.name, column.type) for column in Show.__table__.columns])
+
+def export(connection, query, path):
+    '''Writes the rows of query to a gzipped CSV at path + ".partial"; returns the row count.'''
+    count = 0
+    with gzip.open(path + '.partial', 'wt', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        for row in connection.execution_options(stream_results=True).execute(query):
+            # times as the show form reads them, in the app's UTC-3
+            writer.writerow([
+                local(value).strftime(TIME_FORMAT) if isinstance(value, datetime) else value
+                for value in row])
+            count += 1
+    return count
+
+def archive(session, before, directory=None, tablespace=None, echo=print):
+    '''
+    Takes the shows of the months ending by `before` off the hot tables,
+    a month per transaction: with a tablespace, their partitions move to it
+    (and stay queryable); otherwise each month is exported to
+    directory/shows-YYYY-MM.csv.gz and deleted. Returns the months archived.
+    '''
+    partitioned = is_partitioned(session.connection())
+    if tablespace and not partitioned:
+        raise ValueError('Moving shows to a tablespace needs the partitioned Show table (PostgreSQL).')
+    if partitioned:
+        # months still in the default partition get their own first
+        ensure(session.connection(), ahead=0)
+        session.commit()
+        targets = {month: name for month, (name, space) in months(session.connection()).items()
+                   if add_months(month, 1) <= before and (not tablespace or space != tablespace)}
+    else:
+        first = session.query(db.func.min(Show.start_time)).filter(Show.start_time < before).scalar()
+        targets = {}
+        month = month_start(first) if first is not None else before
+        while add_months(month, 1) <= before:
+            targets[month] = None
+            month = add_months(month, 1)
+
+    if not tablespace:
+        os.makedirs(directory, exist_ok=True)
+    archived = []
+    for month in sorted(targets):
+        connection = session.connection()
+        name = targets[month]
+        if tablespace:
+            connection.execute(text('ALTER TABLE "{}" SET TABLESPACE "{}"'.format(name, tablespace)))
+            for index, in connection.execute(text(
+                    "SELECT indexrelid::regclass::text FROM pg_index WHERE indrelid = '\"{}\"'::regclass".format(name))):
+                connection.execute(text('ALTER INDEX {} SET TABLESPACE "{}"'.format(index, tablespace)))
+            session.commit()
+            echo('{:%Y-%m}: moved {} to tablespace {}'.format(month, name, tablespace))
+            archived.append(month)
+            continue
+
+        path = export_path(directory, month)
+        if os.path.exists(path):
+            raise ValueError('{} already exists; move it away before archiving {:%Y-%m} again.'.format(path, month))
+        shows = source(name)
+        # a partition holds the month alone; the plain table needs the range
+        criterion = db.true() if name else db.and_(shows.c.start_time >= month, shows.c.start_time < add_months(month, 1))
+        venue_ids = {id for id, in connection.execute(db.select(shows.c.venue_id).where(criterion).distinct())}
+        artist_ids = {id for id, in connection.execute(db.select(shows.c.artist_id).where(criterion).distinct())}
+        count = export(connection, db.select(*[shows.c[column] for column in EXPORT_COLUMNS])
+                       .where(criterion).order_by(shows.c.start_time, shows.c.id), path)
+        if not count and not name:
+            # a month without shows between archived ones
+            os.remove(path + '.partial')
+            continue
+        if name:
+            connection.execute(text('ALTER TABLE "Show" DETACH PARTITION "{}"'.format(name)))
+            connection.execute(text('DROP TABLE "{}"'.format(name)))
+        else:
+            connection.execute(shows.delete().where(criterion))
+        counters.refresh(venue_ids, artist_ids, connection=connection)
+        session.commit()
+        # the file only takes its final name once the shows are gone for good
+        os.replace(path + '.partial', path)
+        echo('{:%Y-%m}: {} shows exported to {}'.format(month, count, path))
+        archived.append(month)
+    return archived
+
+
+def created(target, connection, **kw):
+    '''A fresh partitioned Show table gets its default partition and this month's.'''
+    if connection.dialect.name != 'postgresql':
+        return
+    connection.execute(text('CREATE TABLE "{}" PARTITION OF "Show" DEFAULT'.format(DEFAULT)))
+    constrain(connection, DEFAULT)
+    ensure(connection, ahead=0)
+
+def init_app(app):
+    event.listen(Show.__table__, 'after_create', created)
@@ -0,0 +1,108 @@
+import time
+from threading import Lock
+from flask import jsonify
+from sqlalchemy import text
+from sqlalchemy import exc
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+from models import db
+
+
+#----------------------------------------------------------------------------#
+# Connection pool.
+#----------------------------------------------------------------------------#
+
+class TimedQueuePool(QueuePool):
+    '''QueuePool that records how long checkouts wait for a free connection.'''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = Lock()
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.waits += 1
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+
+def engine_options(config):
+    '''SQLALCHEMY_ENGINE_OPTIONS built from the DB_POOL_* and DB_PGBOUNCER settings.'''
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    options = {'pool_pre_ping': config['DB_POOL_PRE_PING']}
+    if url.get_backend_name() == 'sqlite':
+        # SQLite keeps SQLAlchemy's own pool choice
+        return options
+    options.update({
+        'poolclass': TimedQueuePool,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+    })
+    if config['DB_PGBOUNCER']:
+        # in transaction pooling mode consecutive transactions may run on
+        # different server connections, so no prepared statement can be
+        # reused. psycopg2 never prepares; psycopg 3 and asyncpg must not
+        # (asyncpg URLs also need ?prepared_statement_cache_size=0).
+        driver = url.get_driver_name()
+        if driver == 'psycopg':
+            options['connect_args'] = {'prepare_threshold': None}
+        elif driver == 'asyncpg':
+            options['connect_args'] = {'statement_cache_size': 0}
+    return options
+
+def pool_stats(pool):
+    '''Live numbers of the engine's pool, as reported on /health.'''
+    stats = {'class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+            'max_overflow': pool._max_overflow,
+            'timeout': pool.timeout(),
+        })
+    if isinstance(pool, TimedQueuePool):
+        with pool._stats_lock:
+            stats.update({
+                'checkouts': pool.waits,
+                'wait_seconds_total': round(pool.wait_seconds, 6),
+                'wait_seconds_max': round(pool.max_wait_seconds, 6),
+                'timeouts': pool.timeouts,
+            })
+    return stats
+
+
+def health():
+    '''Reports whether the database answers and how the pool is doing; 503 when it does not.'''
+    status, code = 'ok', 200
+    start = time.perf_counter()
+    try:
+        with db.engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+    except Exception as error:
+        status, code = 'unavailable: {}'.format(type(error).__name__), 503
+    return jsonify({
+        'status': status,
+        'database_ms': round((time.perf_counter() - start) * 1000, 3),
+        'pool': pool_stats(db.engine.pool)
+    }), code
+
+def init_app(app):
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    app.add_url_rule('/health', 'health', health)
@@ -0,0 +1,216 @@
+import json
+from datetime import datetime, timezone, timedelta
+from flask import g
+from models import db, Venue, Artist, Show, SimilarArtist
+from forms import GENRE_CHOICES
+
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+def request_now():
+    '''Current time, computed once per request so every query agrees on it.'''
+    if 'now' not in g:
+        g.now = datetime.now(timezone(timedelta(hours=-3)))
+    return g.now
+
+def show_counts_query(criterion, now):
+    return db.session.query(
+        db.func.count(Show.id).filter(Show.start_time <= now),
+        db.func.count(Show.id).filter(Show.start_time > now)
+    ).filter(criterion)
+
+def show_counts(criterion, now):
+    '''Returns (past_count, upcoming_count) for the shows matching criterion.'''
+    return show_counts_query(criterion, now).one()
+
+def show_rows_query(criterion, now, upcoming, limit, anchor=None):
+    '''
+    The query behind show_rows: at most limit + 1 shows matching criterion,
+    continuing after anchor, a (start_time, id) position, when given.
+    '''
+    query = db.session.query(
+        Show.id, Show.start_time,
+        Venue.id, Venue.name, Venue.image_link,
+        Artist.id, Artist.name, Artist.image_link
+    ).join(Venue, Venue.id == Show.venue_id) \
+     .join(Artist, Artist.id == Show.artist_id) \
+     .filter(criterion)
+
+    position = db.tuple_(Show.start_time, Show.id)
+    if anchor is not None:
+        anchor = db.tuple_(*anchor)
+
+    if upcoming:
+        query = query.filter(Show.start_time > now).order_by(Show.start_time, Show.id)
+        if anchor is not None:
+            query = query.filter(position > anchor)
+    else:
+        query = query.filter(Show.start_time <= now).order_by(Show.start_time.desc(), Show.id.desc())
+        if anchor is not None:
+            query = query.filter(position < anchor)
+    return query.limit(limit + 1)
+
+def anchor_query(after, now, upcoming):
+    '''
+    The start_time of show `after`, where a show_rows batch continues. It is
+    on the same side of now as the batch, which also keeps the lookup of an
+    upcoming anchor to the current partitions on PostgreSQL.
+    '''
+    side = Show.start_time > now if upcoming else Show.start_time <= now
+    return db.session.query(Show.start_time).filter(Show.id == after, side)
+
+def show_rows_result(rows, limit):
+    '''(shows, has_more) from the rows of a show_rows_query.'''
+    shows = [{
+        "id": row[0],
+        "start_time": row[1],
+        "venue_id": row[2],
+        "venue_name": row[3],
+        "venue_image_link": row[4],
+        "artist_id": row[5],
+        "artist_name": row[6],
+        "artist_image_link": row[7]
+    } for row in rows[:limit]]
+    return shows, len(rows) > limit
+
+def similar_artists_query(artist_id):
+    '''The artists most like artist_id, best first: a range of SimilarArtist's primary key.'''
+    return db.session.query(Artist.id, Artist.name, Artist.image_link, SimilarArtist.score) \
+        .join(SimilarArtist, SimilarArtist.similar_id == Artist.id) \
+        .filter(SimilarArtist.artist_id == artist_id) \
+        .order_by(SimilarArtist.rank)
+
+def similar_artists_result(rows):
+    return [{
+        "id": row[0],
+        "name": row[1],
+        "image_link": row[2],
+        "score": row[3]
+    } for row in rows]
+
+def show_rows(criterion, now, upcoming, limit, after=None):
+    '''
+    Returns (shows, has_more) for at most `limit` shows matching criterion,
+    joined with their venue and artist.
+
+    Upcoming shows come soonest first and past shows most recent first.
+    `after` is the id of the last show of the previous batch; the next batch
+    continues from its (start_time, id) position.
+    '''
+    anchor = None
+    if after is not None:
+        start_time = anchor_query(after, now, upcoming).scalar()
+        if start_time is None:
+            return [], False
+        anchor = (start_time, after)
+    return show_rows_result(show_rows_query(criterion, now, upcoming, limit, anchor).all(), limit)
+
+def entity_version(model, id):
+    return db.session.query(model.updated_at).filter(model.id == id)
+
+def table_version(model):
+    '''
+    The latest updated_at of a table and its row count (which catches
+    deletions), each its own aggregate so both are index scans.
+    '''
+    return db.session.query(
+        db.session.query(db.func.max(model.updated_at)).scalar_subquery(),
+        db.session.query(db.func.count(model.id)).scalar_subquery())
+
+def show_version(criterion, now, *models):
+    '''
+    What a listing of the shows matching criterion (joined with `models`)
+    depends on: the latest updated_at of the shows and of each model, the
+    latest start time already past (a show moving from upcoming to past
+    changes the page too) and the show count, which catches deletions.
+    '''
+    query = db.session.query(
+        db.func.max(Show.updated_at),
+        db.func.max(Show.start_time).filter(Show.start_time <= now),
+        db.func.count(Show.id),
+        *[db.func.max(model.updated_at) for model in models])
+    for model in models:
+        query = query.join(model, model.id == getattr(Show, '{}_id'.format(model.__name__.lower())))
+    return query.filter(criterion)
+
+def page_version(*queries):
+    '''
+    Runs *_version queries as one statement and returns their columns as a
+    single row, or None when one found nothing (e.g. no such entity). The
+    row changes whenever a page built from the same data would.
+    '''
+    parts = [query.subquery() for query in queries]
+    query = db.session.query(*parts).select_from(parts[0])
+    for part in parts[1:]:
+        query = query.join(part, db.true())
+    return query.first()
+
+def venue_version(venue_id, **kwargs):
+    return page_version(entity_version(Venue, venue_id), show_version(Show.venue_id == venue_id, request_now(), Artist))
+
+def similar_version(artist_id):
+    # when the artist's similar artists were last computed
+    return db.session.query(db.func.max(SimilarArtist.computed_at)).filter(SimilarArtist.artist_id == artist_id)
+
+def artist_version(artist_id, **kwargs):
+    return page_version(entity_version(Artist, artist_id), show_version(Show.artist_id == artist_id, request_now(), Venue),
+                        similar_version(artist_id))
+
+def counter_version(model):
+    # when any of the model's show counters were last recounted, and the
+    # latest next show already started (its row is then counted on the fly)
+    return db.session.query(db.func.max(model.counted_at),
+                            db.func.max(model.next_show_time).filter(model.next_show_time <= request_now()))
+
+def venues_version(**kwargs):
+    return page_version(table_version(Venue), counter_version(Venue))
+
+def artists_version(**kwargs):
+    return page_version(table_version(Artist))
+
+def shows_version(**kwargs):
+    return page_version(table_version(Show), table_version(Venue), table_version(Artist))
+
+def feed_version(criterion, start):
+    '''
+    What a calendar feed of the shows matching criterion from start on
+    depends on: the latest updated_at of those shows and of their venues
+    and artists, and the show count, which catches deletions. The window's
+    start is part of it too, as text so it is not taken for a modification time.
+    '''
+    return db.session.query(
+        db.func.max(Show.updated_at),
+        db.func.max(Venue.updated_at),
+        db.func.max(Artist.updated_at),
+        db.func.count(Show.id),
+        db.literal(start.isoformat())
+    ).select_from(Show) \
+     .join(Venue, Venue.id == Show.venue_id) \
+     .join(Artist, Artist.id == Show.artist_id) \
+     .filter(criterion, Show.start_time >= start)
+
+def has_genre(model, genre):
+    '''Criterion for rows of model listing genre: genres @> ARRAY[genre] on PostgreSQL.'''
+    if db.engine.dialect.name == 'postgresql':
+        return model.genres.contains([genre])
+    # SQLite keeps genres as a JSON list
+    return db.type_coerce(model.genres, db.Text).like('%{}%'.format(json.dumps(genre)))
+
+def genre_facets(model):
+    '''
+    Returns [(genre, count)] of the venues or artists in each known genre,
+    in one statement whose per-genre counts are GIN index scans.
+    '''
+    return facet_counts(genre_facets_query(model).one())
+
+def genre_facets_query(model):
+    return db.session.query(*[
+        db.session.query(db.func.count(model.id)).filter(has_genre(model, genre)).as_scalar()
+        for genre, _ in GENRE_CHOICES
+    ])
+
+def facet_counts(counts):
+    '''genre_facets from the row of genre_facets_query.'''
+    return [(genre, count) for (genre, _), count in zip(GENRE_CHOICES, counts) if count]
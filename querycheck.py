@@ -0,0 +1,102 @@
+import os
+import re
+import sys
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+#----------------------------------------------------------------------------#
+# SQL checks.
+#----------------------------------------------------------------------------#
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PARAMETER = r'\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*'
+_LISTS = re.compile(r'\((?:{0},)+{0}\)'.format(_PARAMETER))
+
+
+class QueryCheckError(AssertionError):
+    '''A request ran an N+1 pattern or more statements than its view's budget.'''
+
+
+def query_budget(limit):
+    '''
+    Declares the most SQL statements one request to a view may run. Put it
+    under the route decorator:
+
+        @app.route('/shows')
+        @query_budget(1)
+        def shows():
+    '''
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+def shape(statement):
+    '''The statement with literals and parameter lists collapsed, so repeats of it compare equal.'''
+    statement = _LITERALS.sub('?', statement)
+    statement = _LISTS.sub('(?)', statement)
+    return ' '.join(statement.split())
+
+def origin():
+    '''Where the running statement comes from: the innermost app frame and template line.'''
+    code = template = None
+    frame = sys._getframe(1)
+    while frame is not None and (code is None or template is None):
+        jinja = frame.f_globals.get('__jinja_template__')
+        filename = frame.f_code.co_filename
+        if jinja is not None:
+            if template is None:
+                template = '{}:{}'.format(jinja.name or '<template>', jinja.get_corresponding_lineno(frame.f_lineno))
+        elif code is None and filename.startswith(ROOT + os.sep) and filename != __file__ \
+                and 'site-packages' not in filename:
+            code = '{}:{} in {}'.format(os.path.relpath(filename, ROOT), frame.f_lineno, frame.f_code.co_name)
+        frame = frame.f_back
+    return code, template
+
+
+def start_request():
+    g.sql_shapes = {}
+    g.sql_count = 0
+
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    if not has_app_context() or 'sql_shapes' not in g:
+        return
+    g.sql_count += 1
+    key = shape(statement)
+    seen = g.sql_shapes.get(key)
+    if seen is None:
+        g.sql_shapes[key] = [1, origin()]
+    else:
+        seen[0] += 1
+
+def check_request(exc):
+    if 'sql_shapes' not in g or exc is not None:
+        return
+    problems = []
+    repeats = current_app.config['SQL_CHECK_REPEATS']
+    for statement, (count, (code, template)) in g.sql_shapes.items():
+        if count >= repeats:
+            where = ', '.join(filter(None, [code, template])) or 'unknown'
+            problems.append('N+1: ran {} times from {}: {}'.format(count, where, statement))
+    view = current_app.view_functions.get(request.endpoint)
+    budget = getattr(view, 'query_budget', None)
+    if budget is not None and g.sql_count > budget:
+        problems.append('{} SQL statements, over the budget of {}'.format(g.sql_count, budget))
+    if not problems:
+        return
+    message = '{} {} ({}):\n  {}'.format(request.method, request.path, request.endpoint, '\n  '.join(problems))
+    if current_app.config['SQL_CHECK'] == 'raise':
+        raise QueryCheckError(message)
+    current_app.logger.warning(message)
+
+def init_app(app):
+    '''Installs the checks when SQL_CHECK is "warn" or "raise"; "off" costs nothing.'''
+    if app.config['SQL_CHECK'] not in ('warn', 'raise'):
+        return
+    app.before_request(start_request)
+    app.teardown_request(check_request)
+    event.listen(Engine, 'before_cursor_execute', count_statement)
@@ -0,0 +1,268 @@
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+import click
+from models import db, Artist, Show, SimilarArtist
+import importer
+
+
+#----------------------------------------------------------------------------#
+# Similar artists.
+#----------------------------------------------------------------------------#
+
+# The artist page lists the artists most like the one shown. They are
+# computed in batch by `flask recommend-artists` into the SimilarArtist
+# table, so the page reads them with one range scan of its primary key.
+#
+# Two artists are alike when they play the same venues and share genres.
+# Each side is a cosine similarity between sparse rows:
+#
+# - venues: artists x venues, the log-damped number of shows at each,
+#   weighted by the venue's inverse document frequency (a venue everyone
+#   plays says little about who is alike) and scaled to unit length;
+# - genres: the same over artists x genres. Most artists share their genre
+#   list with many others, so that matrix is kept factored: each artist's
+#   genre combination, and a combinations x genres matrix.
+#
+# and the score is (1 - SIMILAR_ARTISTS_GENRE_WEIGHT) * venues + weight *
+# genres. Scoring every pair of artists is quadratic; the candidates of an
+# artist are instead the artists sharing a venue with it (the nonzero
+# entries of its row of venues @ venues.T) plus, for artists with few or no
+# shows, the most booked artists of the combinations closest to its own.
+# The product is taken a chunk of rows at a time, the chunks sized so each
+# yields about RECOMMEND_CHUNK_PAIRS candidate pairs, which bounds the
+# memory the job needs whatever the number of artists. Venues played by
+# more than RECOMMEND_MAX_VENUE_ARTISTS artists are left out of the venue
+# similarity: each would add the square of that many pairs, for the least
+# telling venues.
+#
+# NumPy and SciPy are only needed by the batch job, not to serve pages.
+
+COLUMNS = ('artist_id', 'rank', 'similar_id', 'score', 'computed_at')
+LOCAL = timezone(timedelta(hours=-3))
+
+# rows fetched from the database at a time
+FETCH_SIZE = 50000
+
+# largest table of genre similarities a chunk builds (float32 entries)
+TABLE_SIZE = 2 ** 22
+
+
+def row_indices(matrix):
+    '''The row of each stored entry of a CSR matrix.'''
+    import numpy as np
+    return np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+
+def load(connection):
+    '''
+    The data the similarities are computed from, as a dict of:
+
+    - ids: the artists' ids, ascending (the rows of the matrices below);
+    - venues: artists x venues, the number of shows of each at each;
+    - popularity: each artist's number of shows;
+    - combination: the index of each artist's genre combination;
+    - combinations: combinations x genres, 1 for the genres of each.
+    '''
+    import numpy as np
+    from scipy import sparse
+
+    ids, combination = array('q'), array('q')
+    combinations, vocabulary = {}, {}
+    artists = connection.execution_options(stream_results=True).execute(
+        db.select(Artist.id, Artist.genres).order_by(Artist.id))
+    for rows in artists.partitions(FETCH_SIZE):
+        for id, genres in rows:
+            key = tuple(sorted(set(genres or ())))
+            ids.append(id)
+            combination.append(combinations.setdefault(key, len(combinations)))
+    for key in combinations:
+        for genre in key:
+            vocabulary.setdefault(genre, len(vocabulary))
+    lengths = np.fromiter((len(key) for key in combinations), dtype=np.int64, count=len(combinations))
+    indices = np.fromiter((vocabulary[genre] for key in combinations for genre in key), dtype=np.int64,
+                          count=int(lengths.sum()))
+    combinations = sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.float32), indices, np.concatenate(([0], np.cumsum(lengths)))),
+        shape=(len(lengths), len(vocabulary)))
+
+    artist_ids, venue_ids, counts = array('q'), array('q'), array('q')
+    pairs = connection.execution_options(stream_results=True).execute(
+        db.select(Show.artist_id, Show.venue_id, db.func.count()).group_by(Show.artist_id, Show.venue_id))
+    for rows in pairs.partitions(FETCH_SIZE):
+        for artist_id, venue_id, count in rows:
+            artist_ids.append(artist_id)
+            venue_ids.append(venue_id)
+            counts.append(count)
+    ids = np.frombuffer(ids, dtype=np.int64)
+    rows = np.searchsorted(ids, np.frombuffer(artist_ids, dtype=np.int64))
+    _, columns = np.unique(np.frombuffer(venue_ids, dtype=np.int64), return_inverse=True)
+    counts = np.frombuffer(counts, dtype=np.int64)
+    venues = sparse.csr_matrix((counts.astype(np.float32), (rows, columns.ravel())),
+                               shape=(len(ids), int(columns.max()) + 1 if len(columns) else 0))
+    return {
+        'ids': ids,
+        'venues': venues,
+        'popularity': np.bincount(rows, weights=counts, minlength=len(ids)),
+        'combination': np.frombuffer(combination, dtype=np.int64),
+        'combinations': combinations,
+    }
+
+def weighted(matrix, counts=None):
+    '''
+    matrix (rows x features) with its entries log-damped, weighted by the
+    features' smoothed inverse document frequency and each row scaled to
+    unit length, so the product of two rows is their cosine similarity.
+    counts is the number of artists each row stands for (1 by default).
+    '''
+    import numpy as np
+    matrix = matrix.tocsr().astype(np.float32)
+    rows = row_indices(matrix)
+    total = matrix.shape[0] if counts is None else counts.sum()
+    frequency = np.bincount(matrix.indices, weights=None if counts is None else counts[rows],
+                            minlength=matrix.shape[1])
+    matrix.data = np.log1p(matrix.data) * (np.log((1 + total) / (1 + frequency)) + 1)[matrix.indices]
+    norms = np.sqrt(np.bincount(rows, weights=matrix.data ** 2, minlength=matrix.shape[0]))
+    matrix.data /= norms[rows]
+    return matrix
+
+def genre_candidates(genres, combination, popularity, width):
+    '''
+    For each genre combination, the `width` most booked artists of the
+    combinations closest to it (its own first), as a combinations x width
+    array padded with -1.
+    '''
+    import numpy as np
+    order = np.lexsort((-popularity, combination))
+    sizes = np.bincount(combination, minlength=genres.shape[0])
+    starts = np.concatenate(([0], np.cumsum(sizes)))
+    candidates = np.full((genres.shape[0], width), -1, dtype=np.int64)
+    # a block of combinations at a time: its rows of the dense similarities
+    block = max(1, 2 ** 22 // max(1, genres.shape[0]))
+    for lo in range(0, genres.shape[0], block):
+        similarities = (genres[lo:lo + block] @ genres.T).toarray()
+        # every combination has an artist, so the closest `width` fill the width
+        closest = np.argpartition(-similarities, width - 1, axis=1)[:, :width] \
+            if similarities.shape[1] > width else np.tile(np.arange(similarities.shape[1]), (len(similarities), 1))
+        for offset, row in enumerate(closest):
+            row = row[np.argsort(-similarities[offset, row], kind='stable')]
+            row = row[similarities[offset, row] > 0]
+            found = np.concatenate([order[starts[c]:starts[c + 1]] for c in row] or [np.empty(0, np.int64)])[:width]
+            candidates[lo + offset, :len(found)] = found
+    return candidates
+
+def chunk_bounds(venues, extra, pairs):
+    '''Row bounds [(lo, hi)] of chunks of about `pairs` candidate pairs each (at least one row).'''
+    import numpy as np
+    binary = venues.copy()
+    binary.data[:] = 1
+    fanout = binary @ np.asarray(binary.sum(axis=0)).ravel() + extra
+    ends = np.cumsum(fanout)
+    bounds, lo = [], 0
+    while lo < venues.shape[0]:
+        hi = max(lo + 1, int(np.searchsorted(ends, ends[lo] - fanout[lo] + pairs, side='right')))
+        bounds.append((lo, hi))
+        lo = hi
+    return bounds
+
+def genre_scores(genres, left, right):
+    '''The genre similarities of the pairs of combinations (left[i], right[i]).'''
+    import numpy as np
+    used = []
+    for side in (left, right):
+        present = np.zeros(genres.shape[0], dtype=bool)
+        present[side] = True
+        used.append((np.flatnonzero(present), np.cumsum(present) - 1))
+    (left_used, left_index), (right_used, right_index) = used
+    # a dense table of the combinations at hand when it is small enough,
+    # else the distinct pairs one by one
+    if len(left_used) * len(right_used) <= TABLE_SIZE:
+        table = (genres[left_used] @ genres[right_used].T).toarray()
+        return table[left_index[left], right_index[right]]
+    pairs, inverse = np.unique(left * genres.shape[0] + right, return_inverse=True)
+    return np.asarray(genres[pairs // genres.shape[0]].multiply(
+        genres[pairs % genres.shape[0]]).sum(axis=1)).ravel()[inverse.ravel()]
+
+def similar(data, limit, genre_weight, chunk_pairs, max_venue_artists):
+    '''
+    Yields (lo, hi, rows, columns, ranks, scores) for each chunk of rows
+    [lo, hi): the `limit` artists most like each, as row indices, best
+    first (ranks from 0).
+    '''
+    import numpy as np
+    from scipy import sparse
+    n = len(data['ids'])
+    venues = data['venues']
+    # only the venues few enough artists play
+    played = np.bincount(venues.indices, minlength=venues.shape[1])
+    venues = weighted(venues)[:, np.flatnonzero(played <= max_venue_artists)].tocsr()
+    venues_t = venues.T.tocsr()
+    combination, popularity = data['combination'], data['popularity']
+    genres = weighted(data['combinations'], np.bincount(combination, minlength=data['combinations'].shape[0]))
+    # one more than the limit: the artist itself is among its own candidates
+    candidates = genre_candidates(genres, combination, popularity, limit + 1)
+
+    for lo, hi in chunk_bounds(venues, limit + 1, chunk_pairs):
+        # the genre candidates join the product's pairs with a negligible
+        # venue score; the sum merges those it already has
+        extra = candidates[combination[lo:hi]]
+        found = extra >= 0
+        shared = venues[lo:hi] @ venues_t + sparse.csr_matrix(
+            (np.full(np.count_nonzero(found), np.finfo(np.float32).tiny, dtype=np.float32), extra[found],
+             np.concatenate(([0], np.cumsum(found.sum(axis=1))))), shape=(hi - lo, n))
+        rows = row_indices(shared) + lo
+        columns = shared.indices.astype(np.int64)
+        scores = shared.data
+        keep = rows != columns
+        rows, columns = rows[keep], columns[keep]
+
+        scores = (1 - genre_weight) * scores[keep] \
+            + genre_weight * genre_scores(genres, combination[rows], combination[columns])
+        keep = scores > 0
+        rows, columns, scores = rows[keep], columns[keep], scores[keep]
+
+        # the best `limit` of each row: one sort on the row, then the score
+        # (scores are within [0, 1])
+        order = np.argsort(rows - scores.astype(np.float64) / 2)
+        rows, columns, scores = rows[order], columns[order], scores[order]
+        counts = np.bincount(rows - lo, minlength=hi - lo)
+        ranks = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+        keep = ranks < limit
+        yield lo, hi, rows[keep], columns[keep], ranks[keep], scores[keep]
+
+def refresh(limit, genre_weight, chunk_pairs, max_venue_artists, echo=click.echo):
+    '''
+    Recomputes the SimilarArtist table, a transaction per chunk of artists
+    (so the pages keep the previous rows of the others meanwhile), and
+    returns the number of rows written.
+    '''
+    start = time.time()
+    data = load(db.session.connection())
+    ids = data['ids']
+    echo('{} artists, {} venues, {} genre combinations loaded in {:.1f}s'.format(
+        len(ids), data['venues'].shape[1], data['combinations'].shape[0], time.time() - start))
+    if not len(ids):
+        db.session.query(SimilarArtist).delete(synchronize_session=False)
+        db.session.commit()
+        return 0
+
+    computed_at = datetime.now(LOCAL)
+    written = 0
+    for lo, hi, rows, columns, ranks, scores in similar(data, limit, genre_weight, chunk_pairs, max_venue_artists):
+        # the chunk's range of ids, gaps included: rows of artists deleted since go too
+        stale = db.session.query(SimilarArtist)
+        if lo:
+            stale = stale.filter(SimilarArtist.artist_id >= int(ids[lo]))
+        if hi < len(ids):
+            stale = stale.filter(SimilarArtist.artist_id < int(ids[hi]))
+        stale.delete(synchronize_session=False)
+        importer.insert(SimilarArtist, COLUMNS, [{
+            'artist_id': int(artist_id),
+            'rank': int(rank) + 1,
+            'similar_id': int(similar_id),
+            'score': float(score),
+            'computed_at': computed_at
+        } for artist_id, rank, similar_id, score in zip(ids[rows], ranks, ids[columns], scores)])
+        db.session.commit()
+        written += len(rows)
+        echo('{}/{} artists, {} rows, {:.1f}s'.format(hi, len(ids), written, time.time() - start))
+    return written
@@ -0,0 +1,89 @@
+import time
+from threading import Lock
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event, text
+from models import db, RoutingSession
+
+
+#----------------------------------------------------------------------------#
+# Read replica.
+#----------------------------------------------------------------------------#
+
+# Cookie that keeps a client reading from the primary for a while after it
+# wrote something, so it sees its own changes before the replica has them.
+STICKY_COOKIE = 'read_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+LAG_QUERY = text('''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+''')
+
+_lag = {'checked': None, 'seconds': None}
+_lag_lock = Lock()
+
+
+def use_primary(view):
+    '''Makes a view read from the primary even on GET (e.g. the GET delete routes).'''
+    view.use_primary = True
+    return view
+
+def replica_lag():
+    '''
+    Seconds the replica is behind the primary, or None when it does not answer.
+    Checked at most every REPLICA_LAG_CHECK_INTERVAL seconds per process.
+    '''
+    now = time.monotonic()
+    with _lag_lock:
+        if _lag['checked'] is not None and now - _lag['checked'] < current_app.config['REPLICA_LAG_CHECK_INTERVAL']:
+            return _lag['seconds']
+        _lag['checked'] = now
+    engine = db.get_engine(current_app, bind='replica')
+    try:
+        with engine.connect() as connection:
+            # only PostgreSQL reports replication lag; other replicas count as current
+            seconds = float(connection.execute(LAG_QUERY).scalar() or 0) \
+                if engine.dialect.name == 'postgresql' else 0.0
+    except Exception:
+        current_app.logger.warning('Read replica unavailable, reading from the primary.', exc_info=True)
+        seconds = None
+    with _lag_lock:
+        _lag['seconds'] = seconds
+    return seconds
+
+def writes():
+    '''Whether this request may write: an unsafe method, or a @use_primary view.'''
+    view = current_app.view_functions.get(request.endpoint)
+    return request.method not in SAFE_METHODS or getattr(view, 'use_primary', False)
+
+def route_request():
+    '''Decides whether this request's reads may go to the replica.'''
+    if writes() or request.cookies.get(STICKY_COOKIE):
+        g.use_replica = False
+        return
+    lag = replica_lag()
+    g.use_replica = lag is not None and lag <= current_app.config['REPLICA_MAX_LAG']
+
+def mark_writer(response):
+    if writes():
+        response.set_cookie(STICKY_COOKIE, '1', max_age=current_app.config['REPLICA_STICKY_SECONDS'],
+                            httponly=True, samesite='Lax')
+    if current_app.debug:
+        response.headers['X-Database'] = 'replica' if g.get('use_replica') else 'primary'
+    return response
+
+def stop_reading_replica(session, flush_context):
+    # reads after a write in the same request must see it
+    if has_request_context():
+        g.use_replica = False
+
+
+def init_app(app):
+    '''Routes reads to the replica when SQLALCHEMY_BINDS has one; otherwise does nothing.'''
+    if not app.config.get('SQLALCHEMY_BINDS', {}).get('replica'):
+        return
+    app.before_request(route_request)
+    app.after_request(mark_writer)
+    event.listen(RoutingSession, 'after_flush', stop_reading_replica)
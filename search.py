@@ -0,0 +1,197 @@
+import time
+from collections import defaultdict
+from threading import Lock
+from flask import current_app
+from models import db, Venue, Artist
+from pagination import Page, keyset_query, page_of, paginate_query, paginate_list
+from aio import async_db
+from forms import GENRE_CHOICES
+
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+GENRES = {genre.lower(): genre for genre, _ in GENRE_CHOICES}
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def similarity(a, b):
+    '''Share of trigrams two sets have in common, like pg_trgm's similarity().'''
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / float(len(a) + len(b) - shared)
+
+def document(obj):
+    '''The searchable text of a venue or artist: name, city and genres.'''
+    return ' '.join([obj.name or '', obj.city or ''] + list(obj.genres or [])).lower()
+
+
+class TrigramIndex:
+    '''
+    In-memory trigram index over (id, name, document) entries.
+
+    Pure-Python stand-in for the pg_trgm GIN indexes, used on databases
+    without pg_trgm (SQLite in development and tests). Matching follows
+    the ILIKE semantics of the PostgreSQL path: an entry matches when the
+    term is a substring of its document.
+    '''
+
+    def __init__(self):
+        self._postings = defaultdict(set)
+        self._names = {}
+        self._documents = {}
+        # the latest updated_at read from the database, and when it was read
+        self.watermark = None
+        self.checked = 0
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, id, name, document):
+        self.remove(id)
+        self._names[id] = (name or '').lower()
+        self._documents[id] = document
+        for gram in trigrams(document):
+            self._postings[gram].add(id)
+
+    def remove(self, id):
+        document = self._documents.pop(id, None)
+        if document is None:
+            return
+        del self._names[id]
+        for gram in trigrams(document):
+            postings = self._postings[gram]
+            postings.discard(id)
+            if not postings:
+                del self._postings[gram]
+
+    def search(self, term):
+        '''Returns the (rank, name, id) sort keys of every match, most relevant first.'''
+        term = term.lower()
+        grams = trigrams(term)
+        if grams:
+            postings = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+        else:
+            # terms under three characters have no trigrams to look up
+            candidates = self._documents.keys()
+        return sorted(
+            (-similarity(grams, trigrams(self._names[id])), self._names[id], id)
+            for id in candidates if term in self._documents[id]
+        )
+
+
+_indexes = {}
+_indexes_lock = Lock()
+
+def catch_up(model, index):
+    '''Adds the rows of model written since the index's watermark (all of them when it has none).'''
+    query = model.query
+    if index.watermark is not None:
+        query = query.filter(model.updated_at >= index.watermark)
+    for obj in query.yield_per(1000):
+        index.add(obj.id, obj.name, document(obj))
+        if obj.updated_at is not None and (index.watermark is None or obj.updated_at > index.watermark):
+            index.watermark = obj.updated_at
+    index.checked = time.monotonic()
+
+def fallback_index(model):
+    '''
+    The process-wide TrigramIndex for model, built on first use. The ORM
+    events below keep it current with this process's writes; rows written
+    otherwise (bulk loads by `flask import` or benchmarks.dataset, other
+    workers) are caught up from updated_at at most every
+    SEARCH_INDEX_REFRESH_INTERVAL seconds, in one statement.
+    '''
+    index = _indexes.get(model)
+    if index is None or time.monotonic() - index.checked >= current_app.config['SEARCH_INDEX_REFRESH_INTERVAL']:
+        with _indexes_lock:
+            index = _indexes.get(model)
+            if index is None:
+                index = TrigramIndex()
+                catch_up(model, index)
+                _indexes[model] = index
+            elif time.monotonic() - index.checked >= current_app.config['SEARCH_INDEX_REFRESH_INTERVAL']:
+                catch_up(model, index)
+    return index
+
+def _reindex(mapper, connection, target):
+    index = _indexes.get(type(target))
+    if index is not None:
+        index.add(target.id, target.name, document(target))
+
+def _unindex(mapper, connection, target):
+    index = _indexes.get(type(target))
+    if index is not None:
+        index.remove(target.id)
+
+for model in (Venue, Artist):
+    db.event.listen(model, 'after_insert', _reindex)
+    db.event.listen(model, 'after_update', _reindex)
+    db.event.listen(model, 'after_delete', _unindex)
+
+
+def match_query(model, term):
+    '''
+    The PostgreSQL query of search: (venue or artist, rank) rows, with the
+    columns to paginate them by.
+    '''
+    pattern = '%{}%'.format(term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+    rank = -db.func.similarity(model.name, term, type_=db.Float)
+    matches = [model.name.ilike(pattern), model.city.ilike(pattern)]
+    if term.lower() in GENRES:
+        matches.append(model.genres.contains([GENRES[term.lower()]]))
+    return db.session.query(model, rank.label('rank')).filter(db.or_(*matches)), [rank, model.name, model.id]
+
+def search(model, term, cursor=None, per_page=None):
+    '''
+    Returns the Page of venues or artists whose name or city contain term,
+    or whose genres include it (case-insensitive), the closest name matches
+    first.
+
+    On PostgreSQL this runs against the pg_trgm GIN indexes; elsewhere it
+    falls back to the in-memory TrigramIndex.
+    '''
+    term = (term or '').strip()
+    if not term:
+        return Page([])
+    if per_page is None:
+        per_page = current_app.config['SEARCH_RESULTS_LIMIT']
+
+    if db.engine.dialect.name == 'postgresql':
+        query, keys = match_query(model, term)
+        page = paginate_query(query, keys, cursor, per_page, lambda row: (row[1], row[0].name, row[0].id))
+        page.items = [obj for obj, _ in page.items]
+        return page
+
+    page = paginate_list(fallback_index(model).search(term), cursor, per_page)
+    ids = [id for _, _, id in page.items]
+    found = {obj.id: obj for obj in model.query.filter(model.id.in_(ids))} if ids else {}
+    page.items = [found[id] for id in ids if id in found]
+    return page
+
+async def search_async(model, term, cursor=None, per_page=None):
+    '''search on the async engine (ASYNC_DB); the items are rows of the table, not model objects.'''
+    term = (term or '').strip()
+    if not term:
+        return Page([])
+    if per_page is None:
+        per_page = current_app.config['SEARCH_RESULTS_LIMIT']
+
+    if db.engine.dialect.name == 'postgresql':
+        query, keys = match_query(model, term)
+        query, key, direction = keyset_query(query, keys, cursor, per_page)
+        rows, = await async_db.all(query.statement)
+        return page_of(rows, per_page, key, lambda row: (row.rank, row.name, row.id), direction)
+
+    page = paginate_list(fallback_index(model).search(term), cursor, per_page)
+    ids = [id for _, _, id in page.items]
+    found = {}
+    if ids:
+        rows, = await async_db.all(model.__table__.select().where(model.id.in_(ids)))
+        found = {row.id: row for row in rows}
+    page.items = [found[id] for id in ids if id in found]
+    return page
@@ -2,3 +2,39 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Type-ahead for the search boxes: fills the box's <datalist> from
+// /autocomplete as the user types, one request per pause in typing.
+(function () {
+  var inputs = document.querySelectorAll('input[data-autocomplete]');
+  Array.prototype.forEach.call(inputs, function (input) {
+    var list = document.getElementById(input.getAttribute('list'));
+    var timer = null;
+    var latest = '';
+    input.addEventListener('input', function () {
+      clearTimeout(timer);
+      timer = setTimeout(function () {
+        var q = input.value.trim();
+        latest = q;
+        if (!q) {
+          list.innerHTML = '';
+          return;
+        }
+        var url = '/autocomplete?kind=' + encodeURIComponent(input.getAttribute('data-autocomplete')) +
+          '&q=' + encodeURIComponent(q);
+        fetch(url).then(function (response) {
+          return response.json();
+        }).then(function (body) {
+          // answers can arrive out of order: keep the latest query's
+          if (q !== latest) return;
+          list.innerHTML = '';
+          body.data.forEach(function (suggestion) {
+            var option = document.createElement('option');
+            option.value = suggestion.name;
+            list.appendChild(option);
+          });
+        });
+      }, 100);
+    });
+  });
+})();
@@ -0,0 +1,88 @@
+'''
+Fixtures shared by the tests.
+
+The suite runs against TEST_DB_URI (a throwaway SQLite file by default;
+never DB_URI, whose rows it deletes) with SQL_CHECK=raise, so a request
+over its view's @query_budget, or running an N+1 pattern, fails the test
+that made it (see querycheck.py).
+
+    python -m pytest
+    TEST_DB_URI=postgresql://localhost/fyyur_test python -m pytest
+'''
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+# config.py reads these when the app is imported
+os.environ['DB_URI'] = os.environ.get('TEST_DB_URI') or \
+    'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='fyyur-tests-'), 'fyyur.db')
+os.environ['SQL_CHECK'] = 'raise'
+
+from app import app as fyyur  # noqa: E402
+from models import db, Venue, Artist, Show  # noqa: E402
+from cache import page_cache  # noqa: E402
+import search  # noqa: E402
+from benchmarks.dataset import create_tables, reset  # noqa: E402
+from bookings import LOCAL  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    fyyur.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with fyyur.app_context():
+        create_tables()
+    return fyyur
+
+@pytest.fixture
+def client(app):
+    '''A test client over an empty database and page cache.'''
+    with app.app_context():
+        reset()
+    # a fresh backend and search indexes: ids restart with the rows
+    page_cache.init_app(app)
+    search._indexes.clear()
+    with app.app_context():
+        yield app.test_client()
+
+
+class Seed:
+    '''Adds rows straight to the database and returns their ids.'''
+
+    def add(self, row):
+        row.updated_at = datetime.now(LOCAL)
+        db.session.add(row)
+        db.session.commit()
+        return row.id
+
+    def venue(self, name='The Musical Hop', city='San Francisco', state='CA', **columns):
+        return self.add(Venue(name=name, city=city, state=state, genres=columns.pop('genres', ['Jazz']), **columns))
+
+    def artist(self, name='Guns N Petals', city='San Francisco', state='CA', **columns):
+        return self.add(Artist(name=name, city=city, state=state, genres=columns.pop('genres', ['Rock n Roll']), **columns))
+
+    def show(self, venue_id, artist_id, start_time, end_time=None):
+        return self.add(Show(venue_id=venue_id, artist_id=artist_id, start_time=start_time,
+                             end_time=end_time or start_time + timedelta(hours=2)))
+
+@pytest.fixture
+def seed(client):
+    return Seed()
+
+@pytest.fixture
+def statements(app):
+    '''Calls a function and returns its result with the SQL statements it ran.'''
+    def run(function, *args, **kwargs):
+        ran = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            ran.append(statement)
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            return function(*args, **kwargs), ran
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+    return run
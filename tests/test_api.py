@@ -0,0 +1,50 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import api
+from bookings import LOCAL
+
+
+def test_fields_select_and_order_the_keys(client, seed):
+    hop, park = seed.venue(), seed.venue(name='Park Square')
+    response = client.get('/api/v1/venues?fields=name,id')
+    assert response.get_json() == {'data': [{'name': 'The Musical Hop', 'id': hop}, {'name': 'Park Square', 'id': park}]}
+    assert list(response.get_json()['data'][0]) == ['name', 'id']
+
+    detail = client.get('/api/v1/venues/{}?fields=name,upcoming_shows_count'.format(hop)).get_json()
+    assert detail == {'data': {'name': 'The Musical Hop', 'upcoming_shows_count': 0}}
+
+@pytest.mark.parametrize('path', ['/api/v1/venues', '/api/v1/venues/1', '/api/v1/shows'])
+def test_unknown_fields_are_a_bad_request(client, path):
+    response = client.get(path + '?fields=id,password')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Unknown fields: password'}
+
+def test_shows_stream_in_batches(client, seed, monkeypatch):
+    monkeypatch.setattr(api, 'STREAM_BATCH_SIZE', 2)
+    venue_id, artist_id = seed.venue(), seed.artist()
+    start = datetime.now(LOCAL) + timedelta(days=1)
+    ids = [seed.show(venue_id, artist_id, start + timedelta(days=day)) for day in range(5)]
+
+    response = client.get('/api/v1/shows?fields=id,venue_name,artist_name')
+    assert response.is_streamed
+    chunks = list(response.response)
+    # the opening, three batches (2, 2 and 1 shows) and the closing
+    assert len(chunks) == 5
+    assert json.loads(b''.join(chunks)) == {'data': [
+        {'id': id, 'venue_name': 'The Musical Hop', 'artist_name': 'Guns N Petals'} for id in ids]}
+
+    assert client.get('/api/v1/shows?fields=id').get_json() == {'data': [{'id': id} for id in ids]}
+
+@pytest.mark.parametrize('fields, joined', [
+    ('id,start_time,venue_id', []),
+    ('id,venue_name', ['"Venue"']),
+    ('artist_name,venue_image_link', ['"Venue"', '"Artist"']),
+])
+def test_shows_join_only_the_tables_of_the_fields(client, seed, statements, fields, joined):
+    seed.show(seed.venue(), seed.artist(), datetime.now(LOCAL) + timedelta(days=1))
+    response, ran = statements(lambda: client.get('/api/v1/shows?fields=' + fields).get_data())
+    query, = [statement for statement in ran if 'FROM "Show"' in statement]
+    assert [table for table in ('"Venue"', '"Artist"') if 'JOIN {}'.format(table) in query] == joined
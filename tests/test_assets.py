@@ -0,0 +1,61 @@
+import gzip
+import os
+import shutil
+
+import pytest
+from flask import url_for
+
+import assets
+
+brotli = pytest.importorskip('brotli')
+pytest.importorskip('rcssmin')
+pytest.importorskip('rjsmin')
+
+
+@pytest.fixture(scope='module')
+def built(app, tmp_path_factory):
+    '''The manifest of a build of a copy of static/, served in place of the real one.'''
+    static_folder, manifest = app.static_folder, app.extensions['assets']
+    app.static_folder = str(tmp_path_factory.mktemp('assets') / 'static')
+    shutil.copytree(static_folder, app.static_folder)
+    try:
+        yield assets.build(app)
+    finally:
+        app.static_folder, app.extensions['assets'] = static_folder, manifest
+
+def read(app, path):
+    with open(os.path.join(app.static_folder, path), 'rb') as f:
+        return f.read()
+
+
+def test_pages_link_the_built_bundles(app, client, built):
+    with app.test_request_context():
+        url = url_for('static', filename='bundles/main.css')
+    assert url == '/static/' + built['files']['bundles/main.css']
+    page = client.get('/').data.decode()
+    assert 'href="{}"'.format(url) in page
+    assert '/static/css/main.css' not in page
+
+@pytest.mark.parametrize('accept, encoding, decode', [
+    ('gzip, deflate, br', 'br', brotli.decompress),
+    ('gzip, deflate', 'gzip', gzip.decompress),
+    ('', None, lambda data: data),
+])
+def test_built_files_are_sent_precompressed_and_immutable(app, client, built, accept, encoding, decode):
+    path = built['files']['bundles/main.js']
+    response = client.get('/static/' + path, headers={'Accept-Encoding': accept})
+    assert response.status_code == 200
+    assert response.mimetype.endswith('/javascript')
+    assert response.headers.get('Content-Encoding') == encoding
+    assert decode(response.data) == read(app, path)
+    assert 'Accept-Encoding' in response.headers['Vary']
+    cache_control = response.cache_control
+    assert cache_control.public and cache_control.immutable
+    assert cache_control.max_age == app.config['ASSETS_MAX_AGE']
+
+def test_unbuilt_files_are_sent_as_they_are(app, client, built):
+    response = client.get('/static/css/main.css', headers={'Accept-Encoding': 'br'})
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+    assert not response.cache_control.immutable
+    assert response.data == read(app, 'css/main.css')
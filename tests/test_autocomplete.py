@@ -0,0 +1,78 @@
+import os
+import subprocess
+import sys
+import time
+
+from autocomplete import PrefixIndex, Suggestions, suggestions
+from models import db, Venue
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def names(found):
+    return [name for _, name, _ in found]
+
+
+def test_later_words_match_by_prefix():
+    index = PrefixIndex.build([(1, 'The Musical Hop', 0), (2, 'Park Square Live Music & Coffee', 0)])
+    assert names(index.suggest('hop')) == ['The Musical Hop']
+    assert sorted(names(index.suggest('mus'))) == ['Park Square Live Music & Coffee', 'The Musical Hop']
+    assert names(index.suggest('musical h')) == ['The Musical Hop']
+    assert index.suggest('usical') == []
+
+
+def test_accents_and_case_are_folded():
+    index = PrefixIndex.build([(1, 'Café Tacvba', 0), (2, 'MÖTLEY CRÜE', 0)])
+    assert names(index.suggest('cafe')) == ['Café Tacvba']
+    assert names(index.suggest('CAFÉ t')) == ['Café Tacvba']
+    assert names(index.suggest('crue')) == ['MÖTLEY CRÜE']
+
+
+def test_heaviest_names_come_first():
+    index = PrefixIndex.build([(id, 'Band {}'.format(id), id % 7) for id in range(1, 500)], limit=3)
+    assert [weight for weight, _, _ in index.suggest('band')] == [6, 6, 6]
+    index.put(12, 'Band 12', 100)
+    assert index.suggest('band')[0] == (100, 'Band 12', 12)
+    index.put(12, 'Band 12', 0)
+    assert 12 not in [id for _, _, id in index.suggest('band')]
+
+
+def test_commits_update_the_index(client, seed, monkeypatch):
+    monkeypatch.setattr(suggestions, 'indexes', {'venue': PrefixIndex(), 'artist': PrefixIndex()})
+    venue_id = seed.venue(name='The Dueling Pianos Bar')
+    assert names(suggestions.indexes['venue'].suggest('pianos')) == ['The Dueling Pianos Bar']
+
+    db.session.get(Venue, venue_id).name = 'Fiddle Hall'
+    db.session.flush()
+    db.session.rollback()
+    assert suggestions.indexes['venue'].suggest('fiddle') == []
+
+    db.session.get(Venue, venue_id).name = 'Fiddle Hall'
+    db.session.commit()
+    assert names(suggestions.indexes['venue'].suggest('fiddle')) == ['Fiddle Hall']
+    assert suggestions.indexes['venue'].suggest('pianos') == []
+
+    db.session.delete(db.session.get(Venue, venue_id))
+    db.session.commit()
+    assert suggestions.indexes['venue'].suggest('fiddle') == []
+
+
+def test_index_is_built_without_a_request(app, seed):
+    seed.artist(name='Guns N Petals')
+    suggestions = Suggestions()
+    suggestions.app = app
+    suggestions.start()
+    deadline = time.monotonic() + 10
+    while 'artist' not in suggestions.indexes and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [found['name'] for found in suggestions.suggest('petals')] == ['Guns N Petals']
+
+
+def test_importing_the_app_does_not_build(tmp_path):
+    # as CLI commands and scripts do: no thread, so no names loaded and no
+    # error logged against a database without tables
+    script = 'import threading, app; print(sorted(t.name for t in threading.enumerate()))'
+    env = dict(os.environ, DB_URI='sqlite:///' + str(tmp_path / 'empty.db'))
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert 'autocomplete' not in result.stdout
@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+
+from bookings import LOCAL
+from models import db, Venue, Show
+from cache import page_cache
+
+
+def test_fragment_follows_linked_venue_rename(client, seed):
+    venue_id = seed.venue(name='The Musical Hop')
+    artist_id = seed.artist()
+    seed.show(venue_id, artist_id, datetime.now(LOCAL) + timedelta(days=3))
+    assert b'The Musical Hop' in client.get('/artists/{}'.format(artist_id)).data
+
+    # as another worker would: no invalidation reaches this process's cache
+    db.session.execute(Venue.__table__.update().where(Venue.id == venue_id).values(
+        name='The Dueling Pianos Bar', updated_at=datetime.now(LOCAL)))
+    db.session.commit()
+    response = client.get('/artists/{}'.format(artist_id))
+    assert b'The Dueling Pianos Bar' in response.data
+    assert b'The Musical Hop' not in response.data
+
+
+def test_fragment_follows_new_show(client, seed):
+    venue_id = seed.venue()
+    artist_id = seed.artist(name='Matt Quevedo')
+    assert b'Matt Quevedo' not in client.get('/venues/{}'.format(venue_id)).data
+
+    now = datetime.now(LOCAL)
+    db.session.execute(Show.__table__.insert().values(
+        venue_id=venue_id, artist_id=artist_id, start_time=now + timedelta(days=2),
+        end_time=now + timedelta(days=2, hours=2), created_at=now, updated_at=now))
+    db.session.commit()
+    assert b'Matt Quevedo' in client.get('/venues/{}'.format(venue_id)).data
+
+
+def test_cache_lookups_on_metrics(client, seed):
+    venue_id = seed.venue()
+    before = page_cache.stats()
+    client.get('/venues/{}'.format(venue_id))
+    client.get('/venues/{}'.format(venue_id))
+    stats = page_cache.stats()
+    assert stats['misses'] == before['misses'] + 1
+    assert stats['hits'] == before['hits'] + 1
+    assert 'fyyur_page_cache_lookups_total{kind="venue",result="hit"}' in client.get('/metrics').get_data(as_text=True)
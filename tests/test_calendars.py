@@ -0,0 +1,58 @@
+from datetime import datetime
+
+from bookings import LOCAL
+
+
+def events(response):
+    '''The feed's events as dicts of their properties, its lines unfolded.'''
+    assert response.mimetype == 'text/calendar'
+    text = response.get_data(as_text=True)
+    lines = text.split('\r\n')
+    assert lines[0] == 'BEGIN:VCALENDAR' and lines[-2:] == ['END:VCALENDAR', '']
+    assert all(len(line.encode('utf-8')) <= 75 for line in lines)
+    found = []
+    for block in text.replace('\r\n ', '').split('BEGIN:VEVENT\r\n')[1:]:
+        found.append(dict(line.split(':', 1) for line in block.split('\r\nEND:VEVENT')[0].split('\r\n')))
+    return found
+
+def seed_feed(seed):
+    venue_id = seed.venue(name='The Musical Hop, Café & Bar')
+    artist_id = seed.artist(name='Guns N Petals; the reunion tour with a very long name that folds')
+    old = seed.show(venue_id, artist_id, datetime(2020, 1, 1, 21, tzinfo=LOCAL))
+    new = seed.show(venue_id, artist_id, datetime(2035, 5, 1, 21, tzinfo=LOCAL))
+    return venue_id, artist_id, old, new
+
+
+def test_feed_lists_the_shows_from_the_window_on(client, seed):
+    venue_id, artist_id, old, new = seed_feed(seed)
+    found = events(client.get('/venues/{}/calendar.ics'.format(venue_id)))
+    assert len(found) == 1
+    event, = found
+    assert event['UID'] == 'show-{}@localhost'.format(new)
+    # in UTC: 21:00 at UTC-3
+    assert (event['DTSTART'], event['DTEND']) == ('20350502T000000Z', '20350502T020000Z')
+    assert event['SUMMARY'] == 'Guns N Petals\\; the reunion tour with a very long name that folds at ' \
+        'The Musical Hop\\, Café & Bar'
+    assert event['URL'] == 'http://localhost/artists/{}'.format(artist_id)
+
+    found = events(client.get('/artists/{}/calendar.ics?since=2019-12-31'.format(artist_id)))
+    assert [event['UID'] for event in found] == ['show-{}@localhost'.format(id) for id in (old, new)]
+
+def test_feed_answers_bad_since_and_unknown_venues(client, seed):
+    venue_id, *_ = seed_feed(seed)
+    assert client.get('/venues/{}/calendar.ics?since=yesterday'.format(venue_id)).status_code == 400
+    assert client.get('/venues/{}/calendar.ics'.format(venue_id + 100)).status_code == 404
+
+def test_unchanged_feed_is_not_modified(client, seed):
+    venue_id, artist_id, old, new = seed_feed(seed)
+    path = '/venues/{}/calendar.ics'.format(venue_id)
+    etag = client.get(path).headers['ETag']
+    response = client.get(path, headers={'If-None-Match': etag})
+    assert response.status_code == 304 and response.data == b''
+    # another window is another feed
+    assert client.get(path + '?since=2019-12-31', headers={'If-None-Match': etag}).status_code == 200
+
+    seed.show(venue_id, artist_id, datetime(2035, 6, 1, 21, tzinfo=LOCAL))
+    response = client.get(path, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert len(events(response)) == 2
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+from bookings import LOCAL
+from models import db, Artist
+
+
+def test_unchanged_page_is_not_modified(client, seed, statements):
+    venue_id, artist_id = seed.venue(), seed.artist()
+    seed.show(venue_id, artist_id, datetime.now(LOCAL) + timedelta(days=1))
+    path = '/venues/{}'.format(venue_id)
+    page = client.get(path)
+    assert page.status_code == 200
+    etag, weak = page.get_etag()
+    assert etag and weak
+    assert page.last_modified is not None
+    assert 'no-cache' in page.headers['Cache-Control'] and 'private' in page.headers['Cache-Control']
+
+    response, ran = statements(client.get, path, headers={'If-None-Match': page.headers['ETag']})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == page.headers['ETag']
+    # the version query alone: nothing rendered
+    assert len(ran) == 1
+
+    response = client.get(path, headers={'If-Modified-Since': page.headers['Last-Modified']})
+    assert response.status_code == 304
+
+def test_changed_page_gets_a_new_etag(client, seed):
+    venue_id, artist_id = seed.venue(), seed.artist()
+    seed.show(venue_id, artist_id, datetime.now(LOCAL) + timedelta(days=1))
+    path = '/venues/{}'.format(venue_id)
+    etag = client.get(path).headers['ETag']
+
+    # the page lists the artist of its show
+    artist = db.session.get(Artist, artist_id)
+    artist.name = 'Matt Quevedo'
+    artist.updated_at = datetime.now(LOCAL) + timedelta(seconds=1)
+    db.session.commit()
+    response = client.get(path, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert b'Matt Quevedo' in response.data
+
+    seed.show(venue_id, artist_id, datetime.now(LOCAL) + timedelta(days=2))
+    assert client.get(path, headers={'If-None-Match': response.headers['ETag']}).status_code == 200
+
+def test_page_with_flashed_messages_has_no_validators(client, seed):
+    path = '/venues/{}'.format(seed.venue())
+    etag = client.get(path).headers['ETag']
+    with client.session_transaction() as session:
+        session['_flashes'] = [('message', 'Venue was successfully listed!')]
+    response = client.get(path, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Venue was successfully listed!' in response.data
+    assert 'ETag' not in response.headers
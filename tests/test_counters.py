@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+from flask import g
+
+import counters
+from app import venues_query
+from bookings import LOCAL
+from models import db, Venue, Artist, Show
+from queries import venues_version
+
+
+def counted(model, id):
+    db.session.expire_all()
+    row = db.session.get(model, id)
+    return row.past_shows_count, row.upcoming_shows_count, row.next_show_time
+
+def local(time):
+    # SQLite hands times back naive, in the offset they were written with
+    return time.replace(tzinfo=None) if time and db.engine.dialect.name == 'sqlite' else time
+
+
+def test_flushes_recount_the_shows_they_touch(client, seed):
+    venue_id, other_venue_id, artist_id = seed.venue(), seed.venue(name='Park Square'), seed.artist()
+    now = datetime.now(LOCAL).replace(microsecond=0)
+    soon, later = now + timedelta(days=1), now + timedelta(days=2)
+
+    # create
+    past_id = seed.show(venue_id, artist_id, now - timedelta(days=1))
+    upcoming_id = seed.show(venue_id, artist_id, later)
+    seed.show(venue_id, artist_id, soon)
+    assert counted(Venue, venue_id) == (1, 2, local(soon))
+    assert counted(Artist, artist_id) == (1, 2, local(soon))
+
+    # edit: to another venue, and into the past
+    show = db.session.get(Show, upcoming_id)
+    show.venue_id = other_venue_id
+    db.session.commit()
+    assert counted(Venue, venue_id) == (1, 1, local(soon))
+    assert counted(Venue, other_venue_id) == (0, 1, local(later))
+    show = db.session.get(Show, upcoming_id)
+    show.start_time = now - timedelta(days=2)
+    db.session.commit()
+    assert counted(Venue, other_venue_id) == (1, 0, None)
+    assert counted(Artist, artist_id) == (2, 1, local(soon))
+
+    # delete
+    db.session.delete(db.session.get(Show, past_id))
+    db.session.commit()
+    assert counted(Venue, venue_id) == (0, 1, local(soon))
+    assert counted(Artist, artist_id) == (1, 1, local(soon))
+
+def test_rolled_back_flushes_leave_the_counters(client, seed):
+    venue_id, artist_id = seed.venue(), seed.artist()
+    db.session.add(Show(venue_id=venue_id, artist_id=artist_id, start_time=datetime.now(LOCAL) + timedelta(days=1),
+                        end_time=datetime.now(LOCAL) + timedelta(days=1, hours=2), updated_at=datetime.now(LOCAL)))
+    db.session.flush()
+    db.session.rollback()
+    assert counted(Venue, venue_id) == (0, 0, None)
+
+
+def listed(app, now):
+    with app.test_request_context('/venues'):
+        g.now = now
+        return {id: upcoming for id, _, _, _, upcoming in venues_query(None)}, venues_version()
+
+def test_venues_count_shows_that_started_since_the_counters_rolled(app, client, seed):
+    venue_id, idle_id, artist_id = seed.venue(), seed.venue(name='Park Square'), seed.artist()
+    now = datetime.now(LOCAL).replace(microsecond=0)
+    seed.show(venue_id, artist_id, now + timedelta(hours=1))
+    seed.show(venue_id, artist_id, now + timedelta(days=1))
+    upcoming, version = listed(app, now)
+    assert upcoming == {venue_id: 2, idle_id: 0}
+
+    # an hour later the first show has started, but no roll has run yet
+    assert counters.counts(db.session.get(Venue, venue_id), now + timedelta(hours=2)) is None
+    upcoming, stale_version = listed(app, now + timedelta(hours=2))
+    assert upcoming == {venue_id: 1, idle_id: 0}
+    # and the listing's ETag moved with it
+    assert stale_version != version
+
+    # the venue and its artist
+    assert counters.roll(now + timedelta(hours=2)) == 2
+    db.session.commit()
+    assert counted(Venue, venue_id) == (1, 1, local(now + timedelta(days=1)))
+    assert listed(app, now + timedelta(hours=2))[0] == {venue_id: 1, idle_id: 0}
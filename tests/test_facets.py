@@ -0,0 +1,37 @@
+import pytest
+
+from models import Venue, Artist
+from queries import genre_facets
+
+
+@pytest.fixture
+def genres(seed):
+    for model in ('venue', 'artist'):
+        add = getattr(seed, model)
+        add(name='Jazz and Reggae', genres=['Jazz', 'Reggae'])
+        add(name='Jazz', genres=['Jazz'])
+        add(name='Hip-Hop and R&B', genres=['Hip-Hop', 'R&B'])
+        add(name='Musical Theatre', genres=['Musical Theatre'])
+
+
+@pytest.mark.parametrize('model', [Venue, Artist])
+def test_facets_count_each_genre(client, genres, model):
+    # in the order of the genre choices, leaving out the empty ones
+    assert genre_facets(model) == [('Hip-Hop', 1), ('Jazz', 2), ('Musical Theatre', 1), ('R&B', 1), ('Reggae', 1)]
+
+@pytest.mark.parametrize('page', ['/venues', '/artists'])
+@pytest.mark.parametrize('genre, names', [
+    ('Jazz', ['Jazz', 'Jazz and Reggae']),
+    ('R&B', ['Hip-Hop and R&B']),
+    ('Reggae', ['Jazz and Reggae']),
+    ('Pop', []),
+])
+def test_genre_filters_the_listing(client, genres, page, genre, names):
+    response = client.get(page, query_string={'genre': genre})
+    assert response.status_code == 200
+    html = response.data.decode()
+    listed = sorted(name for name in ('Jazz and Reggae', 'Jazz', 'Hip-Hop and R&amp;B', 'Musical Theatre')
+                    if '<h5>{}</h5>'.format(name) in html or '>{}</a>'.format(name) in html)
+    assert listed == sorted(name.replace('&', '&amp;') for name in names)
+    # the facets link each genre with its count
+    assert 'Jazz (2)' in html
@@ -0,0 +1,21 @@
+from datetime import datetime, timezone
+
+from flask import g
+
+from bookings import LOCAL
+from formatting import format_datetime
+
+
+def test_same_instant_in_other_offsets_keeps_its_own_local_time(app):
+    utc = datetime(2030, 5, 1, 21, 0, tzinfo=timezone.utc)
+    local = utc.astimezone(LOCAL)
+    with app.test_request_context():
+        g.locale, g.timezone = 'en', None
+        assert format_datetime(utc) == 'Wed 05, 01, 2030 9:00PM'
+        assert format_datetime(local) == 'Wed 05, 01, 2030 6:00PM'
+
+
+def test_strings_are_formatted_in_the_display_timezone(app):
+    with app.test_request_context():
+        g.locale, g.timezone = 'en', 'America/New_York'
+        assert format_datetime('2030-05-01T18:00:00-03:00', 'full') == 'Wednesday May, 1, 2030 at 5:00PM'
@@ -0,0 +1,74 @@
+import gzip
+import json
+
+import importer
+from models import db, Venue, Show
+
+VENUES_CSV = '''\
+name,city,state,address,phone,genres,facebook_link,website_link,seeking_talent,seeking_description
+The Musical Hop,San Francisco,CA,1015 Folsom Street,123-123-1234,Jazz;Reggae,https://www.facebook.com/TheMusicalHop,https://www.themusicalhop.com,yes,Looking for local artists
+Park Square,San Francisco,CA,34 Whiskey Moore Ave,415-000-1234,Rock n Roll,https://www.facebook.com/ParkSquare,https://www.parksquare.com,false,
+No Phone,San Francisco,CA,1 Nowhere Street,,Jazz,https://www.facebook.com/NoPhone,https://www.nophone.com,no,
+Bad State,Nowhere,XX,2 Nowhere Street,415-000-1234,Jazz,https://www.facebook.com/BadState,https://www.badstate.com,no,
+'''
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    if name.endswith('.gz'):
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        path.write_text(text, encoding='utf-8')
+    return str(path)
+
+def run(kind, path):
+    '''import_file's result and the records it rejected, by line.'''
+    messages = []
+    imported, rejected = importer.import_file(kind, path, chunk_size=2,
+                                              echo=lambda message, err=False: messages.append(message))
+    errors = {int(message.split()[1].rstrip(':')): message for message in messages if message.startswith('record ')}
+    return imported, rejected, errors
+
+
+def test_venues_csv_imports_the_valid_rows(client, tmp_path):
+    imported, rejected, errors = run('venues', write(tmp_path, 'venues.csv', VENUES_CSV))
+    assert (imported, rejected) == (2, 2)
+    assert sorted(errors) == [3, 4]
+    assert 'phone' in errors[3] and 'state' in errors[4]
+
+    park, hop = db.session.query(Venue).order_by(Venue.name).all()
+    assert (hop.name, hop.genres, hop.seeking_talent, hop.website) == \
+        ('The Musical Hop', ['Jazz', 'Reggae'], True, 'https://www.themusicalhop.com')
+    assert (park.name, park.seeking_talent) == ('Park Square', False)
+
+def test_shows_ndjson_checks_references_and_bookings(client, seed, tmp_path):
+    venue_id, artist_id = seed.venue(), seed.artist()
+    seed.venue(name='Twin'), seed.venue(name='Twin')
+    records = [
+        # by id, and by name
+        {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': '2030-05-01 21:00:00'},
+        {'venue': 'The Musical Hop', 'artist': 'Guns N Petals', 'start_time': '2030-05-02 21:00:00'},
+        # no such venue; a name two venues carry; not an id
+        {'venue_id': venue_id + 100, 'artist_id': artist_id, 'start_time': '2030-05-03 21:00:00'},
+        {'venue': 'Twin', 'artist_id': artist_id, 'start_time': '2030-05-04 21:00:00'},
+        {'venue_id': 'hop', 'artist_id': artist_id, 'start_time': '2030-05-05 21:00:00'},
+        # overlaps the first; ends before it starts
+        {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': '2030-05-01 22:00:00'},
+        {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': '2030-05-06 21:00:00',
+         'end_time': '2030-05-06 20:00:00'},
+    ]
+    path = write(tmp_path, 'shows.ndjson.gz', '\n'.join(json.dumps(record) for record in records) + '\n')
+    imported, rejected, errors = run('shows', path)
+    assert (imported, rejected) == (2, 5)
+    assert 'No such venue or artist' in errors[3]
+    assert 'venue_id' in errors[4]
+    assert 'Ids must be integers' in errors[5]
+    assert 'booking' in errors[6]
+    assert 'end after it starts' in errors[7]
+
+    assert db.session.query(Show).filter(Show.venue_id == venue_id).count() == 2
+    # the import recounts the shows it wrote
+    venue = db.session.get(Venue, venue_id)
+    db.session.refresh(venue)
+    assert venue.upcoming_shows_count == 2
@@ -0,0 +1,58 @@
+from datetime import datetime
+
+from models import db, Artist, Show
+from pagination import decode_cursor, encode_cursor, paginate_list, paginate_query
+from bookings import LOCAL
+
+NAMES = ['Alpha', 'Bravo', 'Charlie', 'Delta', 'Echo']
+
+
+def artists_page(cursor, per_page=2):
+    return paginate_query(db.session.query(Artist.id, Artist.name), [Artist.name, Artist.id], cursor, per_page,
+                          lambda row: (row.name, row.id))
+
+def names(page):
+    return [row.name for row in page.items]
+
+
+def test_cursor_round_trip():
+    when = datetime(2030, 5, 1, 21, 0, tzinfo=LOCAL)
+    cursor = encode_cursor((when, 7), 'prev')
+    assert decode_cursor(cursor, [Show.start_time.type, Show.id.type]) == ((when, 7), 'prev')
+
+
+def test_malformed_cursors_point_at_the_first_page():
+    types = [Artist.name.type, Artist.id.type]
+    for cursor in (None, '', 'not base64!', encode_cursor(('Bravo',), 'next'),
+                   encode_cursor(('Bravo', 2, 3), 'next'), encode_cursor(('Bravo', 2), 'sideways')):
+        assert decode_cursor(cursor, types) == (None, 'next')
+
+
+def test_next_and_prev_pages(client, seed):
+    for name in reversed(NAMES):
+        seed.artist(name=name)
+    first = artists_page(None)
+    assert names(first) == ['Alpha', 'Bravo'] and first.prev_cursor is None
+    second = artists_page(first.next_cursor)
+    assert names(second) == ['Charlie', 'Delta']
+    last = artists_page(second.next_cursor)
+    assert names(last) == ['Echo'] and last.next_cursor is None
+    assert names(artists_page(last.prev_cursor)) == ['Charlie', 'Delta']
+    assert names(artists_page(second.prev_cursor)) == ['Alpha', 'Bravo']
+
+
+def test_a_key_of_the_wrong_length_gets_the_first_page(client, seed):
+    for name in NAMES:
+        seed.artist(name=name)
+    assert names(artists_page(encode_cursor(('Charlie',), 'next'))) == ['Alpha', 'Bravo']
+    response = client.get('/artists', query_string={'cursor': encode_cursor(('Charlie', 1, 2), 'next')})
+    assert response.status_code == 200
+    assert b'Alpha' in response.data
+
+
+def test_paginate_list():
+    keys = [(-1.0, 'alpha', 1), (-0.5, 'bravo', 2), (-0.5, 'charlie', 3)]
+    first = paginate_list(keys, None, 2)
+    assert first.items == keys[:2]
+    assert paginate_list(keys, first.next_cursor, 2).items == keys[2:]
+    assert paginate_list(keys, encode_cursor(('bravo',), 'next'), 2).items == keys[:2]
@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from bookings import LOCAL
+from models import db
+from benchmarks.check_pruning import checks, explain, stale
+import partitions
+
+
+@pytest.fixture
+def partitioned(client):
+    if not partitions.is_partitioned(db.session.connection()):
+        pytest.skip('Show is only partitioned on PostgreSQL (set TEST_DB_URI, see partitions.py)')
+
+
+def test_upcoming_and_calendar_queries_skip_past_partitions(app, seed, partitioned):
+    now = datetime.now(LOCAL)
+    partitions.ensure(db.session.connection(), 9, now=now - timedelta(days=240))
+    db.session.commit()
+    venue_id, artist_id = seed.venue(), seed.artist()
+    for days in (-200, -120, -60, -10, 5, 40):
+        show_id = seed.show(venue_id, artist_id, now + timedelta(days=days))
+        if days == 5:
+            upcoming_id = show_id
+
+    since = now - timedelta(days=app.config['CALENDAR_PAST_DAYS'])
+    months = partitions.months(db.session.connection())
+    for name, start, query in checks(now, since, venue_id, artist_id, upcoming_id):
+        read = explain(query)
+        assert read, name
+        assert not stale(read, months, start), name
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from aio import async_db, async_url
+from app import ASYNC_VIEWS
+from bookings import LOCAL
+from querycheck import QueryCheckError
+
+# GET pages with a @query_budget, {venue} and {artist} filled in with seeded ids
+PAGES = [
+    '/venues',
+    '/venues/search?search_term=hop',
+    '/venues/{venue}',
+    '/venues/{venue}/shows/upcoming',
+    '/venues/{venue}/shows/past',
+    '/venues/{venue}/calendar.ics',
+    '/artists',
+    '/artists/search?search_term=petals',
+    '/artists/{artist}',
+    '/artists/{artist}/shows/upcoming',
+    '/artists/{artist}/shows/past',
+    '/artists/{artist}/calendar.ics',
+    '/autocomplete?q=gun',
+    '/shows',
+    '/api/v1/venues/{venue}',
+    '/api/v1/venues/search?q=hop',
+    '/api/v1/artists/{artist}',
+    '/api/v1/artists/search?q=petals',
+]
+
+
+def seed_pages(seed):
+    venue_id, artist_id = seed.venue(), seed.artist()
+    now = datetime.now(LOCAL)
+    for days in (-30, -10, 10, 30):
+        seed.show(venue_id, artist_id, now + timedelta(days=days))
+    return {'venue': venue_id, 'artist': artist_id}
+
+
+@pytest.mark.parametrize('page', PAGES)
+def test_page_stays_within_its_budget(client, seed, page):
+    # SQL_CHECK=raise: a request over budget raises QueryCheckError here
+    response = client.get(page.format(**seed_pages(seed)))
+    assert response.status_code == 200
+
+
+def test_request_over_budget_raises(app, client, seed, monkeypatch):
+    ids = seed_pages(seed)
+    monkeypatch.setattr(app.view_functions['show_venue'], 'query_budget', 1)
+    with pytest.raises(QueryCheckError, match='budget'):
+        client.get('/venues/{venue}'.format(**ids))
+
+
+@pytest.fixture
+def async_views(app, monkeypatch):
+    '''Serves pages with their async variants, as ASYNC_DB does.'''
+    pytest.importorskip('aiosqlite' if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite') else 'asyncpg')
+    monkeypatch.setattr(async_db, 'url', async_url(app.config['SQLALCHEMY_DATABASE_URI']))
+    monkeypatch.setattr(async_db, 'options', {})
+    monkeypatch.setattr(app, 'async_to_sync', async_db.async_to_sync, raising=False)
+    for endpoint, view in ASYNC_VIEWS.items():
+        monkeypatch.setitem(app.view_functions, endpoint, view)
+
+
+@pytest.mark.parametrize('page', PAGES)
+def test_async_page_stays_within_its_budget(client, seed, async_views, page):
+    response = client.get(page.format(**seed_pages(seed)))
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('page', ['/venues', '/venues/search?search_term=hop', '/artists',
+                                  '/artists/search?search_term=petals', '/shows',
+                                  '/api/v1/venues/search?q=hop', '/api/v1/artists/search?q=petals'])
+def test_async_page_matches_the_sync_page(client, seed, request, page):
+    seed_pages(seed)
+    seed.venue(name='Hop Garden', genres=['Folk'])
+    expected = client.get(page)
+    request.getfixturevalue('async_views')
+    response = client.get(page)
+    assert response.status_code == expected.status_code == 200
+    assert response.data == expected.data
+
+
+def test_async_statements_count_against_the_budget(app, client, seed, async_views, monkeypatch):
+    ids = seed_pages(seed)
+    monkeypatch.setattr(app.view_functions['show_artist'], 'query_budget', 1)
+    with pytest.raises(QueryCheckError, match='budget'):
+        client.get('/artists/{artist}'.format(**ids))
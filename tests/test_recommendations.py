@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from bookings import LOCAL
+from models import db, Artist, SimilarArtist
+
+recommendations = pytest.importorskip('recommendations')
+pytest.importorskip('scipy')
+
+
+def refresh(app):
+    return recommendations.refresh(app.config['SIMILAR_ARTISTS_LIMIT'], app.config['SIMILAR_ARTISTS_GENRE_WEIGHT'],
+                                   app.config['RECOMMEND_CHUNK_PAIRS'], app.config['RECOMMEND_MAX_VENUE_ARTISTS'],
+                                   echo=lambda message: None)
+
+def similar_to(artist_id):
+    return [(similar_id, round(score, 4)) for similar_id, score in db.session.query(
+        SimilarArtist.similar_id, SimilarArtist.score).filter(SimilarArtist.artist_id == artist_id)
+        .order_by(SimilarArtist.rank)]
+
+
+def test_refresh_ranks_artists_by_shared_venues_and_genres(app, client, seed):
+    now = datetime.now(LOCAL)
+    hop, park = seed.venue(), seed.venue(name='Park Square Live Music & Coffee')
+    petals = seed.artist(name='Guns N Petals', genres=['Rock n Roll'])
+    # same venue, same genre
+    quevedo = seed.artist(name='Matt Quevedo', genres=['Rock n Roll'])
+    # both venues, another genre
+    sax = seed.artist(name='The Wild Sax Band', genres=['Jazz'])
+    # same genre, no shows
+    rookie = seed.artist(name='Rookie', genres=['Rock n Roll'])
+    # nothing in common
+    seed.artist(name='Fiddlers', genres=['Folk'])
+    for days, (venue_id, artist_id) in enumerate([(hop, petals), (park, petals), (hop, quevedo),
+                                                  (hop, sax), (park, sax)]):
+        seed.show(venue_id, artist_id, now + timedelta(days=days + 1))
+
+    assert refresh(app) > 0
+    weight = app.config['SIMILAR_ARTISTS_GENRE_WEIGHT']
+    ranked = similar_to(petals)
+    assert [similar_id for similar_id, _ in ranked] == [quevedo, sax, rookie]
+    # the same venues, no genre in common; the same genre, no venue
+    assert ranked[1][1] == round(1 - weight, 4)
+    assert ranked[2][1] == round(weight, 4)
+    assert ranked[0][1] > ranked[1][1] > ranked[2][1]
+    # ranks run from 1 and no artist is like itself
+    for artist_id, in db.session.query(Artist.id):
+        ranks = db.session.query(SimilarArtist.rank, SimilarArtist.similar_id) \
+            .filter(SimilarArtist.artist_id == artist_id).order_by(SimilarArtist.rank).all()
+        assert [rank for rank, _ in ranks] == list(range(1, len(ranks) + 1))
+        assert artist_id not in [similar_id for _, similar_id in ranks]
+
+def test_refresh_drops_the_rows_of_deleted_artists(app, client, seed):
+    first, last = seed.artist(name='First'), seed.artist(name='Last')
+    gone = seed.artist(name='Gone')
+    refresh(app)
+    assert similar_to(gone)
+    # deleted without the cascade (SQLite does not enforce foreign keys)
+    db.session.execute(Artist.__table__.delete().where(Artist.id == gone))
+    db.session.commit()
+
+    refresh(app)
+    assert similar_to(gone) == []
+    assert db.session.query(SimilarArtist).filter(SimilarArtist.similar_id == gone).count() == 0
+    assert [similar_id for similar_id, _ in similar_to(first)] == [last]
+
+def test_artist_page_lists_its_similar_artists(app, client, seed):
+    venue_id = seed.venue()
+    petals = seed.artist(name='Guns N Petals')
+    quevedo = seed.artist(name='Matt Quevedo')
+    seed.artist(name='Rookie')
+    seed.show(venue_id, petals, datetime.now(LOCAL) + timedelta(days=1))
+    seed.show(venue_id, quevedo, datetime.now(LOCAL) + timedelta(days=2))
+    refresh(app)
+
+    # SQL_CHECK=raise: over the page's @query_budget fails here
+    response = client.get('/artists/{}'.format(petals))
+    assert response.status_code == 200
+    page = response.data.decode()
+    assert 'Similar Artists' in page
+    assert page.index('>Matt Quevedo</a>') < page.index('>Rookie</a>')
@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy import event
+
+import replicas
+from models import db, RoutingSession, Venue
+
+
+@pytest.mark.parametrize('method, path, sticky', [
+    ('GET', '/venues/1', False),
+    ('POST', '/venues/create', True),
+    # GET delete routes write, and are marked @use_primary
+    ('GET', '/venues/1/remove', True),
+    ('GET', '/artists/1/remove', True),
+])
+def test_writers_keep_reading_the_primary(app, method, path, sticky):
+    with app.test_request_context(path, method=method):
+        response = replicas.mark_writer(app.response_class())
+    cookies = response.headers.getlist('Set-Cookie')
+    assert any(cookie.startswith(replicas.STICKY_COOKIE + '=') for cookie in cookies) is sticky
+
+
+@pytest.fixture
+def replica(app, client, tmp_path, monkeypatch):
+    '''A second SQLite file as the "replica" bind, routed to as replicas.init_app does when one is configured.'''
+    monkeypatch.setitem(app.config, 'SQLALCHEMY_BINDS', {'replica': 'sqlite:///' + str(tmp_path / 'replica.db')})
+    for hooks in (app.before_request_funcs, app.after_request_funcs):
+        monkeypatch.setitem(hooks, None, list(hooks.get(None, [])))
+    monkeypatch.setitem(replicas._lag, 'checked', None)
+    # earlier tests served requests, after which debug mode refuses new hooks
+    monkeypatch.setattr(app, '_got_first_request', False)
+    replicas.init_app(app)
+    engine = db.get_engine(app, bind='replica')
+    db.metadata.create_all(engine)
+    yield engine
+    event.remove(RoutingSession, 'after_flush', replicas.stop_reading_replica)
+    engine.dispose()
+
+def copy_to(engine, venue_id, **changes):
+    '''Copies a venue row to the replica, with changes so the test can tell which database answered.'''
+    row = db.session.execute(Venue.__table__.select().where(Venue.id == venue_id)).mappings().one()
+    with engine.begin() as connection:
+        connection.execute(Venue.__table__.insert(), dict(row, **changes))
+
+def venue_name(client, venue_id):
+    return client.get('/api/v1/venues/{}?fields=name'.format(venue_id)).get_json()['data']['name']
+
+def primary_name(venue_id):
+    db.session.remove()
+    return db.session.query(Venue.name).filter(Venue.id == venue_id).scalar()
+
+
+def test_reads_go_to_the_replica_and_writes_to_the_primary(client, seed, replica):
+    venue_id = seed.venue(name='Primary Hall')
+    copy_to(replica, venue_id, name='Replica Hall')
+    primary_only = seed.venue(name='Not Replicated Yet')
+    db.session.remove()
+
+    assert venue_name(client, venue_id) == 'Replica Hall'
+
+    # @use_primary: the venue is only on the primary, so a replica read would not find it
+    response = client.get('/venues/{}/remove'.format(primary_only))
+    assert b'Venue was successfully deleted.' in response.data
+    assert primary_name(primary_only) is None
+    # and the client now reads its own writes from the primary
+    assert venue_name(client, venue_id) == 'Primary Hall'
+
+    client.delete_cookie('localhost', replicas.STICKY_COOKIE)
+    assert venue_name(client, venue_id) == 'Replica Hall'
+
+    response = client.post('/venues/{}/edit'.format(venue_id), data={
+        'name': 'Renamed Hall', 'city': 'San Francisco', 'state': 'CA', 'address': '1015 Folsom Street',
+        'phone': '123-123-1234', 'genres': ['Jazz'], 'facebook_link': 'https://www.facebook.com/hall',
+        'image_link': '', 'website_link': 'https://hall.example.com', 'seeking_description': '',
+    })
+    assert response.status_code == 302
+    assert primary_name(venue_id) == 'Renamed Hall'
+    assert venue_name(client, venue_id) == 'Renamed Hall'
+
+    client.delete_cookie('localhost', replicas.STICKY_COOKIE)
+    assert venue_name(client, venue_id) == 'Replica Hall'
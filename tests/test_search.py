@@ -0,0 +1,34 @@
+from datetime import datetime
+
+from bookings import LOCAL
+from importer import insert
+from models import db, Venue
+
+
+def test_search_is_case_insensitive(client, seed):
+    seed.venue(name='The Musical Hop')
+    seed.venue(name='Park Square Live Music & Coffee')
+    response = client.post('/venues/search', data={'search_term': 'music'})
+    assert b'The Musical Hop' in response.data
+    assert b'Park Square Live Music' in response.data
+    response = client.post('/venues/search', data={'search_term': 'Hop'})
+    assert b'The Musical Hop' in response.data
+    assert b'Park Square' not in response.data
+
+
+def test_search_finds_bulk_loaded_rows(app, client, seed, monkeypatch):
+    seed.venue(name='The Musical Hop')
+    # the first search builds the in-memory index (on SQLite)
+    assert b'The Musical Hop' in client.post('/venues/search', data={'search_term': 'hop'}).data
+
+    now = datetime.now(LOCAL)
+    # a Core insert, as `flask import` makes: no ORM event reaches the index
+    insert(Venue, ['name', 'city', 'state', 'genres', 'created_at', 'updated_at'], [
+        {'name': 'Hop Garden', 'city': 'Austin', 'state': 'TX', 'genres': ['Jazz'],
+         'created_at': now, 'updated_at': now}
+    ])
+    db.session.commit()
+    monkeypatch.setitem(app.config, 'SEARCH_INDEX_REFRESH_INTERVAL', 0)
+    response = client.post('/venues/search', data={'search_term': 'hop'})
+    assert b'Hop Garden' in response.data
+    assert b'The Musical Hop' in response.data
@@ -0,0 +1,69 @@
+import threading
+from datetime import datetime, timedelta
+
+from bookings import LOCAL
+from models import db, Show
+
+THREADS = 16
+
+
+def concurrently(app, bodies):
+    '''POSTs each body to /shows/batch from its own thread, all at once; returns the statuses.'''
+    barrier = threading.Barrier(len(bodies))
+    statuses = [None] * len(bodies)
+    def book(i):
+        client = app.test_client()
+        barrier.wait()
+        statuses[i] = client.post('/shows/batch', json=bodies[i]).status_code
+    threads = [threading.Thread(target=book, args=(i,)) for i in range(len(bodies))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuses
+
+def slot(days):
+    start = (datetime.now(LOCAL) + timedelta(days=days)).replace(microsecond=0, tzinfo=None)
+    return start.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def test_one_of_many_bookings_of_a_slot_wins(app, client, seed):
+    venue_id = seed.venue()
+    artist_ids = [seed.artist(name='Artist {}'.format(i)) for i in range(THREADS)]
+    statuses = concurrently(app, [[{'venue_id': venue_id, 'artist_id': artist_id, 'start_time': slot(5)}]
+                                  for artist_id in artist_ids])
+    assert statuses.count(201) == 1
+    assert statuses.count(409) == THREADS - 1
+    assert db.session.query(Show).filter(Show.venue_id == venue_id).count() == 1
+
+
+def test_concurrent_bookings_get_distinct_new_ids(app, client, seed):
+    venue_id = seed.venue()
+    artist_id = seed.artist()
+    deleted = seed.show(venue_id, artist_id, datetime.now(LOCAL) + timedelta(days=1))
+    db.session.query(Show).filter(Show.id == deleted).delete()
+    db.session.commit()
+
+    statuses = concurrently(app, [[{'venue_id': venue_id, 'artist_id': artist_id, 'start_time': slot(10 + i)}]
+                                  for i in range(THREADS)])
+    assert statuses == [201] * THREADS
+    ids = [id for id, in db.session.query(Show.id)]
+    assert len(ids) == len(set(ids)) == THREADS
+    # never the id of the deleted show
+    assert min(ids) > deleted
+
+
+def test_form_booking_is_checked_in_utc_minus_three(client, seed):
+    venue_id = seed.venue()
+    artist_id = seed.artist()
+    form = {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': slot(5)}
+    assert client.post('/shows/create', data=form).status_code == 200
+    # the availability API takes naive times as UTC-3 too: the show is found there
+    availability = client.get('/api/v1/venues/{}/availability'.format(venue_id),
+                              query_string={'start': slot(5).replace(' ', 'T'), 'end': slot(5.01).replace(' ', 'T')})
+    assert availability.get_json()['data']['free'] is False
+
+    other = seed.artist(name='Other Artist')
+    response = client.post('/shows/create', data=dict(form, artist_id=other))
+    assert response.status_code == 409
+    assert b'The venue already has show' in response.data
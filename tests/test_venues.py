@@ -0,0 +1,61 @@
+import re
+from datetime import datetime, timedelta
+
+from bookings import LOCAL
+
+
+def seed_areas(seed, areas, venues_per_area=3):
+    artist_id = seed.artist()
+    start = datetime.now(LOCAL) + timedelta(days=1)
+    for area in range(areas):
+        for i in range(venues_per_area):
+            venue_id = seed.venue(name='Venue {} {}'.format(area, i), city='City {}'.format(area), state='CA')
+            seed.show(venue_id, artist_id, start + timedelta(days=area * venues_per_area + i))
+
+
+def test_venues_lists_every_area(client, seed):
+    seed_areas(seed, 4)
+    response = client.get('/venues')
+    assert response.status_code == 200
+    for area in range(4):
+        assert 'City {}'.format(area).encode() in response.data
+
+
+def test_venues_statement_count_does_not_grow_with_areas(client, seed, statements):
+    seed_areas(seed, 2)
+    response, few = statements(client.get, '/venues')
+    assert response.status_code == 200
+
+    seed_areas(seed, 30)
+    response, many = statements(client.get, '/venues')
+    assert response.status_code == 200
+    assert b'City 29' in response.data
+    assert len(many) == len(few)
+
+
+def artists_listed(html):
+    return re.findall(r'>((?:Past|Upcoming) \d)</a>', html.decode())
+
+def load_more(html, when):
+    return re.search(r'href="([^"]+)">(?:Load more {} shows|Next)'.format(when), html.decode()).group(1)
+
+def test_venue_page_splits_past_and_upcoming_shows_and_loads_more(app, client, seed, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPCOMING_SHOWS_LIMIT', 2)
+    monkeypatch.setitem(app.config, 'PAST_SHOWS_LIMIT', 2)
+    venue_id = seed.venue()
+    now = datetime.now(LOCAL)
+    for i in range(1, 6):
+        # the soonest upcoming and the latest past shows first
+        seed.show(venue_id, seed.artist(name='Upcoming {}'.format(i)), now + timedelta(days=i))
+        seed.show(venue_id, seed.artist(name='Past {}'.format(i)), now - timedelta(days=i))
+
+    page = client.get('/venues/{}'.format(venue_id)).data
+    assert b'5 Upcoming Shows' in page and b'5 Past Shows' in page
+    assert artists_listed(page) == ['Upcoming 1', 'Upcoming 2', 'Past 1', 'Past 2']
+
+    for when in ('upcoming', 'past'):
+        more = client.get(load_more(page, when))
+        assert artists_listed(more.data) == ['{} {}'.format(when.title(), i) for i in (3, 4)]
+        last = client.get(load_more(more.data, when))
+        assert artists_listed(last.data) == ['{} 5'.format(when.title())]
+        assert b'Next' not in last.data